@@ -1,14 +1,16 @@
 import argparse
 import os
-import json
 from utils import (
-    extract_audio_from_video,
     transcribe_audio_file,
     load_transcript_from_file,
     search_segments,
     is_video_file,
     format_timestamp,
+    DEFAULT_TRANSCRIPT_CACHE_DIR,
+    TRANSCRIPT_CACHE_ENV,
+    WHISPER_WORKER_ENV,
 )
+from transcript_format import save_transcript_file
 
 
 def main():
@@ -21,7 +23,7 @@ def main():
     )
     group.add_argument(
         "--transcript_input",
-        help="Path to an existing JSON transcript file (Whisper format).",
+        help="Path to an existing transcript file (Whisper JSON or columnar .wtc).",
     )
 
     parser.add_argument(
@@ -42,16 +44,25 @@ def main():
         ],
         help="Whisper model size to use if --video_input is provided (default: base).",
     )
+    parser.add_argument(
+        "--whisper_worker",
+        default=os.environ.get(WHISPER_WORKER_ENV),
+        help=f"URL of a running transcribe_audio/whisper_worker.py (e.g. http://127.0.0.1:8766) that keeps models loaded between runs (default: ${WHISPER_WORKER_ENV}).",
+    )
+    parser.add_argument(
+        "--no_transcript_cache",
+        action="store_true",
+        help=f"Always run Whisper, bypassing the transcript cache shared by the Whisper tools (${TRANSCRIPT_CACHE_ENV}, default: {DEFAULT_TRANSCRIPT_CACHE_DIR}).",
+    )
     parser.add_argument(
         "--output_transcript_file",
-        help="Optional: Path to save the generated transcript if --video_input is used.",
+        help="Optional: Path to save the generated transcript if --video_input is used (Whisper JSON, or columnar if it ends with .wtc).",
     )
 
     args = parser.parse_args()
 
     transcript_data = None
     source_name = None  # To identify the origin of the transcript for display
-    temp_audio_path = None
 
     try:
         if args.video_input:
@@ -66,20 +77,19 @@ def main():
                 )
                 return
 
-            temp_audio_path = extract_audio_from_video(args.video_input)
-            if not temp_audio_path:
-                print(f"Could not extract audio from {args.video_input}")
-                return
-
             print(
                 f"Transcribing video {args.video_input} using model '{args.model_size}'..."
             )
-            transcript_data = transcribe_audio_file(temp_audio_path, args.model_size)
+            transcript_data = transcribe_audio_file(
+                args.video_input,
+                args.model_size,
+                args.whisper_worker,
+                not args.no_transcript_cache,
+            )
 
             if args.output_transcript_file:
                 try:
-                    with open(args.output_transcript_file, "w", encoding="utf-8") as f:
-                        json.dump(transcript_data, f, indent=2, ensure_ascii=False)
+                    save_transcript_file(transcript_data, args.output_transcript_file)
                     print(
                         f"Generated transcript saved to {args.output_transcript_file}"
                     )
@@ -119,10 +129,6 @@ def main():
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-    finally:
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            print(f"Cleaning up temporary audio file: {temp_audio_path}")
-            os.remove(temp_audio_path)
 
 
 if __name__ == "__main__":
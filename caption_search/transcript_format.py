@@ -0,0 +1,297 @@
+import json
+import os
+import struct
+import numpy as np
+
+# Columnar transcript container (.wtc), an alternative to the Whisper JSON for
+# long transcripts. One file holds:
+#   - "WTC1", the header length (uint64) and a JSON header describing the columns;
+#   - 64-byte aligned 1-D arrays, memory-mapped on read, so opening a transcript
+#     reads only the header and a time window or the text reads only its bytes.
+# A list of records (the segments, and the words of each segment) is stored
+# column by column: numbers as int/float arrays, strings as one UTF-8 blob plus
+# byte offsets, token lists as one flat array plus offsets, and nested record
+# lists (words) as a nested table plus offsets. Values that fit no column are
+# kept in the header, so converting from and back to Whisper JSON is lossless.
+# The same module is copied into every tool that reads or writes transcripts.
+TRANSCRIPT_EXTENSION = ".wtc"
+MAGIC = b"WTC1"
+ALIGNMENT = 64
+MISSING = object()
+
+
+def is_columnar_transcript(path):
+    return path.lower().endswith(TRANSCRIPT_EXTENSION)
+
+
+def aligned(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def int_array(values):
+    array = np.array(values, dtype=np.int64)
+    if len(array) and array.min() >= -(2**31) and array.max() < 2**31:
+        return array.astype(np.int32)
+    return array
+
+
+def column_kind(values):
+    """Returns how a column of record values is stored, or None to keep them in
+    the header: "str", "int", "float", "ints" (int lists) or "table" (dict lists)."""
+    if any(v is MISSING for v in values):
+        return None
+    if all(type(v) is str for v in values):
+        return "str"
+    if all(type(v) is int and -(2**63) <= v < 2**63 for v in values):
+        return "int"
+    if all(type(v) is float for v in values):
+        return "float"
+    if not all(type(v) is list for v in values):
+        return None
+    items = [item for v in values for item in v]
+    if all(type(i) is int and -(2**63) <= i < 2**63 for i in items):
+        return "ints"
+    if all(type(i) is dict for i in items):
+        return "table"
+    return None
+
+
+def offsets_of(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    return offsets
+
+
+def encode_table(records, name, arrays):
+    """Adds the columns of a list of dicts to arrays as <name>.<key>; returns the
+    table's header entry."""
+    keys = list(dict.fromkeys(key for record in records for key in record))
+    columns, extras = {}, {}
+    for key in keys:
+        values = [record.get(key, MISSING) for record in records]
+        kind = column_kind(values)
+        column = f"{name}.{key}"
+        if kind is None:
+            for i, value in enumerate(values):
+                if value is not MISSING:
+                    extras.setdefault(str(i), {})[key] = value
+            continue
+        if kind == "str":
+            blobs = [value.encode("utf-8") for value in values]
+            arrays[column] = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+            arrays[column + "#offsets"] = offsets_of([len(b) for b in blobs])
+        elif kind == "int":
+            arrays[column] = int_array(values)
+        elif kind == "float":
+            arrays[column] = np.array(values, dtype=np.float64)
+        elif kind == "ints":
+            arrays[column] = int_array([item for value in values for item in value])
+            arrays[column + "#offsets"] = offsets_of([len(v) for v in values])
+        else:
+            nested = [item for value in values for item in value]
+            arrays[column + "#offsets"] = offsets_of([len(v) for v in values])
+            kind = encode_table(nested, column, arrays)
+        columns[key] = kind
+    return {"count": len(records), "keys": keys, "columns": columns, "extras": extras}
+
+
+def write_columnar_transcript(result, path):
+    """Writes a Whisper result (dict with "segments") as a .wtc file, atomically."""
+    segments = result.get("segments")
+    if not isinstance(segments, list) or not all(isinstance(s, dict) for s in segments):
+        raise ValueError("Transcript has no list of 'segments'.")
+    arrays = {}
+    table = encode_table(segments, "segments", arrays)
+    header = {"version": 1, "keys": list(result), "segments": table, "meta": {}}
+    for key, value in result.items():
+        if key == "segments":
+            continue
+        if key == "text" and table["columns"].get("text") == "str":
+            segment_text = bytes(arrays["segments.text"]).decode("utf-8")
+            if value == segment_text:
+                header["text"] = "segments"  # Read from the segment texts
+                continue
+        if key == "text" and type(value) is str:
+            arrays["text"] = np.frombuffer(value.encode("utf-8"), dtype=np.uint8)
+            header["text"] = "array"
+            continue
+        header["meta"][key] = value
+    if table["columns"].get("start") in ("int", "float") and table["columns"].get(
+        "end"
+    ) in ("int", "float"):
+        # Running maximum of the ends, for window lookups by binary search
+        arrays["segments#end_max"] = np.maximum.accumulate(
+            arrays["segments.end"].astype(np.float64)
+        )
+        header["sorted"] = bool(np.all(np.diff(arrays["segments.start"]) >= 0))
+
+    entries, offset = {}, 0
+    for name, array in arrays.items():
+        entries[name] = {
+            "dtype": array.dtype.str,
+            "offset": offset,
+            "length": len(array),
+        }
+        offset += aligned(array.nbytes)
+    header["arrays"] = entries
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = aligned(len(MAGIC) + 8 + len(header_bytes))
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(b"\0" * (aligned(array.nbytes) - array.nbytes))
+    os.replace(path + ".tmp", path)
+
+
+class ColumnarTranscript:
+    """Memory-mapped .wtc transcript. Opening it reads only the header; columns are
+    read when a segment range, a time window or the text is asked for."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a {TRANSCRIPT_EXTENSION} transcript.")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(header_length).decode("utf-8"))
+        self.data_start = aligned(len(MAGIC) + 8 + header_length)
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return self.header["segments"]["count"]
+
+    def array(self, name):
+        entry = self.header["arrays"][name]
+        dtype = np.dtype(entry["dtype"])
+        start = self.data_start + entry["offset"]
+        return self.data[start : start + entry["length"] * dtype.itemsize].view(dtype)
+
+    def read_table(self, table, name, lo, hi, keys=None):
+        """Returns records lo..hi of a table as dicts (only keys, if given)."""
+        values = {}
+        for key, kind in table["columns"].items():
+            if keys is not None and key not in keys:
+                continue
+            column = f"{name}.{key}"
+            if kind in ("int", "float"):
+                values[key] = self.array(column)[lo:hi].tolist()
+                continue
+            offsets = self.array(column + "#offsets")[lo : hi + 1].tolist()
+            if kind == "str":
+                blob = bytes(self.array(column)[offsets[0] : offsets[-1]])
+                base = offsets[0]
+                values[key] = [
+                    blob[a - base : b - base].decode("utf-8")
+                    for a, b in zip(offsets, offsets[1:])
+                ]
+                continue
+            if kind == "ints":
+                flat = self.array(column)[offsets[0] : offsets[-1]].tolist()
+            else:
+                flat = self.read_table(kind, column, offsets[0], offsets[-1])
+            base = offsets[0]
+            values[key] = [
+                flat[a - base : b - base] for a, b in zip(offsets, offsets[1:])
+            ]
+        records = []
+        for i in range(lo, hi):
+            extras = table["extras"].get(str(i), {})
+            record = {}
+            for key in table["keys"]:
+                if keys is not None and key not in keys:
+                    continue
+                if key in values:
+                    record[key] = values[key][i - lo]
+                elif key in extras:
+                    record[key] = extras[key]
+            records.append(record)
+        return records
+
+    def window(self, start, end):
+        """Indices of the segments overlapping [start, end] seconds."""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        if "segments#end_max" not in self.header["arrays"]:
+            # Some segments have no numeric start or end: those never match
+            times = self.read_table(
+                self.header["segments"], "segments", 0, len(self), ("start", "end")
+            )
+            return np.array(
+                [
+                    i
+                    for i, t in enumerate(times)
+                    if type(t.get("start")) in (int, float)
+                    and type(t.get("end")) in (int, float)
+                    and t["start"] <= end
+                    and t["end"] >= start
+                ],
+                dtype=np.int64,
+            )
+        starts = self.array("segments.start")
+        ends = self.array("segments.end")
+        if not self.header["sorted"]:
+            return np.flatnonzero((starts <= end) & (ends >= start))
+        lo = int(np.searchsorted(self.array("segments#end_max"), start, "left"))
+        hi = int(np.searchsorted(starts, end, "right"))
+        return lo + np.flatnonzero(ends[lo:hi] >= start)
+
+    def segments(self, start=None, end=None, keys=None):
+        """Whisper-format segments, all or those overlapping [start, end] seconds,
+        with only the given keys (e.g. ("start", "end", "text")) if keys is set."""
+        table = self.header["segments"]
+        if start is None and end is None:
+            return self.read_table(table, "segments", 0, len(self), keys)
+        indices = self.window(
+            -np.inf if start is None else start, np.inf if end is None else end
+        )
+        if len(indices) == 0:
+            return []
+        lo, hi = int(indices[0]), int(indices[-1]) + 1
+        records = self.read_table(table, "segments", lo, hi, keys)
+        return [records[i - lo] for i in indices]
+
+    @property
+    def text(self):
+        """The transcript's full text, without reading any other column."""
+        source = self.header.get("text")
+        if source == "segments":
+            return bytes(self.array("segments.text")).decode("utf-8")
+        if source == "array":
+            return bytes(self.array("text")).decode("utf-8")
+        return self.header["meta"].get("text")
+
+    @property
+    def language(self):
+        return self.header["meta"].get("language")
+
+    def to_whisper(self):
+        """The full Whisper result, equal to the one the file was written from."""
+        result = {}
+        for key in self.header["keys"]:
+            if key == "segments":
+                result[key] = self.segments()
+            elif key == "text" and self.header.get("text"):
+                result[key] = self.text
+            else:
+                result[key] = self.header["meta"][key]
+        return result
+
+
+def load_transcript(path):
+    """Loads a Whisper result from a .wtc or a Whisper JSON file."""
+    if is_columnar_transcript(path):
+        return ColumnarTranscript(path).to_whisper()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_transcript_file(result, path):
+    """Saves a Whisper result as .wtc if path ends with it, else as indented JSON."""
+    if is_columnar_transcript(path):
+        write_columnar_transcript(result, path)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
@@ -1,5 +1,6 @@
 import argparse
 import ffmpeg
+import json
 import os
 import math
 
@@ -106,24 +107,81 @@ def extract_frames_at_interval(input_path, output_folder, interval_seconds):
                 )
 
 
+def extract_moment_thumbnails(moments_file, output_folder):
+    """Saves one frame at the best timestamp of every moment in a search_script.py
+    --moments_output file. Moments with no matching frame (spoken-only --hybrid
+    matches) use the middle of their [start, end] range instead."""
+    with open(moments_file, "r", encoding="utf-8") as f:
+        listed = json.load(f)
+    moments = []
+    for moment in listed:
+        if moment.get("timestamp") is None and moment.get("start") is not None:
+            middle = (moment["start"] + moment["end"]) / 2
+            moment = dict(moment, timestamp=middle)
+        if moment.get("timestamp") is not None:
+            moments.append(moment)
+    if len(moments) < len(listed):
+        print(
+            f"Warning: Skipping {len(listed) - len(moments)} moments without a time (images)."
+        )
+
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+        print(f"Created output directory: {output_folder}")
+
+    print(f"Extracting thumbnails of {len(moments)} moments from {moments_file}.")
+    for i, moment in enumerate(moments):
+        if not os.path.exists(moment["path"]):
+            print(f"Error: Input file not found at {moment['path']}")
+            continue
+        stem = os.path.splitext(os.path.basename(moment["path"]))[0]
+        output_filename = os.path.join(
+            output_folder,
+            f"moment_{i+1:03d}_{stem}_{format_time(moment['timestamp'])}.jpg",
+        )
+        try:
+            (
+                ffmpeg.input(moment["path"], ss=moment["timestamp"])
+                .output(output_filename, vframes=1, format="image2", vcodec="mjpeg")
+                .global_args("-loglevel", "error")
+                .run(overwrite_output=True)
+            )
+            print(f"[✓] Saved {output_filename}")
+        except ffmpeg.Error as e:
+            print(
+                f"Error extracting frame at {moment['timestamp']:.2f}s of {moment['path']}: {e.stderr.decode('utf8')}"
+            )
+            print(f"[✗] Failed to save {output_filename}")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Extract frames from a video at N-second intervals."
     )
-    parser.add_argument("--input", required=True, help="Path to the input video file.")
+    parser.add_argument("--input", help="Path to the input video file.")
     parser.add_argument(
         "--output_folder", required=True, help="Directory to save the extracted frames."
     )
     parser.add_argument(
         "--interval",
         type=int,
-        required=True,
         help="Interval in seconds between frame extractions.",
     )
+    parser.add_argument(
+        "--moments_file",
+        help="Instead of fixed intervals, save one thumbnail per moment of a search_script.py --moments_output JSON file.",
+    )
 
     args = parser.parse_args()
 
-    if args.interval <= 0:
+    if args.moments_file:
+        extract_moment_thumbnails(args.moments_file, args.output_folder)
+        print("Frame extraction process completed.")
+    elif not args.input or args.interval is None:
+        parser.error(
+            "--input and --interval are required unless --moments_file is given"
+        )
+    elif args.interval <= 0:
         print("Error: Interval must be a positive integer.")
     else:
         extract_frames_at_interval(args.input, args.output_folder, args.interval)
@@ -1,11 +1,13 @@
 import argparse
 import os
 from utils import (
-    extract_audio_from_media,
     transcribe_to_segments,
     generate_srt_content,
     generate_vtt_content,
     is_video_file,  # Though the script will try to process any input with ffmpeg
+    DEFAULT_TRANSCRIPT_CACHE_DIR,
+    TRANSCRIPT_CACHE_ENV,
+    WHISPER_WORKER_ENV,
 )
 
 
@@ -35,6 +37,16 @@ def main():
         ],
         help="Whisper model size to use (default: base).",
     )
+    parser.add_argument(
+        "--whisper_worker",
+        default=os.environ.get(WHISPER_WORKER_ENV),
+        help=f"URL of a running transcribe_audio/whisper_worker.py (e.g. http://127.0.0.1:8766) that keeps models loaded between runs (default: ${WHISPER_WORKER_ENV}).",
+    )
+    parser.add_argument(
+        "--no_transcript_cache",
+        action="store_true",
+        help=f"Always run Whisper, bypassing the transcript cache shared by the Whisper tools (${TRANSCRIPT_CACHE_ENV}, default: {DEFAULT_TRANSCRIPT_CACHE_DIR}).",
+    )
 
     args = parser.parse_args()
 
@@ -54,19 +66,17 @@ def main():
     srt_path = os.path.join(output_directory, f"{base_filename}.srt")
     vtt_path = os.path.join(output_directory, f"{base_filename}.vtt")
 
-    temp_audio_path = None
     try:
-        # Note: extract_audio_from_media will attempt to convert any input to WAV for Whisper
-        # This simplifies logic as Whisper works best with WAV.
-        temp_audio_path = extract_audio_from_media(args.input)
-        if not temp_audio_path:
-            print(f"Could not prepare audio from {args.input}")
-            return
-
+        # The audio of any input ffmpeg can read is decoded in memory for Whisper
         print(
             f"Generating transcript segments for {args.input} using model '{args.model_size}'..."
         )
-        segments = transcribe_to_segments(temp_audio_path, args.model_size)
+        segments = transcribe_to_segments(
+            args.input,
+            args.model_size,
+            args.whisper_worker,
+            not args.no_transcript_cache,
+        )
 
         if not segments:
             print("No segments transcribed. Cannot generate caption files.")
@@ -86,10 +96,6 @@ def main():
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-    finally:
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            print(f"Cleaning up temporary audio file: {temp_audio_path}")
-            os.remove(temp_audio_path)
 
 
 if __name__ == "__main__":
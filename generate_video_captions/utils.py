@@ -1,8 +1,230 @@
+import hashlib
 import os
+import threading
+import json
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+import torch
 import whisper
 import ffmpeg
-import tempfile
 import datetime
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper models take 16 kHz mono audio
+WHISPER_WORKER_ENV = "WHISPER_WORKER_URL"  # Default --whisper_worker for the CLIs
+# Transcript cache shared by all the Whisper tools (one transcription per file)
+TRANSCRIPT_CACHE_ENV = "TRANSCRIPT_CACHE_DIR"
+TRANSCRIPT_CACHE_MB_ENV = "TRANSCRIPT_CACHE_MB"
+DEFAULT_TRANSCRIPT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "multimodal-tools", "transcripts"
+)
+DEFAULT_TRANSCRIPT_CACHE_MB = 1024
+CACHE_IGNORED_OPTIONS = {"verbose"}  # Only changes what Whisper prints
+HASH_CHUNK_SIZE = 1 << 20
+# Approximate parameter counts, used to make room before a model is loaded
+WHISPER_MODEL_PARAMS = {
+    "tiny": 39e6,
+    "base": 74e6,
+    "small": 244e6,
+    "medium": 769e6,
+    "large": 1550e6,
+    "large-v1": 1550e6,
+    "large-v2": 1550e6,
+    "large-v3": 1550e6,
+}
+
+
+def model_memory_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+class WhisperModelRegistry:
+    """Loaded Whisper models keyed by (model_size, device), loaded once per process.
+
+    With a memory_budget (bytes), the least recently used models are evicted to
+    make room before another model is loaded; the last model is always kept.
+    """
+
+    def __init__(self, memory_budget=None):
+        self.memory_budget = memory_budget
+        self.models = OrderedDict()  # (model_size, device) -> (model, bytes)
+        self.lock = threading.Lock()
+
+    def memory_bytes(self):
+        return sum(size for _, size in self.models.values())
+
+    def evict(self, incoming_bytes=0):
+        evicted = False
+        while (
+            self.memory_budget is not None
+            and self.models
+            and self.memory_bytes() + incoming_bytes > self.memory_budget
+        ):
+            (model_size, device), _ = self.models.popitem(last=False)
+            print(f"Evicting Whisper model {model_size} to stay within memory budget.")
+            evicted = True
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def get(self, model_size="base", device=None):
+        key = (model_size, device)
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                return self.models[key][0]
+            self.evict(WHISPER_MODEL_PARAMS.get(model_size, 0) * 4)
+            print(f"Loading Whisper model: {model_size}...")
+            model = whisper.load_model(model_size, device=device)
+            self.models[key] = (model, model_memory_bytes(model))
+            return model
+
+    def loaded(self):
+        """[(model_size, device, bytes)] of the loaded models, least recent first."""
+        with self.lock:
+            return [(k[0], k[1], size) for k, (_, size) in self.models.items()]
+
+
+WHISPER_MODELS = WhisperModelRegistry()  # Process-wide; no memory budget
+
+
+def load_whisper_model(model_size="base", device=None):
+    """Returns the Whisper model, loading it only on first use in this process."""
+    return WHISPER_MODELS.get(model_size, device)
+
+
+def transcribe_with_worker(worker_url, media_path, model_size="base", **options):
+    """Transcribes with a running transcribe_audio/whisper_worker.py, which keeps
+    models loaded between runs."""
+    payload = {
+        "media_path": os.path.abspath(media_path),
+        "model_size": model_size,
+        "options": options,
+    }
+    request = urllib.request.Request(
+        worker_url.rstrip("/") + "/transcribe",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def file_content_hash(file_path):
+    """Returns the SHA-256 hex digest of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def transcript_cache_dir():
+    return os.environ.get(TRANSCRIPT_CACHE_ENV) or DEFAULT_TRANSCRIPT_CACHE_DIR
+
+
+def transcript_cache_key(media_path, params):
+    """Keys a transcript on the media content and every parameter that changes it,
+    so a renamed or copied file still hits and an edited one misses."""
+    options = params.get("options", {})
+    params = dict(
+        params,
+        options={k: v for k, v in options.items() if k not in CACHE_IGNORED_OPTIONS},
+        whisper=getattr(whisper, "__version__", None),
+    )
+    blob = json.dumps([file_content_hash(media_path), params], sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def load_cached_transcript(key):
+    """Returns the cached transcript for key, or None. A hit marks it recently used."""
+    path = os.path.join(transcript_cache_dir(), key + ".json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return result
+
+
+def evict_transcripts(cache_dir, max_bytes):
+    """Deletes the least recently used transcripts until the cache fits in max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue  # Evicted by another process
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def save_cached_transcript(key, result):
+    """Writes the transcript to the cache atomically, then evicts the least recently
+    used ones beyond $TRANSCRIPT_CACHE_MB. Failures only print a warning."""
+    cache_dir = transcript_cache_dir()
+    path = os.path.join(cache_dir, key + ".json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        max_mb = float(
+            os.environ.get(TRANSCRIPT_CACHE_MB_ENV) or DEFAULT_TRANSCRIPT_CACHE_MB
+        )
+        evict_transcripts(cache_dir, max_mb * 1024 * 1024)
+    except OSError as e:
+        print(f"Warning: Could not cache transcript: {e}")
+
+
+def whisper_transcribe(
+    media_path, model_size="base", worker_url=None, use_cache=True, **options
+):
+    """Runs Whisper on the audio of media_path, in worker_url if given and reachable,
+    else in this process. With use_cache, a transcript of the same content with the
+    same parameters is read from the shared transcript cache instead."""
+    key = None
+    if use_cache:
+        params = {"model_size": model_size, "options": options}
+        key = transcript_cache_key(media_path, params)
+        result = load_cached_transcript(key)
+        if result is not None:
+            print(f"Using cached transcript of {media_path}.")
+            return result
+    result = run_whisper(media_path, model_size, worker_url, **options)
+    if key:
+        save_cached_transcript(key, result)
+    return result
+
+
+def run_whisper(media_path, model_size="base", worker_url=None, **options):
+    """Runs Whisper on the audio of media_path, in worker_url if given and reachable,
+    else in this process."""
+    if worker_url:
+        try:
+            print(f"Transcribing {media_path} with worker {worker_url}...")
+            return transcribe_with_worker(worker_url, media_path, model_size, **options)
+        except urllib.error.HTTPError:
+            raise  # The worker is up but the transcription failed
+        except urllib.error.URLError as e:
+            print(f"Warning: Whisper worker unavailable ({e.reason}); loading locally.")
+    audio = decode_audio(media_path)
+    model = load_whisper_model(model_size)
+    print(f"Transcribing {media_path}...")
+    return model.transcribe(audio, **options)
 
 
 def is_video_file(filepath):
@@ -14,45 +236,30 @@ def is_video_file(filepath):
     return ext in video_extensions
 
 
-def extract_audio_from_media(media_path):
-    """Extracts audio from a video/audio file and saves it as a temporary WAV file if necessary."""
-    # Whisper can handle many audio formats directly. We primarily need to extract from video.
-    # If it's already an audio file that Whisper supports, we might not need to convert.
-    # However, for simplicity and consistency, converting to WAV is a safe bet.
-
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmpfile:
-        output_audio_path = tmpfile.name
-
-    print(f"Preparing audio from {media_path} to {output_audio_path}...")
+def decode_audio(media_path):
+    """Decodes the audio of any file ffmpeg can read (audio or video) to 16 kHz mono
+    float32 samples in memory, the array model.transcribe takes directly."""
+    print(f"Decoding audio from {media_path}...")
     try:
-        (
+        pcm, _ = (
             ffmpeg.input(media_path)
-            .output(
-                output_audio_path, acodec="pcm_s16le", ar="16000", ac=1
-            )  # Standard for Whisper
+            .output("-", format="s16le", acodec="pcm_s16le", ac=1, ar=SAMPLE_RATE)
             .global_args("-loglevel", "error")
-            .run(overwrite_output=True)
+            .run(capture_stdout=True, capture_stderr=True)
         )
-        print("Audio preparation successful.")
-        return output_audio_path
     except ffmpeg.Error as e:
-        print(f"Error preparing audio: {e.stderr.decode('utf8')}")
-        if os.path.exists(output_audio_path):
-            os.remove(output_audio_path)
-        raise
-    except Exception as e_gen:
-        print(f"A general error occurred during audio preparation: {str(e_gen)}")
-        if os.path.exists(output_audio_path):
-            os.remove(output_audio_path)
+        print(f"Error decoding audio: {e.stderr.decode('utf8')}")
         raise
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
 
 
-def transcribe_to_segments(audio_path, model_size="base"):
-    """Transcribes an audio file and returns the segments list from Whisper."""
-    print(f"Loading Whisper model: {model_size}...")
-    model = whisper.load_model(model_size)
-    print(f"Transcribing {audio_path}...")
-    result = model.transcribe(audio_path, verbose=False)
+def transcribe_to_segments(
+    media_path, model_size="base", worker_url=None, use_cache=True
+):
+    """Transcribes a video or audio file and returns the segments list from Whisper."""
+    result = whisper_transcribe(
+        media_path, model_size, worker_url, use_cache, verbose=False
+    )
     print("Transcription complete.")
     return result.get("segments", [])
 
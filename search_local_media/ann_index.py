@@ -0,0 +1,155 @@
+import os
+import time
+import numpy as np
+from index_store import index_fingerprint, normalize_rows, top_k_indices
+
+# Inverted-file (IVF) index over the normalized embedding matrix: rows are
+# partitioned by their nearest k-means centroid, and a query only scores the rows
+# of its n_probe nearest lists. n_probe is the recall/latency knob.
+IVF_FILENAME = "clip_media_ivf.npz"
+N_PROBE = 8
+KMEANS_ITERATIONS = 20
+KMEANS_TRAIN_PER_LIST = 256  # training sample size per list, as in most IVF trainers
+ASSIGN_CHUNK_SIZE = 65536
+
+
+def default_n_lists(num_rows):
+    """About 4 * sqrt(N) lists, the usual IVF rule of thumb."""
+    return max(1, min(num_rows, int(4 * np.sqrt(num_rows))))
+
+
+def assign_to_centroids(data, centroids):
+    """Returns the index of the most similar centroid for every row, in chunks."""
+    assignments = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ASSIGN_CHUNK_SIZE):
+        chunk = np.asarray(data[start : start + ASSIGN_CHUNK_SIZE], dtype=np.float32)
+        assignments[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(data, n_clusters, n_iter=KMEANS_ITERATIONS, seed=0):
+    """k-means on the unit sphere (cosine similarity); data rows must be normalized."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(data[rng.choice(len(data), n_clusters, replace=False)])
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(data, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_clusters)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        non_empty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[non_empty] = np.add.reduceat(data[order], starts[non_empty], axis=0)
+        # Re-seed empty clusters with random points so no list is wasted
+        num_empty = int((~non_empty).sum())
+        if num_empty:
+            sums[~non_empty] = data[rng.choice(len(data), num_empty, replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def build_ivf(embeddings, n_lists=None, seed=0):
+    """Trains centroids on a sample of rows and builds the inverted lists."""
+    num_rows = len(embeddings)
+    n_lists = min(n_lists or default_n_lists(num_rows), num_rows)
+    rng = np.random.default_rng(seed)
+    train_size = min(num_rows, n_lists * KMEANS_TRAIN_PER_LIST)
+    train_rows = np.sort(rng.choice(num_rows, train_size, replace=False))
+    print(f"Training IVF with {n_lists} lists on {train_size} of {num_rows} rows...")
+    centroids = spherical_kmeans(np.asarray(embeddings[train_rows]), n_lists, seed=seed)
+
+    assignments = assign_to_centroids(embeddings, centroids)
+    list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+    list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+    return {
+        "centroids": centroids,
+        "list_offsets": list_offsets,
+        "list_rows": list_rows,
+    }
+
+
+def ivf_candidates(query, ivf, n_probe=N_PROBE):
+    """Rows of the n_probe inverted lists nearest to a normalized query, sorted."""
+    centroid_scores = ivf["centroids"] @ query
+    probe = top_k_indices(centroid_scores, n_probe)
+    offsets = ivf["list_offsets"]
+    candidates = np.concatenate(
+        [ivf["list_rows"][offsets[i] : offsets[i + 1]] for i in probe]
+    )
+    candidates.sort()  # sequential access into the memmap
+    return candidates
+
+
+def search_ivf(query, ivf, embeddings, top_k, n_probe=N_PROBE):
+    """Scores only the rows of the n_probe lists nearest to a normalized query.
+
+    Returns (rows, scores), best first.
+    """
+    candidates = ivf_candidates(query, ivf, n_probe)
+    scores = embeddings[candidates] @ query
+    best = top_k_indices(scores, top_k)
+    return candidates[best], scores[best]
+
+
+def save_ivf(media_folder, ivf):
+    ivf_path = os.path.join(media_folder, IVF_FILENAME)
+    with open(ivf_path + ".tmp", "wb") as f:
+        np.savez(f, index_fingerprint=index_fingerprint(media_folder), **ivf)
+    os.replace(ivf_path + ".tmp", ivf_path)
+
+
+def load_ivf(media_folder, num_rows):
+    """Loads the persisted IVF, or None if missing or built for an older index."""
+    ivf_path = os.path.join(media_folder, IVF_FILENAME)
+    if not os.path.exists(ivf_path):
+        return None
+    with np.load(ivf_path) as data:
+        ivf = {name: data[name] for name in data.files}
+    if (
+        ivf.pop("index_fingerprint", None) != index_fingerprint(media_folder)
+        or len(ivf["list_rows"]) != num_rows
+    ):
+        return None
+    return ivf
+
+
+def load_or_build_ivf(media_folder, index, n_lists=None, rebuild=False):
+    """Returns the IVF stored next to the index, (re)building it when stale."""
+    ivf = None if rebuild else load_ivf(media_folder, len(index["embeddings"]))
+    if ivf is None or (n_lists and len(ivf["centroids"]) != n_lists):
+        ivf = build_ivf(index["embeddings"], n_lists)
+        save_ivf(media_folder, ivf)
+        print(f"IVF index saved to {os.path.join(media_folder, IVF_FILENAME)}")
+    return ivf
+
+
+def recall_at_k(
+    embeddings, ivf, top_k=10, n_probes=(1, 2, 4, 8, 16, 32), num_queries=200, seed=0
+):
+    """Measures IVF recall@k and latency against exact search for several n_probe values.
+
+    Queries are indexed rows with a little noise added, so they behave like unseen
+    vectors rather than exact matches of their own row. Returns a list of
+    (n_probe, recall, mean_ms_per_query).
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[np.sort(rows)], dtype=np.float32)
+    queries = normalize_rows(
+        queries + rng.normal(0, 0.02, queries.shape).astype(np.float32)
+    )
+    exact = [set(top_k_indices(embeddings @ q, top_k)) for q in queries]
+
+    report = []
+    for n_probe in n_probes:
+        if n_probe > len(ivf["centroids"]):
+            break
+        hits = 0
+        start = time.perf_counter()
+        for query, truth in zip(queries, exact):
+            found, _ = search_ivf(query, ivf, embeddings, top_k, n_probe)
+            hits += len(truth.intersection(found))
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = hits / sum(len(truth) for truth in exact)
+        report.append((n_probe, recall, elapsed_ms))
+    return report
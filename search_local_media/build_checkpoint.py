@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from index_store import block_from_items, load_index, path_block, save_index
+
+# An index build checkpoints its progress under the index folder so that a killed
+# run can resume. Embedded files are written in append-only segments: each segment
+# is a small index of its own plus the manifest entries of the files it covers,
+# written under a temporary name and committed with one atomic directory rename.
+# The committed segments together are the progress manifest; a half-written
+# segment is never visible and is discarded on resume. Segment names are unique
+# per writer, so several worker processes can commit into the same checkpoint.
+CHECKPOINT_DIRNAME = "clip_media_checkpoint"
+CHECKPOINT_INFO_FILENAME = "checkpoint_info.json"
+SEGMENT_MANIFEST_FILENAME = "segment_manifest.json"
+SEGMENT_PREFIX = "segment_"
+CHECKPOINT_INTERVAL = 300  # Seconds of embedding between committed segments
+
+
+def checkpoint_dir(index_dir):
+    return os.path.join(index_dir, CHECKPOINT_DIRNAME)
+
+
+def read_checkpoint_info(checkpoint_path):
+    try:
+        with open(
+            os.path.join(checkpoint_path, CHECKPOINT_INFO_FILENAME), encoding="utf-8"
+        ) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def start_checkpoint(index_dir, build_params):
+    """Prepares the checkpoint folder, discarding one made with other build_params."""
+    checkpoint_path = checkpoint_dir(index_dir)
+    if read_checkpoint_info(checkpoint_path) != build_params:
+        shutil.rmtree(checkpoint_path, ignore_errors=True)
+    os.makedirs(checkpoint_path, exist_ok=True)
+    info_path = os.path.join(checkpoint_path, CHECKPOINT_INFO_FILENAME)
+    with open(info_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(build_params, f)
+    os.replace(info_path + ".tmp", info_path)
+    return checkpoint_path
+
+
+def load_checkpoint(index_dir, build_params):
+    """Returns (manifest, {path: block}) of every committed segment.
+
+    Both are empty when there is no checkpoint or it was made with different
+    build_params. Blocks of files that produced no frames are None.
+    """
+    checkpoint_path = checkpoint_dir(index_dir)
+    if read_checkpoint_info(checkpoint_path) != build_params:
+        return {}, {}
+    manifest, path_blocks = {}, {}
+    for name in sorted(os.listdir(checkpoint_path)):
+        segment_dir = os.path.join(checkpoint_path, name)
+        if not name.startswith(SEGMENT_PREFIX):
+            if name.endswith(".tmp"):
+                # A segment that was being written when the build was killed
+                shutil.rmtree(segment_dir, ignore_errors=True)
+            continue
+        with open(
+            os.path.join(segment_dir, SEGMENT_MANIFEST_FILENAME), encoding="utf-8"
+        ) as f:
+            segment_manifest = json.load(f)
+        segment = load_index(segment_dir)
+        for path, entry in segment_manifest.items():
+            manifest[path] = entry
+            path_blocks[path] = (
+                path_block(segment, path) if segment is not None else None
+            )
+    return manifest, path_blocks
+
+
+def commit_segment(checkpoint_path, path_blocks, manifest):
+    """Writes {path: block} and their manifest entries as one committed segment."""
+    name = f"{SEGMENT_PREFIX}{time.time_ns()}_{uuid.uuid4().hex[:8]}"
+    tmp_dir = os.path.join(checkpoint_path, f".{name}.tmp")
+    os.makedirs(tmp_dir)
+    save_index(tmp_dir, path_blocks, manifest)
+    with open(
+        os.path.join(tmp_dir, SEGMENT_MANIFEST_FILENAME), "w", encoding="utf-8"
+    ) as f:
+        json.dump({path: manifest[path] for path in path_blocks}, f)
+    os.rename(tmp_dir, os.path.join(checkpoint_path, name))
+
+
+def clear_checkpoint(index_dir):
+    shutil.rmtree(checkpoint_dir(index_dir), ignore_errors=True)
+
+
+class CheckpointWriter:
+    """Collects embedded files and commits them as a segment every interval seconds.
+
+    add is meant as embed_media_files' on_files_done callback; manifest must hold
+    the entry of every file passed to it. Call commit once embedding finishes.
+    """
+
+    def __init__(self, checkpoint_path, manifest, interval=CHECKPOINT_INTERVAL):
+        self.checkpoint_path = checkpoint_path
+        self.manifest = manifest
+        self.interval = interval
+        self.pending = {}
+        self.last_commit = time.monotonic()
+
+    def add(self, items_by_path):
+        for path, items in items_by_path.items():
+            self.pending[path] = block_from_items(items)
+        if time.monotonic() - self.last_commit >= self.interval:
+            self.commit()
+
+    def commit(self):
+        if self.pending:
+            commit_segment(self.checkpoint_path, self.pending, self.manifest)
+            print(f"Checkpointed {len(self.pending)} embedded files.")
+        self.pending = {}
+        self.last_commit = time.monotonic()
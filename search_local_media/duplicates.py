@@ -0,0 +1,226 @@
+import os
+import numpy as np
+from index_store import index_fingerprint, normalize_rows
+
+# Near-duplicate detection over indexed files (re-encodes, re-uploads, resized
+# copies). Each file gets one signature, the mean of its normalized frame
+# embeddings. Candidate pairs come from locality-sensitive hashing: a compact
+# random-hyperplane hash (one bit per hyperplane) is split into bands, and only
+# files sharing a band bucket are compared, so the work grows with the number of
+# near matches rather than the number of pairs. Signatures are centered on the
+# library mean before hashing, because CLIP embeddings share a common direction
+# that would otherwise put unrelated files in the same buckets. Candidates are
+# verified exactly and joined into groups with union-find. Both steps are
+# vectorized, so Python loops only over bands and distinct bucket sizes.
+DUPLICATES_FILENAME = "clip_media_duplicates.npz"
+DUPLICATE_SIMILARITY = 0.97  # cosine between file signatures
+LSH_BANDS = 32
+LSH_BAND_BITS = 20  # bits per band; more bits give fewer, purer candidates
+MAX_BUCKET_SIZE = 1000  # larger buckets are only compared against their first file
+DURATION_TOLERANCE = 0.1  # relative difference allowed between sampled video spans
+SIGNATURE_CHUNK_SIZE = 4096  # paths per chunk when pooling and hashing
+
+
+def path_signatures(index):
+    """Returns the normalized mean embedding of every indexed path, in path order."""
+    embeddings = index["embeddings"]
+    offsets = index["path_offsets"]
+    num_paths = len(index["paths"])
+    signatures = np.empty((num_paths, embeddings.shape[1]), dtype=np.float32)
+    for start in range(0, num_paths, SIGNATURE_CHUNK_SIZE):
+        end = min(start + SIGNATURE_CHUNK_SIZE, num_paths)
+        rows = np.asarray(embeddings[offsets[start] : offsets[end]], dtype=np.float32)
+        signatures[start:end] = np.add.reduceat(
+            rows, offsets[start:end] - offsets[start], axis=0
+        )
+    return normalize_rows(signatures)
+
+
+def path_spans(index):
+    """Last sampled timestamp of each path (NaN for images), a proxy for duration."""
+    ends = index["path_offsets"][1:] - 1
+    return index["timestamps"][ends]
+
+
+def lsh_band_codes(signatures, n_bands=LSH_BANDS, band_bits=LSH_BAND_BITS, seed=0):
+    """Hashes centered signatures into one integer bucket code per band."""
+    rng = np.random.default_rng(seed)
+    planes = rng.normal(size=(signatures.shape[1], n_bands * band_bits)).astype(
+        np.float32
+    )
+    centered = signatures - signatures.mean(axis=0)
+    weights = np.int64(1) << np.arange(band_bits, dtype=np.int64)
+    codes = np.empty((len(signatures), n_bands), dtype=np.int64)
+    for start in range(0, len(signatures), SIGNATURE_CHUNK_SIZE):
+        bits = centered[start : start + SIGNATURE_CHUNK_SIZE] @ planes > 0
+        codes[start : start + len(bits)] = (
+            bits.reshape(len(bits), n_bands, band_bits) @ weights
+        )
+    return codes
+
+
+def concatenated_ranges(starts, counts):
+    """Concatenation of arange(start, start + count) for every (start, count)."""
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(
+        counts.sum()
+    )
+
+
+def candidate_pairs(codes):
+    """Returns unique (i, j) pairs, i < j, that share a bucket in any band.
+
+    Buckets with a single file are dropped with one np.unique per band, and the
+    pairs of all buckets of the same size are generated together, so Python only
+    loops over bands and distinct bucket sizes.
+    """
+    num_paths = len(codes)
+    pair_ids = []
+    for band in codes.T:
+        order = np.argsort(band, kind="stable")
+        _, starts, counts = np.unique(
+            band[order], return_index=True, return_counts=True
+        )
+        shared = counts >= 2
+        starts, counts = starts[shared], counts[shared]
+        small = counts <= MAX_BUCKET_SIZE
+        for size in np.unique(counts[small]):
+            same_size = starts[small & (counts == size)]
+            members = order[same_size[:, None] + np.arange(size)]
+            i, j = np.triu_indices(size, 1)
+            pair_ids.append(bucket_pair_ids(members[:, i], members[:, j], num_paths))
+        # Larger buckets: every member against the bucket's first file only
+        large_starts, large_counts = starts[~small], counts[~small]
+        if len(large_starts):
+            first = np.repeat(order[large_starts], large_counts - 1)
+            rest = order[concatenated_ranges(large_starts + 1, large_counts - 1)]
+            pair_ids.append(bucket_pair_ids(first, rest, num_paths))
+    if not pair_ids:
+        return np.empty((0, 2), dtype=np.int64)
+    pair_ids = np.unique(np.concatenate(pair_ids))
+    return np.stack([pair_ids // num_paths, pair_ids % num_paths], axis=1)
+
+
+def bucket_pair_ids(first, second, num_paths):
+    """Encodes pairs of file ids as low * num_paths + high."""
+    first, second = first.ravel(), second.ravel()
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    return low.astype(np.int64) * num_paths + high
+
+
+def union_find_groups(num_items, pairs):
+    """Returns a group id per item (-1 for items without a duplicate).
+
+    Connected components by array hooking and pointer jumping: each round points
+    the larger root of every pair at the smaller one, then flattens the trees,
+    until both ends of every pair share a root.
+    """
+    parent = np.arange(num_items)
+    i, j = (pairs[:, 0], pairs[:, 1]) if len(pairs) else (np.empty(0, int),) * 2
+    while True:
+        root_i, root_j = parent[i], parent[j]
+        unjoined = root_i != root_j
+        if not unjoined.any():
+            break
+        low = np.minimum(root_i[unjoined], root_j[unjoined])
+        high = np.maximum(root_i[unjoined], root_j[unjoined])
+        np.minimum.at(parent, high, low)
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    roots = parent
+    sizes = np.bincount(roots, minlength=num_items)
+    group_ids = np.full(num_items, -1, dtype=np.int32)
+    grouped = sizes[roots] > 1
+    _, group_ids[grouped] = np.unique(roots[grouped], return_inverse=True)
+    return group_ids
+
+
+def find_duplicate_groups(index, threshold=DUPLICATE_SIMILARITY):
+    """Groups near-duplicate files; returns a group id per path (-1 if unique)."""
+    num_paths = len(index["paths"])
+    if num_paths < 2:
+        return np.full(num_paths, -1, dtype=np.int32)
+    signatures = path_signatures(index)
+    pairs = candidate_pairs(lsh_band_codes(signatures))
+    print(f"Verifying {len(pairs)} LSH candidate pairs among {num_paths} files...")
+    verified = []
+    path_types = index["types"][index["path_offsets"][:-1]]
+    spans = path_spans(index)
+    for start in range(0, len(pairs), SIGNATURE_CHUNK_SIZE):
+        i, j = pairs[start : start + SIGNATURE_CHUNK_SIZE].T
+        similar = (signatures[i] * signatures[j]).sum(axis=1) >= threshold
+        # An image never duplicates a video, and copies of a video last as long
+        similar &= path_types[i] == path_types[j]
+        with np.errstate(invalid="ignore"):
+            span_gap = np.abs(spans[i] - spans[j]) / np.maximum(spans[i], spans[j])
+        similar &= np.isnan(span_gap) | (span_gap <= DURATION_TOLERANCE)
+        verified.append(pairs[start : start + SIGNATURE_CHUNK_SIZE][similar])
+    return union_find_groups(num_paths, np.concatenate(verified))
+
+
+def duplicate_groups_as_paths(index, group_ids):
+    """Lists each duplicate group as its sorted paths, largest groups first."""
+    groups = {}
+    for path, group_id in zip(index["paths"], group_ids):
+        if group_id >= 0:
+            groups.setdefault(int(group_id), []).append(str(path))
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def save_duplicates(media_folder, group_ids, threshold):
+    duplicates_path = os.path.join(media_folder, DUPLICATES_FILENAME)
+    with open(duplicates_path + ".tmp", "wb") as f:
+        np.savez(
+            f,
+            index_fingerprint=index_fingerprint(media_folder),
+            group_ids=group_ids,
+            threshold=threshold,
+        )
+    os.replace(duplicates_path + ".tmp", duplicates_path)
+
+
+def load_duplicates(media_folder, threshold):
+    """Loads persisted group ids, or None if missing, stale or for another threshold."""
+    duplicates_path = os.path.join(media_folder, DUPLICATES_FILENAME)
+    if not os.path.exists(duplicates_path):
+        return None
+    with np.load(duplicates_path) as data:
+        if (
+            data["index_fingerprint"] != index_fingerprint(media_folder)
+            or float(data["threshold"]) != threshold
+        ):
+            return None
+        return data["group_ids"]
+
+
+def load_or_build_duplicates(
+    media_folder, index, threshold=DUPLICATE_SIMILARITY, rebuild=False
+):
+    """Returns a duplicate group id per indexed path, (re)computing it when stale."""
+    group_ids = None if rebuild else load_duplicates(media_folder, threshold)
+    if group_ids is None:
+        group_ids = find_duplicate_groups(index, threshold)
+        save_duplicates(media_folder, group_ids, threshold)
+    return group_ids
+
+
+def collapse_duplicate_results(results, index):
+    """Keeps only the results of the first-ranked file of each duplicate group.
+
+    Other frames of that same file are kept; index must have "duplicate_groups".
+    """
+    group_ids = index["duplicate_groups"]
+    paths = index["paths"]
+    group_owner = {}
+    collapsed = []
+    for score, item in results:
+        path_id = np.searchsorted(paths, item["path"])
+        group_id = int(group_ids[path_id])
+        if group_id >= 0 and group_owner.setdefault(group_id, item["path"]) != (
+            item["path"]
+        ):
+            continue
+        collapsed.append((score, item))
+    return collapsed
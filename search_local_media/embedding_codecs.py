@@ -0,0 +1,164 @@
+import os
+import numpy as np
+from index_store import index_fingerprint, top_k_indices
+
+# Compressed copies of the embedding matrix that are kept in RAM and scored
+# directly; the float32 matrix stays memory-mapped on disk for exact re-ranking.
+#   float16  2 bytes/dim
+#   int8     1 byte/dim plus one float32 scale per vector
+#   pq       product quantization: one uint8 code per subspace, scored with
+#            asymmetric distance computation (float query vs. quantized rows)
+CODES_FILENAME = "clip_media_codes.npz"
+STORAGE_FORMATS = ["float32", "float16", "int8", "pq"]
+PQ_SUBSPACES = 64  # 512-d CLIP embeddings -> 8 dims per subspace, 64 bytes per vector
+PQ_CENTROIDS = 256  # fits one uint8 code per subspace
+PQ_TRAIN_SIZE = 32768
+PQ_ITERATIONS = 15
+RERANK_FACTOR = 10  # shortlist size = top_k * RERANK_FACTOR
+SCORE_CHUNK_SIZE = 65536
+
+
+def euclidean_kmeans(data, n_clusters, n_iter=PQ_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        distances = (centroids**2).sum(axis=1) - 2 * data @ centroids.T
+        assignments = np.argmin(distances, axis=1)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return centroids
+
+
+def train_pq(embeddings, n_subspaces=PQ_SUBSPACES, seed=0):
+    """Trains one codebook of up to 256 centroids per subspace."""
+    num_rows, dim = embeddings.shape
+    if dim % n_subspaces:
+        raise ValueError(
+            f"Embedding dimension {dim} is not divisible by {n_subspaces} PQ subspaces."
+        )
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(
+        rng.choice(num_rows, min(num_rows, PQ_TRAIN_SIZE), replace=False)
+    )
+    sample = np.asarray(embeddings[sample_rows], dtype=np.float32)
+    sub_dim = dim // n_subspaces
+    n_centroids = min(PQ_CENTROIDS, len(sample))
+    return np.stack(
+        [
+            euclidean_kmeans(sample[:, m * sub_dim : (m + 1) * sub_dim], n_centroids)
+            for m in range(n_subspaces)
+        ]
+    )
+
+
+def pq_encode(embeddings, codebooks):
+    n_subspaces, _, sub_dim = codebooks.shape
+    codes = np.empty((len(embeddings), n_subspaces), dtype=np.uint8)
+    for start in range(0, len(embeddings), SCORE_CHUNK_SIZE):
+        chunk = np.asarray(embeddings[start : start + SCORE_CHUNK_SIZE])
+        for m in range(n_subspaces):
+            sub = chunk[:, m * sub_dim : (m + 1) * sub_dim]
+            distances = (codebooks[m] ** 2).sum(axis=1) - 2 * sub @ codebooks[m].T
+            codes[start : start + len(chunk), m] = np.argmin(distances, axis=1)
+    return codes
+
+
+def encode_embeddings(embeddings, storage, n_subspaces=PQ_SUBSPACES):
+    """Builds the compressed representation of a normalized embedding matrix."""
+    if storage == "float16":
+        return {"storage": storage, "codes": np.asarray(embeddings, dtype=np.float16)}
+    if storage == "int8":
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(embeddings / scales[:, None]).astype(np.int8)
+        return {"storage": storage, "codes": codes, "scales": scales.astype(np.float32)}
+    if storage == "pq":
+        print(f"Training product quantizer with {n_subspaces} subspaces...")
+        codebooks = train_pq(embeddings, n_subspaces)
+        return {
+            "storage": storage,
+            "codes": pq_encode(embeddings, codebooks),
+            "codebooks": codebooks,
+        }
+    raise ValueError(f"Unknown storage format: {storage}")
+
+
+def score_codes(query, codes, rows=None):
+    """Scores a normalized query against compressed rows (all rows if rows is None)."""
+    data = codes["codes"] if rows is None else codes["codes"][rows]
+    storage = codes["storage"]
+    if storage == "pq":
+        codebooks = codes["codebooks"]
+        n_subspaces, _, sub_dim = codebooks.shape
+        # Asymmetric distance computation: one lookup table of partial inner
+        # products per subspace, then each row's score is a sum of table entries.
+        lookup = np.einsum("mkd,md->mk", codebooks, query.reshape(n_subspaces, sub_dim))
+        subspaces = np.arange(n_subspaces)
+        return np.concatenate(
+            [
+                lookup[subspaces, data[start : start + SCORE_CHUNK_SIZE]].sum(axis=1)
+                for start in range(0, len(data), SCORE_CHUNK_SIZE)
+            ]
+            or [np.empty(0, dtype=np.float32)]
+        )
+    scores = np.concatenate(
+        [
+            data[start : start + SCORE_CHUNK_SIZE].astype(np.float32) @ query
+            for start in range(0, len(data), SCORE_CHUNK_SIZE)
+        ]
+        or [np.empty(0, dtype=np.float32)]
+    )
+    if storage == "int8":
+        scales = codes["scales"] if rows is None else codes["scales"][rows]
+        scores *= scales
+    return scores
+
+
+def rerank_shortlist(query, embeddings, rows, approx_scores, top_k):
+    """Re-scores the best top_k * RERANK_FACTOR rows exactly from the float32 matrix.
+
+    Returns (rows, scores), best first.
+    """
+    shortlist = rows[top_k_indices(approx_scores, top_k * RERANK_FACTOR)]
+    shortlist.sort()  # sequential access into the memmap
+    exact = embeddings[shortlist] @ query
+    best = top_k_indices(exact, top_k)
+    return shortlist[best], exact[best]
+
+
+def save_codes(media_folder, codes):
+    codes_path = os.path.join(media_folder, CODES_FILENAME)
+    with open(codes_path + ".tmp", "wb") as f:
+        np.savez(f, index_fingerprint=index_fingerprint(media_folder), **codes)
+    os.replace(codes_path + ".tmp", codes_path)
+
+
+def load_codes(media_folder, storage):
+    """Loads persisted codes of the requested format, or None if missing or stale."""
+    codes_path = os.path.join(media_folder, CODES_FILENAME)
+    if not os.path.exists(codes_path):
+        return None
+    with np.load(codes_path) as data:
+        codes = {name: data[name] for name in data.files}
+    if (
+        codes.pop("index_fingerprint", None) != index_fingerprint(media_folder)
+        or str(codes["storage"]) != storage
+    ):
+        return None
+    codes["storage"] = storage
+    return codes
+
+
+def load_or_build_codes(media_folder, index, storage, rebuild=False):
+    """Returns compressed codes for the index, (re)encoding them when stale."""
+    codes = None if rebuild else load_codes(media_folder, storage)
+    if codes is None:
+        codes = encode_embeddings(index["embeddings"], storage)
+        save_codes(media_folder, codes)
+        size_mb = sum(v.nbytes for v in codes.values() if hasattr(v, "nbytes")) / 1e6
+        print(f"{storage} codes ({size_mb:.1f} MB) saved to {CODES_FILENAME}")
+    return codes
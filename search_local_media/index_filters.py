@@ -0,0 +1,86 @@
+import fnmatch
+import numpy as np
+from index_store import MEDIA_TYPES
+
+# Filters are evaluated on the precomputed metadata columns before any
+# similarity math. Path-level filters (prefix, glob, file mtime) work on the
+# sorted per-path table, which is much smaller than the row count: a prefix is a
+# binary search giving a contiguous range of path ids, and since rows are grouped
+# by path the selected paths map directly to row ranges. Row-level filters
+# (media type, timestamp) are then applied only to those rows.
+FILTER_KEYS = [
+    "media_type",
+    "path_prefix",
+    "path_glob",
+    "timestamp_range",
+    "mtime_range",
+]
+
+
+def in_range(values, value_range):
+    low, high = value_range
+    mask = np.ones(len(values), dtype=bool)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
+
+
+def rows_for_paths(index, path_ids):
+    """Expands path ids into their (sorted) row numbers without a Python loop."""
+    starts = index["path_offsets"][path_ids]
+    counts = index["path_offsets"][path_ids + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    # Each row is its path's start plus its position within that path
+    run_starts = np.repeat(
+        starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts
+    )
+    return run_starts + np.arange(total)
+
+
+def filter_rows(
+    index,
+    media_type=None,
+    path_prefix=None,
+    path_glob=None,
+    timestamp_range=None,
+    mtime_range=None,
+):
+    """Returns the sorted rows matching every given filter, or None if none is set.
+
+    timestamp_range and mtime_range are (low, high) tuples; either end may be None.
+    A timestamp range only matches video frames.
+    """
+    if all(
+        value is None
+        for value in (media_type, path_prefix, path_glob, timestamp_range, mtime_range)
+    ):
+        return None
+
+    paths = index["paths"]
+    low, high = 0, len(paths)
+    if path_prefix:
+        # The prefix range of a sorted table; chr(0x10FFFF) sorts after any character
+        low = np.searchsorted(paths, path_prefix, side="left")
+        high = np.searchsorted(paths, path_prefix + chr(0x10FFFF), side="left")
+    path_ids = np.arange(low, high)
+    if path_glob:
+        matches = [
+            fnmatch.fnmatchcase(str(path), path_glob) for path in paths[low:high]
+        ]
+        path_ids = path_ids[np.array(matches, dtype=bool)]
+    if mtime_range:
+        path_ids = path_ids[in_range(index["path_mtimes"][path_ids], mtime_range)]
+
+    if len(path_ids) == len(paths):
+        rows = np.arange(len(index["types"]))
+    else:
+        rows = rows_for_paths(index, path_ids)
+    if media_type is not None:
+        rows = rows[index["types"][rows] == MEDIA_TYPES.index(media_type)]
+    if timestamp_range:
+        rows = rows[in_range(index["timestamps"][rows], timestamp_range)]
+    return rows
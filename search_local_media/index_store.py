@@ -0,0 +1,208 @@
+import os
+import pickle
+import time
+import numpy as np
+
+# On-disk layout (all files live in the media folder):
+#   clip_media_embeddings.<generation>.npy  float32 (N, D) matrix of L2-normalized embeddings,
+#                                           memory-mapped on load
+#   clip_media_metadata.npz    per-path columns: sorted unique paths, row offsets, file mtimes;
+#                              per-row columns: type codes, timestamps; the name of the
+#                              embeddings file it belongs to
+# Rows are grouped by path in sorted path order, so the rows of paths[i] are
+# path_offsets[i]:path_offsets[i + 1]. Each save writes a new embeddings file and
+# then atomically replaces the metadata, so the metadata is the single commit point
+# and readers always see a complete, matching pair.
+EMBEDDINGS_FILENAME = "clip_media_embeddings.npy"
+METADATA_FILENAME = "clip_media_metadata.npz"
+LEGACY_INDEX_FILENAME = "clip_media_index.pkl"
+
+MEDIA_TYPES = ["image", "video_frame"]  # index in this list is the stored type code
+# Indexing defaults, kept here so the CLI can show them without importing CLIP
+BATCH_SIZE = 32  # Images/frames (or query texts) embedded per forward pass
+DECODE_WORKERS = 4  # Threads decoding and preprocessing files while indexing
+FRAME_DECODERS = ["single_pass", "seek", "adaptive"]
+
+
+def normalize_rows(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def block_from_items(items):
+    """Converts item dicts of one file into an (embeddings, types, timestamps) block."""
+    if not items:
+        return None
+    embeddings = normalize_rows(np.stack([item["embedding"] for item in items]))
+    types = np.array([MEDIA_TYPES.index(item["type"]) for item in items], dtype=np.int8)
+    timestamps = np.array(
+        [np.nan if item["timestamp"] is None else item["timestamp"] for item in items],
+        dtype=np.float32,
+    )
+    return embeddings, types, timestamps
+
+
+def path_block(index, path):
+    """Returns the (embeddings, types, timestamps) rows of a path, or None if not indexed."""
+    paths = index["paths"]
+    pos = np.searchsorted(paths, path)
+    if pos >= len(paths) or paths[pos] != path:
+        return None
+    start, end = index["path_offsets"][pos], index["path_offsets"][pos + 1]
+    return (
+        index["embeddings"][start:end],
+        index["types"][start:end],
+        index["timestamps"][start:end],
+    )
+
+
+def save_index(media_folder, path_blocks, manifest=None):
+    """Writes {path: block} to disk, streaming rows into the memory-mapped matrix.
+
+    File mtimes are taken from the manifest when given (NaN otherwise). The new
+    embeddings go to a fresh file and the metadata naming it is swapped in with
+    os.replace, so an existing index stays readable until the new one is complete.
+    """
+    paths = sorted(path for path, block in path_blocks.items() if block is not None)
+    counts = [len(path_blocks[path][0]) for path in paths]
+    path_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    path_offsets[1:] = np.cumsum(counts)
+    num_rows = int(path_offsets[-1])
+    dim = path_blocks[paths[0]][0].shape[1] if paths else 0
+
+    embeddings_file = embeddings_filename(time.time_ns())
+    metadata_path = os.path.join(media_folder, METADATA_FILENAME)
+    tmp_metadata_path = metadata_path + ".tmp"
+
+    matrix = np.lib.format.open_memmap(
+        os.path.join(media_folder, embeddings_file),
+        mode="w+",
+        dtype=np.float32,
+        shape=(num_rows, dim),
+    )
+    types = np.empty(num_rows, dtype=np.int8)
+    timestamps = np.empty(num_rows, dtype=np.float32)
+    for i, path in enumerate(paths):
+        start, end = path_offsets[i], path_offsets[i + 1]
+        block_embeddings, block_types, block_timestamps = path_blocks[path]
+        matrix[start:end] = block_embeddings
+        types[start:end] = block_types
+        timestamps[start:end] = block_timestamps
+    matrix.flush()
+    del matrix
+
+    with open(tmp_metadata_path, "wb") as f:
+        np.savez(
+            f,
+            paths=np.array(paths, dtype=str),
+            path_offsets=path_offsets,
+            path_mtimes=np.array(
+                [(manifest or {}).get(path, {}).get("mtime", np.nan) for path in paths],
+                dtype=np.float64,
+            ),
+            types=types,
+            timestamps=timestamps,
+            embeddings_file=embeddings_file,
+        )
+    os.replace(tmp_metadata_path, metadata_path)
+    remove_stale_embeddings(media_folder, embeddings_file)
+    return load_index(media_folder)
+
+
+def embeddings_filename(generation):
+    root, ext = os.path.splitext(EMBEDDINGS_FILENAME)
+    return f"{root}.{generation}{ext}"
+
+
+def remove_stale_embeddings(media_folder, current_file):
+    """Deletes embeddings files of replaced (or never committed) index generations."""
+    root, ext = os.path.splitext(EMBEDDINGS_FILENAME)
+    for name in os.listdir(media_folder):
+        if name.startswith(root) and name.endswith(ext) and name != current_file:
+            try:
+                os.remove(os.path.join(media_folder, name))
+            except OSError:
+                pass
+
+
+def load_index(media_folder):
+    """Loads the index with the embedding matrix memory-mapped; None if there is none."""
+    metadata_path = os.path.join(media_folder, METADATA_FILENAME)
+    # A concurrent save can replace the metadata and delete the embeddings file it
+    # named between the two reads; the second attempt sees the new pair
+    for attempt in range(2):
+        if not os.path.exists(metadata_path):
+            return None
+        with np.load(metadata_path) as metadata:
+            index = {name: metadata[name] for name in metadata.files}
+        embeddings_path = os.path.join(
+            media_folder, str(index.pop("embeddings_file", EMBEDDINGS_FILENAME))
+        )
+        num_rows = int(index["path_offsets"][-1])
+        try:
+            # mmap cannot map a zero-length data section
+            index["embeddings"] = np.load(
+                embeddings_path, mmap_mode="r" if num_rows else None
+            )
+            break
+        except FileNotFoundError:
+            if attempt:
+                return None
+    if "path_mtimes" not in index:
+        index["path_mtimes"] = np.full(len(index["paths"]), np.nan)
+    index["path_ids"] = np.repeat(
+        np.arange(len(index["paths"]), dtype=np.int32), np.diff(index["path_offsets"])
+    )
+    return index
+
+
+def index_fingerprint(media_folder):
+    """Identifies the current index; derived structures store it to detect staleness."""
+    return os.stat(os.path.join(media_folder, METADATA_FILENAME)).st_mtime_ns
+
+
+def top_k_indices(scores, top_k):
+    """Indices of the top_k highest scores, best first, without sorting everything."""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def index_size(index):
+    return 0 if index is None else len(index["types"])
+
+
+def index_item(index, row):
+    """Returns the metadata of one row as the item dict used for search results."""
+    timestamp = float(index["timestamps"][row])
+    return {
+        "path": str(index["paths"][index["path_ids"][row]]),
+        "type": MEDIA_TYPES[index["types"][row]],
+        "timestamp": None if np.isnan(timestamp) else timestamp,
+    }
+
+
+def convert_legacy_index(media_folder):
+    """Converts a pickled list-of-dicts index to the memory-mapped format, if present."""
+    legacy_path = os.path.join(media_folder, LEGACY_INDEX_FILENAME)
+    if not os.path.exists(legacy_path):
+        return None
+    print(f"Converting legacy index {legacy_path} to the memory-mapped format...")
+    with open(legacy_path, "rb") as f:
+        items = pickle.load(f)
+    items_by_path = {}
+    for item in items:
+        items_by_path.setdefault(item["path"], []).append(item)
+    index = save_index(
+        media_folder,
+        {
+            path: block_from_items(path_items)
+            for path, path_items in items_by_path.items()
+        },
+    )
+    os.remove(legacy_path)
+    return index
@@ -0,0 +1,126 @@
+import heapq
+import math
+import ffmpeg
+import numpy as np
+
+# Content-adaptive keyframe sampling: the video is decoded once at a low analysis
+# frame rate, each frame gets a cheap change score (mean absolute difference of
+# 32x32 grayscale thumbnails against the previous analysed frame), and every
+# minute of video keeps its highest-change frames up to a fixed budget. Long
+# videos therefore get proportionally more frames and static ones very few.
+ANALYSIS_FPS = 2
+KEYFRAMES_PER_MINUTE = 6
+MIN_CHANGE = 0.04  # change scores are in [0, 1]; below this a frame is not a candidate
+WINDOW_SECONDS = 60.0
+THUMBNAIL_SIZE = 32
+# Cosine similarity above which a kept frame repeats the previous one
+NEAR_DUPLICATE_SIMILARITY = 0.95
+
+
+def change_thumbnail(frame):
+    """Downsamples an RGB frame to a THUMBNAIL_SIZE^2 grayscale array in [0, 1]."""
+    size = frame.shape[0]
+    block = size // THUMBNAIL_SIZE
+    gray = frame[: block * THUMBNAIL_SIZE, : block * THUMBNAIL_SIZE].mean(
+        axis=2, dtype=np.float32
+    )
+    return (
+        gray.reshape(THUMBNAIL_SIZE, block, THUMBNAIL_SIZE, block).mean(axis=(1, 3))
+        / 255.0
+    )
+
+
+def window_keyframes(candidates, budget):
+    """Picks up to budget frames from a window's (change, timestamp, frame) heap.
+
+    Frames below MIN_CHANGE are skipped, but every window keeps at least its most
+    changed frame so static footage is still represented once per minute.
+    """
+    best = heapq.nlargest(budget, candidates, key=lambda c: c[0])
+    selected = [c for c in best if c[0] >= MIN_CHANGE] or best[:1]
+    return sorted(selected, key=lambda c: c[1])
+
+
+def extract_keyframes_adaptive(
+    video_path, size, keyframes_per_minute=KEYFRAMES_PER_MINUTE
+):
+    """Yields {"image", "timestamp", "source_video"} keyframes from one decode pass.
+
+    Frames are streamed from ffmpeg as raw size x size RGB (scaled and center-cropped
+    like CLIP's processor), and only the current window's best candidates are held
+    in memory, so memory does not grow with video length. Errors, including ffmpeg
+    exiting with an error, are printed and raised.
+    """
+    frame_bytes = size * size * 3
+    process = None
+    try:
+        process = (
+            ffmpeg.input(video_path)
+            .video.filter("fps", fps=ANALYSIS_FPS)
+            .filter("scale", size, size, force_original_aspect_ratio="increase")
+            .filter("crop", size, size)
+            .output("pipe:", format="rawvideo", pix_fmt="rgb24")
+            .global_args("-loglevel", "error")
+            .run_async(pipe_stdout=True)
+        )
+        candidates = []  # min-heap of (change, timestamp, frame), at most one budget
+        window_end = WINDOW_SECONDS
+        previous = None
+        frame_index = 0
+        timestamp = 0.0
+        while True:
+            buffer = process.stdout.read(frame_bytes)
+            if len(buffer) < frame_bytes:
+                if process.wait():
+                    raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+                break
+            frame = np.frombuffer(buffer, dtype=np.uint8).reshape(size, size, 3)
+            timestamp = frame_index / ANALYSIS_FPS
+            frame_index += 1
+
+            thumbnail = change_thumbnail(frame)
+            # The opening frame (often black or a title) changes nothing; it is
+            # kept only when its window has no better frame
+            change = (
+                0.0 if previous is None else float(np.abs(thumbnail - previous).mean())
+            )
+            previous = thumbnail
+
+            if timestamp >= window_end:
+                for _, keyframe_time, keyframe in window_keyframes(
+                    candidates, keyframes_per_minute
+                ):
+                    yield {
+                        "image": keyframe,
+                        "timestamp": keyframe_time,
+                        "source_video": video_path,
+                    }
+                candidates = []
+                window_end = (
+                    math.floor(timestamp / WINDOW_SECONDS) + 1
+                ) * WINDOW_SECONDS
+            heapq.heappush(candidates, (change, timestamp, frame))
+            if len(candidates) > keyframes_per_minute:
+                heapq.heappop(candidates)
+
+        # The last, partial window gets a budget proportional to its length
+        window_start = window_end - WINDOW_SECONDS
+        budget = max(
+            1,
+            math.ceil(
+                keyframes_per_minute * (timestamp - window_start) / WINDOW_SECONDS
+            ),
+        )
+        for _, keyframe_time, keyframe in window_keyframes(candidates, budget):
+            yield {
+                "image": keyframe,
+                "timestamp": keyframe_time,
+                "source_video": video_path,
+            }
+    except Exception as e:
+        print(f"Error sampling keyframes from {video_path}: {str(e)}")
+        raise
+    finally:
+        if process is not None:
+            process.stdout.close()
+            process.wait()
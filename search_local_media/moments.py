@@ -0,0 +1,87 @@
+import json
+import numpy as np
+
+# Moment retrieval: instead of isolated frames, a query returns [start, end]
+# intervals of videos. The frames of each candidate video are scored, their scores
+# are smoothed along the video's timeline with a moving average over
+# +/- SMOOTH_SECONDS, and consecutive frames whose smoothed score is within
+# MOMENT_MARGIN of the best one in the same video are merged into an interval;
+# the intervals of all videos are then ranked together. All of it runs on the
+# frames of every candidate video at once, with no per-frame Python loop.
+MOMENT_CANDIDATES = 200  # top frames whose videos are scored in full
+SMOOTH_SECONDS = 4.0
+MOMENT_MARGIN = 0.02  # smoothed score below the video's best still inside a moment
+MOMENT_PADDING = 1.0  # seconds added before and after the first and last frame
+
+
+def smooth_scores(path_ids, timestamps, scores, window=SMOOTH_SECONDS):
+    """Mean score of the frames within +/- window seconds of each frame, same video.
+
+    Rows must be sorted by path id, then timestamp.
+    """
+    if len(scores) == 0:
+        return np.empty(0, dtype=np.float64)
+    # Lay every video on its own stretch of one time axis, far enough apart that
+    # no window reaches into the next video, so one searchsorted finds all windows
+    _, video_ranks = np.unique(path_ids, return_inverse=True)
+    stretch = float(np.max(timestamps)) + 2 * window + 1
+    keys = video_ranks * stretch + timestamps.astype(np.float64)
+    lows = np.searchsorted(keys, keys - window, side="left")
+    highs = np.searchsorted(keys, keys + window, side="right")
+    cumulative = np.concatenate(([0.0], np.cumsum(scores, dtype=np.float64)))
+    return (cumulative[highs] - cumulative[lows]) / (highs - lows)
+
+
+def merge_moments(
+    path_ids, timestamps, scores, margin=MOMENT_MARGIN, window=SMOOTH_SECONDS
+):
+    """Merges runs of high-scoring frames into intervals, best first.
+
+    A frame is high when its smoothed score is within margin of the best smoothed
+    score of its own video, so every candidate video yields at least one interval.
+    Rows must be sorted by path id, then timestamp. Returns arrays (path_ids,
+    starts, ends, peaks, scores), one entry per interval: the first and last
+    frame of the run, the best raw frame in it and its best smoothed score.
+    """
+    smoothed = smooth_scores(path_ids, timestamps, scores, window)
+    if len(smoothed) == 0:
+        return tuple(np.empty(0) for _ in range(5))
+    same_video = path_ids[1:] == path_ids[:-1]
+    video_starts = np.flatnonzero(np.concatenate(([True], ~same_video)))
+    video_best = np.maximum.reduceat(smoothed, video_starts)
+    video_of_row = np.repeat(
+        np.arange(len(video_starts)), np.diff(video_starts, append=len(smoothed))
+    )
+    high = smoothed >= video_best[video_of_row] - margin
+    continues = np.concatenate(([False], high[:-1] & same_video))
+    continued = np.concatenate((high[1:] & same_video, [False]))
+    first_rows = np.flatnonzero(high & ~continues)
+    last_rows = np.flatnonzero(high & ~continued)
+
+    high_rows = np.flatnonzero(high)
+    run_ids = np.cumsum(high & ~continues)[high_rows] - 1
+    run_starts = np.searchsorted(run_ids, np.arange(len(first_rows)))
+    run_scores = np.maximum.reduceat(smoothed[high_rows], run_starts)
+    # Best raw frame of each run: sort by run, then score descending, take firsts
+    by_run = np.lexsort((-scores[high_rows], run_ids))
+    peak_rows = high_rows[by_run[run_starts]]
+
+    order = np.argsort(-run_scores, kind="stable")
+    return (
+        path_ids[first_rows][order],
+        timestamps[first_rows][order],
+        timestamps[last_rows][order],
+        timestamps[peak_rows][order],
+        run_scores[order],
+    )
+
+
+def write_moments(output_path, moments):
+    """Writes (score, moment) pairs as JSON for split_video.py and extract_frames.py."""
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(
+            [dict(moment, score=score) for score, moment in moments],
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
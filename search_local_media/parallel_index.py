@@ -0,0 +1,150 @@
+import heapq
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from utils import (
+    embed_media_files,
+    load_clip_model,
+    load_manifest,
+    save_manifest,
+    BATCH_SIZE,
+)
+from index_store import load_index, path_block, save_index
+from build_checkpoint import CheckpointWriter, CHECKPOINT_INTERVAL
+
+# Indexes built for a path prefix (e.g. one per machine) are written as shards
+# under the media folder and combined into the main index by merge_shards.
+SHARDS_DIRNAME = "clip_media_shards"
+SHARD_INFO_FILENAME = "shard_info.json"
+
+
+def shard_dir_for_prefix(media_folder, path_prefix):
+    shard_name = os.path.normpath(path_prefix).replace(os.sep, "__")
+    return os.path.join(media_folder, SHARDS_DIRNAME, shard_name)
+
+
+def save_shard_info(shard_dir, path_prefix):
+    with open(os.path.join(shard_dir, SHARD_INFO_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({"path_prefix": os.path.normpath(path_prefix)}, f)
+
+
+def split_by_size(media_paths, num_parts):
+    """Splits paths into num_parts lists of roughly equal total file size."""
+    sizes = {}
+    for path in media_paths:
+        try:
+            sizes[path] = os.path.getsize(path)
+        except OSError:
+            sizes[path] = 0
+    parts = [[] for _ in range(num_parts)]
+    heap = [(0, i) for i in range(num_parts)]
+    # Largest files first, each to the currently lightest part
+    for path in sorted(media_paths, key=sizes.get, reverse=True):
+        load, i = heapq.heappop(heap)
+        parts[i].append(path)
+        heapq.heappush(heap, (load + sizes[path], i))
+    return [part for part in parts if part]
+
+
+def index_worker(
+    checkpoint_path,
+    manifest,
+    batch_size,
+    frame_decoder,
+    num_threads,
+    checkpoint_interval,
+    quantize=False,
+):
+    """Runs in a worker process: loads CLIP once and commits checkpoint segments."""
+    model, processor = load_clip_model(quantize, num_threads=num_threads)
+    writer = CheckpointWriter(checkpoint_path, manifest, checkpoint_interval)
+    embed_media_files(
+        list(manifest),
+        model,
+        processor,
+        batch_size,
+        frame_decoder,
+        on_files_done=writer.add,
+    )
+    writer.commit()
+    return len(manifest)
+
+
+def embed_media_files_parallel(
+    media_paths,
+    manifest,
+    checkpoint_path,
+    num_workers,
+    batch_size=BATCH_SIZE,
+    frame_decoder="single_pass",
+    checkpoint_interval=CHECKPOINT_INTERVAL,
+    quantize=False,
+):
+    """Embeds files across num_workers processes.
+
+    Every worker commits its files to the build's checkpoint segments (see
+    build_checkpoint), where the caller picks them up; manifest must hold the
+    entry of every path.
+    """
+    parts = split_by_size(media_paths, num_workers)
+    num_threads = max(1, (os.cpu_count() or 1) // len(parts))
+    print(
+        f"Embedding {len(media_paths)} files in {len(parts)} processes with {num_threads} torch threads each..."
+    )
+    # spawn rather than fork: forked children inherit torch's thread pools badly
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(parts), mp_context=context) as pool:
+        futures = [
+            pool.submit(
+                index_worker,
+                checkpoint_path,
+                {path: manifest[path] for path in part},
+                batch_size,
+                frame_decoder,
+                num_threads,
+                checkpoint_interval,
+                quantize,
+            )
+            for part in parts
+        ]
+        for future in futures:
+            future.result()
+
+
+def merge_shards(media_folder):
+    """Merges every prefix shard under the media folder into the main index.
+
+    Each shard replaces everything the main index holds under its path prefix, so
+    files deleted on the machine that built the shard are dropped as well.
+    """
+    shards_root = os.path.join(media_folder, SHARDS_DIRNAME)
+    shard_dirs = sorted(
+        os.path.join(shards_root, name)
+        for name in (os.listdir(shards_root) if os.path.isdir(shards_root) else [])
+        if os.path.exists(os.path.join(shards_root, name, SHARD_INFO_FILENAME))
+    )
+    if not shard_dirs:
+        print(f"No shards found in {shards_root}")
+        return load_index(media_folder)
+
+    main_index = load_index(media_folder)
+    manifest = load_manifest(media_folder) if main_index is not None else {}
+    path_blocks = {path: path_block(main_index, path) for path in manifest}
+    for shard_dir in shard_dirs:
+        with open(os.path.join(shard_dir, SHARD_INFO_FILENAME), encoding="utf-8") as f:
+            prefix_root = os.path.join(media_folder, json.load(f)["path_prefix"])
+        for path in [p for p in manifest if p.startswith(prefix_root + os.sep)]:
+            del manifest[path]
+            del path_blocks[path]
+        shard = load_index(shard_dir)
+        shard_manifest = load_manifest(shard_dir)
+        for path, entry in shard_manifest.items():
+            manifest[path] = entry
+            path_blocks[path] = path_block(shard, path) if shard is not None else None
+        print(f"Merged shard {shard_dir} ({len(shard_manifest)} files)")
+
+    index = save_index(media_folder, path_blocks, manifest)
+    save_manifest(media_folder, manifest)
+    print(f"Merged {len(shard_dirs)} shard(s) into the index in {media_folder}")
+    return index
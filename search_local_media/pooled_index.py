@@ -0,0 +1,126 @@
+import os
+import numpy as np
+from index_store import index_fingerprint, normalize_rows, top_k_indices
+
+# Coarse-to-fine search structures: one mean-pooled embedding per file and one per
+# segment (SEGMENT_SECONDS of a video's frames). A query first ranks files by their
+# pooled embedding, then the segments of the best files, and only the frames of
+# the best segments are scored exactly, so the cost follows the number of files
+# rather than the number of frames. Images are a single segment of one row, so
+# their pooled embedding is exact.
+POOLED_FILENAME = "clip_media_pooled.npz"
+SEGMENT_SECONDS = 60.0
+COARSE_VIDEOS = 64  # files kept after the first stage
+SEGMENTS_PER_VIDEO = 4  # segments kept per kept file, on average, after the second
+POOL_CHUNK_SIZE = 4096  # segments pooled per chunk of rows
+
+
+def pool_rows(embeddings, starts, ends):
+    """Sums the rows of each contiguous [start, end) range, in chunks of ranges."""
+    sums = np.empty((len(starts), embeddings.shape[1]), dtype=np.float32)
+    for first in range(0, len(starts), POOL_CHUNK_SIZE):
+        last = min(first + POOL_CHUNK_SIZE, len(starts))
+        rows = np.asarray(embeddings[starts[first] : ends[last - 1]], dtype=np.float32)
+        sums[first:last] = np.add.reduceat(rows, starts[first:last] - starts[first])
+    return sums
+
+
+def build_pooled_index(index):
+    """Computes the per-segment and per-file pooled embeddings of the index."""
+    num_rows = len(index["types"])
+    path_ids = index["path_ids"]
+    # Frames of a file are stored in time order, so segments are contiguous rows
+    buckets = np.floor(np.nan_to_num(index["timestamps"]) / SEGMENT_SECONDS)
+    new_segment = np.ones(num_rows, dtype=bool)
+    new_segment[1:] = (path_ids[1:] != path_ids[:-1]) | (buckets[1:] != buckets[:-1])
+    segment_starts = np.flatnonzero(new_segment)
+    segment_ends = np.append(segment_starts[1:], num_rows)
+    segment_sums = pool_rows(index["embeddings"], segment_starts, segment_ends)
+    segment_path_ids = path_ids[segment_starts]
+    path_segment_offsets = np.searchsorted(
+        segment_path_ids, np.arange(len(index["paths"]) + 1)
+    )
+    return {
+        "segment_starts": segment_starts,
+        "segment_ends": segment_ends,
+        "segment_path_ids": segment_path_ids,
+        "segment_embeddings": normalize_rows(segment_sums),
+        "path_segment_offsets": path_segment_offsets,
+        "path_embeddings": normalize_rows(
+            np.add.reduceat(segment_sums, path_segment_offsets[:-1])
+        ),
+    }
+
+
+def coarse_candidate_rows(
+    query, pooled, coarse_videos=COARSE_VIDEOS, allowed_rows=None
+):
+    """Returns the sorted rows of the best segments of the best files for a query.
+
+    query must be normalized. allowed_rows (sorted, from filter_rows) restricts the
+    ranking to the segments holding at least one allowed row, and their files.
+    """
+    path_ids = np.arange(len(pooled["path_embeddings"]))
+    allowed_segments = None
+    if allowed_rows is not None:
+        allowed_segments = np.unique(
+            np.searchsorted(pooled["segment_starts"], allowed_rows, side="right") - 1
+        )
+        path_ids = np.unique(pooled["segment_path_ids"][allowed_segments])
+    path_scores = pooled["path_embeddings"][path_ids] @ query
+    best_paths = np.sort(path_ids[top_k_indices(path_scores, coarse_videos)])
+
+    offsets = pooled["path_segment_offsets"]
+    starts, counts = offsets[best_paths], offsets[best_paths + 1] - offsets[best_paths]
+    segments = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(
+        counts.sum()
+    )
+    if allowed_segments is not None:
+        segments = np.intersect1d(segments, allowed_segments, assume_unique=True)
+    segment_scores = pooled["segment_embeddings"][segments] @ query
+    best_segments = np.sort(
+        segments[top_k_indices(segment_scores, len(best_paths) * SEGMENTS_PER_VIDEO)]
+    )
+
+    row_starts = pooled["segment_starts"][best_segments]
+    row_counts = pooled["segment_ends"][best_segments] - row_starts
+    return np.repeat(row_starts - np.cumsum(row_counts) + row_counts, row_counts) + (
+        np.arange(row_counts.sum())
+    )
+
+
+def save_pooled_index(media_folder, pooled):
+    pooled_path = os.path.join(media_folder, POOLED_FILENAME)
+    with open(pooled_path + ".tmp", "wb") as f:
+        np.savez(f, index_fingerprint=index_fingerprint(media_folder), **pooled)
+    os.replace(pooled_path + ".tmp", pooled_path)
+
+
+def load_pooled_index(media_folder):
+    """Loads the pooled embeddings, or None if missing or built for an older index."""
+    pooled_path = os.path.join(media_folder, POOLED_FILENAME)
+    if not os.path.exists(pooled_path):
+        return None
+    with np.load(pooled_path) as data:
+        pooled = {name: data[name] for name in data.files}
+    if pooled.pop("index_fingerprint", None) != index_fingerprint(media_folder):
+        return None
+    return pooled
+
+
+def load_or_build_pooled_index(
+    media_folder, index, coarse_videos=COARSE_VIDEOS, rebuild=False
+):
+    """Returns the pooled embeddings stored next to the index, rebuilding when stale.
+
+    coarse_videos, the number of files kept by the first stage, is attached to them.
+    """
+    pooled = None if rebuild else load_pooled_index(media_folder)
+    if pooled is None:
+        pooled = build_pooled_index(index)
+        save_pooled_index(media_folder, pooled)
+        print(
+            f"Pooled {len(pooled['segment_starts'])} segments of {len(pooled['path_embeddings'])} files into {POOLED_FILENAME}"
+        )
+    pooled["coarse_videos"] = coarse_videos
+    return pooled
@@ -0,0 +1,115 @@
+import random
+import time
+import numpy as np
+from utils import (
+    decode_media_file,
+    discover_media_files,
+    embed_pixel_values,
+    get_text_embeddings,
+    preprocess_images,
+    quantize_clip_model,
+    BATCH_SIZE,
+    DEVICE,
+)
+from index_store import normalize_rows, top_k_indices
+
+# Measures what int8 dynamic quantization costs in accuracy and buys in speed,
+# on a sample of the media folder itself rather than a generic benchmark.
+REPORT_SAMPLE_FILES = 64
+REPORT_TOP_K = 5
+REPORT_QUERIES = [
+    "a person talking to the camera",
+    "a landscape with mountains",
+    "text on a screen",
+    "an animal outdoors",
+    "a crowd of people",
+    "a car driving on a road",
+]
+
+
+def timed_image_embeddings(pixel_batches, model):
+    start = time.perf_counter()
+    embeddings = np.concatenate([embed_pixel_values(pv, model) for pv in pixel_batches])
+    return normalize_rows(embeddings), time.perf_counter() - start
+
+
+def quantization_drift_report(
+    media_folder,
+    model,
+    processor,
+    queries=None,
+    sample_files=REPORT_SAMPLE_FILES,
+    batch_size=BATCH_SIZE,
+):
+    """Compares int8-quantized CLIP with the float32 model on sampled media.
+
+    Prints the cosine similarity between the float32 and int8 embeddings of the
+    same frames and query texts, the top-k overlap of text queries searched over
+    the sampled frames with each model, and the image embedding speedup.
+    Returns the measurements as a dict, or None if nothing could be sampled.
+    """
+    if DEVICE != "cpu":
+        print("The quantization report compares CPU inference; skipping it on GPU.")
+        return None
+    media_files = discover_media_files(media_folder)
+    sample = random.Random(0).sample(media_files, min(sample_files, len(media_files)))
+    images = []
+    for path in sample:
+        try:
+            images.extend(frame["image"] for frame in decode_media_file(path))
+        except Exception:
+            continue  # decode_media_file printed the error
+    if not images:
+        print("No frames could be sampled for the quantization report.")
+        return None
+    pixel_batches = [
+        preprocess_images(images[start : start + batch_size], processor)
+        for start in range(0, len(images), batch_size)
+    ]
+    quantized = quantize_clip_model(model)
+    # One warm-up pass each so one-time allocations do not skew the timing
+    embed_pixel_values(pixel_batches[0][:1], model)
+    embed_pixel_values(pixel_batches[0][:1], quantized)
+    fp32_images, fp32_seconds = timed_image_embeddings(pixel_batches, model)
+    int8_images, int8_seconds = timed_image_embeddings(pixel_batches, quantized)
+    image_cosines = (fp32_images * int8_images).sum(axis=1)
+
+    queries = queries or REPORT_QUERIES
+    fp32_texts = normalize_rows(get_text_embeddings(queries, model, processor))
+    int8_texts = normalize_rows(get_text_embeddings(queries, quantized, processor))
+    text_cosines = (fp32_texts * int8_texts).sum(axis=1)
+    top_k = min(REPORT_TOP_K, len(images))
+    overlaps = [
+        len(
+            set(top_k_indices(fp32_images @ fp32_text, top_k))
+            & set(top_k_indices(int8_images @ int8_text, top_k))
+        )
+        / top_k
+        for fp32_text, int8_text in zip(fp32_texts, int8_texts)
+    ]
+
+    report = {
+        "frames": len(images),
+        "image_cosine_mean": float(image_cosines.mean()),
+        "image_cosine_min": float(image_cosines.min()),
+        "text_cosine_mean": float(text_cosines.mean()),
+        "text_cosine_min": float(text_cosines.min()),
+        "top_k_overlap": float(np.mean(overlaps)),
+        "fp32_ms_per_frame": 1000 * fp32_seconds / len(images),
+        "int8_ms_per_frame": 1000 * int8_seconds / len(images),
+    }
+    print(f"\nint8 vs float32 CLIP on {len(images)} frames from {len(sample)} files:")
+    print(
+        f"  image embedding cosine  mean={report['image_cosine_mean']:.4f}  min={report['image_cosine_min']:.4f}"
+    )
+    print(
+        f"  text embedding cosine   mean={report['text_cosine_mean']:.4f}  min={report['text_cosine_min']:.4f}"
+    )
+    print(
+        f"  top-{top_k} overlap over {len(queries)} queries: {report['top_k_overlap']:.3f}"
+    )
+    print(
+        f"  {report['fp32_ms_per_frame']:.1f} -> {report['int8_ms_per_frame']:.1f} ms/frame "
+        f"({fp32_seconds / max(int8_seconds, 1e-9):.2f}x speedup)"
+    )
+    return report
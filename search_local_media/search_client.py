@@ -0,0 +1,22 @@
+import json
+import urllib.request
+
+# Client side of search_server.py. It imports neither CLIP nor the index, so a
+# query sent to a running server starts in milliseconds.
+
+
+def query_server(server_url, query, top_k=5, n_probe=None, filters=None):
+    """Sends one query to a running search server and returns (score, item) pairs."""
+    payload = {"query": query, "top_k": top_k}
+    if n_probe is not None:
+        payload["n_probe"] = n_probe
+    if filters:
+        payload["filters"] = filters
+    request = urllib.request.Request(
+        server_url.rstrip("/") + "/search",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        results = json.loads(response.read())
+    return [(item.pop("score"), item) for item in results]
@@ -1,58 +1,601 @@
 import argparse
+import datetime
+import json
 import os
-from utils import load_clip_model, build_index, search_index
+from index_store import (
+    index_size,
+    BATCH_SIZE,
+    DECODE_WORKERS,
+    FRAME_DECODERS,
+    MEDIA_TYPES,
+)
+from ann_index import load_or_build_ivf, recall_at_k, N_PROBE
+from search_client import query_server
+from embedding_codecs import load_or_build_codes, STORAGE_FORMATS
+from build_checkpoint import CHECKPOINT_INTERVAL
+from transcript_index import load_or_build_transcript_index
+from pooled_index import load_or_build_pooled_index, COARSE_VIDEOS
+from moments import write_moments, MOMENT_MARGIN
+from duplicates import (
+    duplicate_groups_as_paths,
+    load_or_build_duplicates,
+    DUPLICATE_SIMILARITY,
+)
+
+
+def print_results(query, results):
+    if results:
+        print(f"\nFound {len(results)} result(s) for '{query}':")
+        for i, (score, item) in enumerate(results):
+            if item["type"] == "image":
+                print(f"{i+1}. {item['path']} (Score: {score:.4f})")
+            elif item["type"] == "video_frame":
+                print(
+                    f"{i+1}. {item['path']} (Frame at {item['timestamp']:.2f}s) (Score: {score:.4f})"
+                )
+    else:
+        print(f"No results found for '{query}'.")
+
+
+def format_seconds(seconds):
+    return f"{seconds:.2f}s" if seconds is not None else "-"
+
+
+def print_moments(query, moments):
+    if not moments:
+        print(f"No moments found for '{query}'.")
+        return
+    print(f"\nFound {len(moments)} moment(s) for '{query}':")
+    for i, (score, moment) in enumerate(moments):
+        if moment["start"] is None:
+            print(f"{i+1}. {moment['path']} [{moment['match']}] (Score: {score:.4f})")
+            continue
+        line = f"{i+1}. {moment['path']} ({format_seconds(moment['start'])} - {format_seconds(moment['end'])}) [{moment['match']}]"
+        if moment["timestamp"] is not None and moment["start"] != moment["end"]:
+            line += f" frame at {format_seconds(moment['timestamp'])}"
+        print(f"{line} (Score: {score:.4f})")
+        if moment["text"]:
+            print(f'   "{moment["text"]}"')
+
+
+def read_queries(queries_file):
+    with open(queries_file, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_batch_results(output_path, queries, results_per_query):
+    with open(output_path, "w", encoding="utf-8") as f:
+        for query, results in zip(queries, results_per_query):
+            record = {
+                "query": query,
+                "results": [dict(item, score=score) for score, item in results],
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def write_duplicate_groups(output_path, groups):
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(groups, f, indent=2, ensure_ascii=False)
+
+
+def parse_date(value):
+    """argparse type: ISO date/datetime (e.g. 2024-05-01) to a POSIX timestamp."""
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO date: {value}")
+
+
+def build_filters(args, media_folder=None):
+    """Collects the filter arguments as filter_rows keyword arguments.
+
+    --filter_prefix is relative to the media folder; when media_folder is None (a
+    query sent to a search server) it is passed on relative and resolved there.
+    """
+    filters = {}
+    if args.media_type:
+        filters["media_type"] = args.media_type
+    if args.filter_prefix:
+        filters["path_prefix"] = (
+            os.path.join(media_folder, args.filter_prefix, "")
+            if media_folder
+            else args.filter_prefix
+        )
+    if args.filter_glob:
+        filters["path_glob"] = args.filter_glob
+    if args.min_timestamp is not None or args.max_timestamp is not None:
+        filters["timestamp_range"] = (args.min_timestamp, args.max_timestamp)
+    if args.modified_after is not None or args.modified_before is not None:
+        filters["mtime_range"] = (args.modified_after, args.modified_before)
+    return filters
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Search local media using CLIP and text queries."
+        description="Search local media using CLIP and text or image queries."
     )
     parser.add_argument(
         "--media_folder",
-        required=True,
         help="Path to the folder containing media files (images/videos).",
     )
-    parser.add_argument("--query", required=True, help="Text query to search for.")
+    query_group = parser.add_mutually_exclusive_group()
+    query_group.add_argument(
+        "--query", help="Text query to search for (omit to only build the index)."
+    )
+    query_group.add_argument(
+        "--queries_file",
+        help="Text file with one query per line; all queries are searched in one batch and written as JSONL.",
+    )
+    query_group.add_argument(
+        "--query_image",
+        nargs="+",
+        help="Image file(s) to search with instead of text: finds media that looks like them.",
+    )
     parser.add_argument(
         "--top_k", type=int, default=5, help="Number of top results to return."
     )
+    parser.add_argument(
+        "--exclude_self",
+        action="store_true",
+        help="With --query_image, leave the query image's own file out of the results.",
+    )
     parser.add_argument(
         "--reindex", action="store_true", help="Force re-indexing of the media folder."
     )
-    # Potentially add --output_json to save results to a file later
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Update the existing index: embed only new/changed files and drop deleted ones.",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=BATCH_SIZE,
+        help=f"Images/frames embedded per forward pass while indexing (default: {BATCH_SIZE}).",
+    )
+    parser.add_argument(
+        "--decode_workers",
+        type=int,
+        default=DECODE_WORKERS,
+        help=f"Threads decoding and preprocessing files ahead of the model while indexing (default: {DECODE_WORKERS}).",
+    )
+    parser.add_argument(
+        "--frame_decoder",
+        default="single_pass",
+        choices=FRAME_DECODERS,
+        help="How video frames are sampled: a fixed number per video in one decode pass (default) or with one seeking ffmpeg process per frame, or adaptive keyframes at visual changes under a per-minute budget.",
+    )
+    parser.add_argument(
+        "--ann",
+        action="store_true",
+        help="Search with the approximate IVF index (built and saved next to the index on first use).",
+    )
+    parser.add_argument(
+        "--n_probe",
+        type=int,
+        default=N_PROBE,
+        help=f"IVF lists scanned per query; higher is slower but more accurate (default: {N_PROBE}).",
+    )
+    parser.add_argument(
+        "--n_lists",
+        type=int,
+        help="Number of IVF lists to train (default: about 4 * sqrt(number of indexed items)).",
+    )
+    parser.add_argument(
+        "--ann_recall_check",
+        action="store_true",
+        help="Report IVF recall@top_k and latency against exact search for several n_probe values.",
+    )
+    parser.add_argument(
+        "--two_stage",
+        action="store_true",
+        help="Rank files by their pooled embeddings first, then their segments, and score only the frames of the best segments (built and saved next to the index on first use).",
+    )
+    parser.add_argument(
+        "--coarse_videos",
+        type=int,
+        default=COARSE_VIDEOS,
+        help=f"With --two_stage, files whose frames can be returned; higher is slower but more accurate (default: {COARSE_VIDEOS}).",
+    )
+    parser.add_argument(
+        "--media_type", choices=MEDIA_TYPES, help="Only return images or video frames."
+    )
+    parser.add_argument(
+        "--filter_prefix",
+        help="Only search files under this subfolder of the media folder.",
+    )
+    parser.add_argument(
+        "--filter_glob",
+        help="Only search files whose path matches this glob (e.g. '*.mp4' or '*/holidays/*').",
+    )
+    parser.add_argument(
+        "--min_timestamp",
+        type=float,
+        help="Only return video frames at or after this many seconds into the video.",
+    )
+    parser.add_argument(
+        "--max_timestamp",
+        type=float,
+        help="Only return video frames at or before this many seconds into the video.",
+    )
+    parser.add_argument(
+        "--modified_after",
+        type=parse_date,
+        help="Only search files modified on or after this ISO date/time.",
+    )
+    parser.add_argument(
+        "--modified_before",
+        type=parse_date,
+        help="Only search files modified on or before this ISO date/time.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Embed files in this many processes, each with its own CLIP model (default: 1).",
+    )
+    parser.add_argument(
+        "--checkpoint_interval",
+        type=float,
+        default=CHECKPOINT_INTERVAL,
+        help=f"Seconds between indexing checkpoints; a killed build resumes from the last one when rerun (default: {CHECKPOINT_INTERVAL}).",
+    )
+    parser.add_argument(
+        "--cpu_quantize",
+        action="store_true",
+        help="Run CLIP with int8 dynamically quantized linear layers (CPU only); faster, with a small embedding drift.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="Torch intra-op threads for CLIP inference (default: torch's choice).",
+    )
+    parser.add_argument(
+        "--interop_threads",
+        type=int,
+        help="Torch inter-op threads for CLIP inference (default: torch's choice).",
+    )
+    parser.add_argument(
+        "--quantization_report",
+        action="store_true",
+        help="Compare int8 and float32 CLIP embeddings and speed on a sample of the media folder before indexing.",
+    )
+    parser.add_argument(
+        "--path_prefix",
+        help="Only index files under this subfolder of --media_folder, writing a shard that --merge_shards combines (e.g. one prefix per machine).",
+    )
+    parser.add_argument(
+        "--merge_shards",
+        action="store_true",
+        help="Merge all path-prefix shards under --media_folder into the main index.",
+    )
+    parser.add_argument(
+        "--storage",
+        default="float32",
+        choices=STORAGE_FORMATS,
+        help="Score against a compressed in-memory copy of the embeddings: float16, per-vector int8 or product quantization (default: float32, no compression).",
+    )
+    parser.add_argument(
+        "--rerank",
+        action="store_true",
+        help="With --storage, re-score the approximate shortlist exactly against the float32 embeddings on disk.",
+    )
+    parser.add_argument(
+        "--find_duplicates",
+        action="store_true",
+        help="Find groups of near-duplicate files in the index and write them to --duplicates_output.",
+    )
+    parser.add_argument(
+        "--duplicates_output",
+        default="duplicates.json",
+        help="Where --find_duplicates writes the duplicate groups (a JSON list of path lists).",
+    )
+    parser.add_argument(
+        "--duplicate_threshold",
+        type=float,
+        default=DUPLICATE_SIMILARITY,
+        help=f"Cosine similarity between per-file mean embeddings above which files are near duplicates (default: {DUPLICATE_SIMILARITY}).",
+    )
+    parser.add_argument(
+        "--collapse_duplicates",
+        action="store_true",
+        help="Return only the best-ranked file of each near-duplicate group.",
+    )
+    parser.add_argument(
+        "--hybrid",
+        action="store_true",
+        help="Search what is seen and what is said: fuse frame matches with matches in the videos' Whisper transcripts into timestamped moments.",
+    )
+    parser.add_argument(
+        "--transcripts_folder",
+        help="With --hybrid, also look here for <video name>.json transcripts (default: next to each video).",
+    )
+    parser.add_argument(
+        "--moments",
+        action="store_true",
+        help="Return time ranges of videos where the query matches instead of single frames.",
+    )
+    parser.add_argument(
+        "--moment_margin",
+        type=float,
+        default=MOMENT_MARGIN,
+        help=f"With --moments, how far below the best smoothed frame score of its video a frame still belongs to a moment; higher gives longer, more numerous moments (default: {MOMENT_MARGIN}).",
+    )
+    parser.add_argument(
+        "--moments_output",
+        help="With --moments or --hybrid, also write the moments as JSON, readable by split_video.py and extract_frames.py --moments_file.",
+    )
+    parser.add_argument(
+        "--server",
+        help="URL of a running search_server.py (e.g. http://127.0.0.1:8765); the query is sent there instead of loading CLIP and the index locally.",
+    )
+    parser.add_argument(
+        "--output_jsonl",
+        default="search_results.jsonl",
+        help="Where --queries_file results are written, one JSON object per query.",
+    )
 
     args = parser.parse_args()
 
+    if args.server and (args.queries_file or args.query_image):
+        parser.error("--queries_file and --query_image are not supported with --server")
+    if (args.hybrid or args.moments) and not args.query:
+        parser.error("--hybrid and --moments need --query")
+    if (args.hybrid or args.moments) and args.server:
+        parser.error("--hybrid and --moments are not supported with --server")
+    if args.hybrid and args.moments:
+        parser.error("--hybrid and --moments cannot be combined")
+    if (args.hybrid or args.moments) and args.collapse_duplicates:
+        parser.error(
+            "--collapse_duplicates is not supported with --hybrid or --moments"
+        )
+    if args.server and not (args.query or args.queries_file):
+        parser.error("--server needs --query")
+    if args.server and (
+        args.storage != "float32"
+        or args.rerank
+        or args.collapse_duplicates
+        or args.two_stage
+    ):
+        parser.error(
+            "--storage, --rerank, --collapse_duplicates and --two_stage are not supported with --server (start search_server.py with --two_stage instead)"
+        )
+    if args.queries_file and (
+        args.ann or args.two_stage or args.storage != "float32" or args.rerank
+    ):
+        # search_index_batch scores the float32 matrix exactly, in one pass
+        parser.error(
+            "--ann, --two_stage, --storage and --rerank are not supported with --queries_file"
+        )
+    if args.server:
+        results = query_server(
+            args.server,
+            args.query,
+            top_k=args.top_k,
+            n_probe=args.n_probe if args.ann else None,
+            filters=build_filters(args),
+        )
+        print_results(args.query, results)
+        return
+
+    if not args.media_folder:
+        parser.error("--media_folder is required unless --server is given")
+    if args.path_prefix and (
+        args.query
+        or args.queries_file
+        or args.query_image
+        or args.merge_shards
+        or args.ann
+        or args.ann_recall_check
+        or args.two_stage
+        or args.storage != "float32"
+        or args.find_duplicates
+        or args.collapse_duplicates
+    ):
+        # The structures derived from the index live next to the main index; a
+        # shard build only writes its shard, and is searched after --merge_shards
+        parser.error(
+            "--path_prefix only builds a shard; search after --merge_shards instead"
+        )
+    # Imported only for local searches: they load torch and transformers, the
+    # start-up cost that --server avoids
+    from utils import (
+        load_clip_model,
+        quantize_clip_model,
+        build_index,
+        search_index,
+        search_index_batch,
+        search_images,
+        search_hybrid,
+        search_moments,
+        get_text_embeddings,
+    )
+    from parallel_index import merge_shards
+    from quantization_drift import quantization_drift_report
+
     if not os.path.isdir(args.media_folder):
         print(f"Error: Media folder not found at {args.media_folder}")
         return
 
-    model, processor = (
-        load_clip_model()
-    )  # utils.MODEL_NAME can be changed there if needed
+    # utils.MODEL_NAME can be changed there if needed
+    def load_model():
+        return load_clip_model(
+            args.cpu_quantize and not args.quantization_report,
+            num_threads=args.threads,
+            interop_threads=args.interop_threads,
+        )
+
+    model = processor = None
+    if args.workers <= 1 or (
+        args.query or args.queries_file or args.query_image or args.quantization_report
+    ):
+        model, processor = load_model()
+    if args.quantization_report:
+        # The report needs the float32 model; quantize it afterwards if asked to
+        quantization_drift_report(
+            args.media_folder,
+            model,
+            processor,
+            queries=[args.query] if args.query else None,
+            batch_size=args.batch_size,
+        )
+        if args.cpu_quantize:
+            model = quantize_clip_model(model)
 
-    index_data = build_index(args.media_folder, model, processor, args.reindex)
+    if args.merge_shards:
+        index = merge_shards(args.media_folder)
+    else:
+        index = build_index(
+            args.media_folder,
+            model,
+            processor,
+            args.reindex,
+            args.incremental,
+            batch_size=args.batch_size,
+            frame_decoder=args.frame_decoder,
+            num_workers=args.workers,
+            path_prefix=args.path_prefix,
+            decode_workers=args.decode_workers,
+            checkpoint_interval=args.checkpoint_interval,
+            quantize=args.cpu_quantize,
+            # Worker processes load their own model; this one only needs it to
+            # embed a single file itself
+            load_model=load_model,
+        )
 
-    if not index_data:
+    if index_size(index) == 0:
         print(
             "No media items were indexed. Ensure your media folder is not empty and contains supported file types."
         )
         return
+    if args.find_duplicates or args.collapse_duplicates:
+        index["duplicate_groups"] = load_or_build_duplicates(
+            args.media_folder,
+            index,
+            args.duplicate_threshold,
+            rebuild=args.reindex,
+        )
+    if args.find_duplicates:
+        groups = duplicate_groups_as_paths(index, index["duplicate_groups"])
+        write_duplicate_groups(args.duplicates_output, groups)
+        print(
+            f"[✓] {len(groups)} near-duplicate groups ({sum(map(len, groups))} files) saved to {args.duplicates_output}"
+        )
+    if not (args.query or args.queries_file or args.query_image):
+        print(f"Index ready with {index_size(index)} items.")
+        return
+
+    if args.ann or args.ann_recall_check:
+        index["ivf"] = load_or_build_ivf(
+            args.media_folder, index, args.n_lists, rebuild=args.reindex
+        )
+    if args.two_stage:
+        index["pooled"] = load_or_build_pooled_index(
+            args.media_folder, index, args.coarse_videos, rebuild=args.reindex
+        )
+    if args.storage != "float32":
+        index["codes"] = load_or_build_codes(
+            args.media_folder, index, args.storage, rebuild=args.reindex
+        )
+    if args.ann_recall_check:
+        print(f"\nIVF recall@{args.top_k} against exact search:")
+        for n_probe, recall, ms in recall_at_k(
+            index["embeddings"], index["ivf"], top_k=args.top_k
+        ):
+            print(f"  n_probe={n_probe:<4d} recall={recall:.3f}  {ms:.2f} ms/query")
+
+    if args.queries_file:
+        queries = read_queries(args.queries_file)
+        print(f"\nSearching {len(queries)} queries from {args.queries_file}...")
+        results_per_query = search_index_batch(
+            queries,
+            index,
+            model,
+            processor,
+            top_k=args.top_k,
+            batch_size=args.batch_size,
+            filters=build_filters(args, args.media_folder),
+            collapse_duplicates=args.collapse_duplicates,
+        )
+        write_batch_results(args.output_jsonl, queries, results_per_query)
+        print(f"[✓] Results for {len(queries)} queries saved to {args.output_jsonl}")
+        return
+
+    if args.query_image:
+        for image_path, results in search_images(
+            args.query_image,
+            index,
+            model,
+            processor,
+            top_k=args.top_k,
+            n_probe=args.n_probe if args.ann else None,
+            rerank=args.rerank,
+            filters=build_filters(args, args.media_folder),
+            exclude_self=args.exclude_self,
+            batch_size=args.batch_size,
+            collapse_duplicates=args.collapse_duplicates,
+        ):
+            print_results(image_path, results)
+        return
+
+    if args.hybrid:
+        index["transcripts"] = load_or_build_transcript_index(
+            args.media_folder,
+            index,
+            lambda texts: get_text_embeddings(texts, model, processor, args.batch_size),
+            args.transcripts_folder,
+            rebuild=args.reindex,
+        )
+        print(f"\nSearching frames and transcripts for '{args.query}'...")
+        moments = search_hybrid(
+            args.query,
+            index,
+            model,
+            processor,
+            top_k=args.top_k,
+            n_probe=args.n_probe if args.ann else None,
+            rerank=args.rerank,
+            filters=build_filters(args, args.media_folder),
+        )
+        print_moments(args.query, moments)
+        if args.moments_output:
+            write_moments(args.moments_output, moments)
+            print(f"[✓] Moments saved to {args.moments_output}")
+        return
+
+    if args.moments:
+        print(f"\nSearching for moments matching '{args.query}'...")
+        moments = search_moments(
+            args.query,
+            index,
+            model,
+            processor,
+            top_k=args.top_k,
+            n_probe=args.n_probe if args.ann else None,
+            rerank=args.rerank,
+            filters=build_filters(args, args.media_folder),
+            margin=args.moment_margin,
+        )
+        print_moments(args.query, moments)
+        if args.moments_output:
+            write_moments(args.moments_output, moments)
+            print(f"[✓] Moments saved to {args.moments_output}")
+        return
 
     print(f"\nSearching for '{args.query}'...")
-    results = search_index(args.query, index_data, model, processor, top_k=args.top_k)
+    results = search_index(
+        args.query,
+        index,
+        model,
+        processor,
+        top_k=args.top_k,
+        n_probe=args.n_probe if args.ann else None,
+        rerank=args.rerank,
+        filters=build_filters(args, args.media_folder),
+        collapse_duplicates=args.collapse_duplicates,
+    )
 
-    if results:
-        print(f"\nFound {len(results)} result(s) for '{args.query}':")
-        for i, (score, item) in enumerate(results):
-            if item["type"] == "image":
-                print(f"{i+1}. {item['path']} (Score: {score:.4f})")
-            elif item["type"] == "video_frame":
-                print(
-                    f"{i+1}. {item['path']} (Frame at {item['timestamp']:.2f}s) (Score: {score:.4f})"
-                )
-    else:
-        print(f"No results found for '{args.query}'.")
+    print_results(args.query, results)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils import load_clip_model, build_index, get_text_embedding, search_embedding
+from index_store import METADATA_FILENAME, index_size, load_index
+from index_filters import FILTER_KEYS, filter_rows
+from ann_index import load_or_build_ivf, N_PROBE
+from pooled_index import load_or_build_pooled_index, COARSE_VIDEOS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+QUERY_CACHE_SIZE = 1024  # Text query embeddings kept in the LRU cache
+
+
+class SearchState:
+    """Model, index and query-embedding cache shared by all request handlers."""
+
+    def __init__(
+        self,
+        media_folder,
+        model,
+        processor,
+        ann=False,
+        n_probe=N_PROBE,
+        coarse_videos=None,
+    ):
+        self.media_folder = media_folder
+        self.model = model
+        self.processor = processor
+        self.ann = ann
+        self.n_probe = n_probe
+        self.coarse_videos = coarse_videos  # None disables two-stage search
+        self.lock = threading.Lock()  # Held only while (re)loading the index
+        self.cache_lock = threading.Lock()
+        self.query_cache = OrderedDict()
+        self.index = None
+        self.index_mtime = None
+        self.reload_if_changed()
+
+    def reload_if_changed(self):
+        """Reloads the index when its metadata file has been replaced on disk."""
+        metadata_path = os.path.join(self.media_folder, METADATA_FILENAME)
+        try:
+            mtime = os.stat(metadata_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self.index_mtime:
+            return
+        with self.lock:
+            if mtime == self.index_mtime:
+                return
+            index = load_index(self.media_folder)
+            if index is None:
+                return
+            if self.ann and index_size(index):
+                index["ivf"] = load_or_build_ivf(self.media_folder, index)
+            if self.coarse_videos and index_size(index):
+                index["pooled"] = load_or_build_pooled_index(
+                    self.media_folder, index, self.coarse_videos
+                )
+            self.index, self.index_mtime = index, mtime
+            print(
+                f"Loaded index with {index_size(index)} items from {self.media_folder}"
+            )
+
+    def text_embedding(self, text):
+        # The cache lock is not held while encoding, so queries run concurrently
+        with self.cache_lock:
+            if text in self.query_cache:
+                self.query_cache.move_to_end(text)
+                return self.query_cache[text]
+        embedding = get_text_embedding(text, self.model, self.processor)[0]
+        with self.cache_lock:
+            self.query_cache[text] = embedding
+            if len(self.query_cache) > QUERY_CACHE_SIZE:
+                self.query_cache.popitem(last=False)
+        return embedding
+
+    def search(self, query, top_k=5, n_probe=None, filters=None):
+        """Searches one query; filters uses filter_rows keywords, with path_prefix
+        relative to the media folder."""
+        self.reload_if_changed()
+        index = self.index
+        if index_size(index) == 0:
+            return []
+        if n_probe is None and self.ann:
+            n_probe = self.n_probe
+        filters = {k: v for k, v in (filters or {}).items() if k in FILTER_KEYS}
+        if filters.get("path_prefix"):
+            filters["path_prefix"] = os.path.join(
+                self.media_folder, filters["path_prefix"], ""
+            )
+        for key in ("timestamp_range", "mtime_range"):
+            if key in filters:
+                filters[key] = tuple(filters[key])
+        candidate_rows = filter_rows(index, **filters) if filters else None
+        return search_embedding(
+            self.text_embedding(query),
+            index,
+            top_k,
+            n_probe,
+            candidate_rows=candidate_rows,
+        )
+
+
+def make_handler(state):
+    class SearchHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/search":
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                results = state.search(
+                    request["query"],
+                    request.get("top_k", 5),
+                    request.get("n_probe"),
+                    request.get("filters"),
+                )
+                body = json.dumps(
+                    [dict(item, score=score) for score, item in results]
+                ).encode("utf-8")
+            except (KeyError, ValueError) as e:
+                self.send_error(400, str(e))
+                return
+            except Exception as e:
+                print(f"Error handling search request: {e}")
+                self.send_error(500, str(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep the console for index reload messages
+
+    return SearchHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve CLIP searches over a media folder, keeping the model and index in memory."
+    )
+    parser.add_argument(
+        "--media_folder",
+        required=True,
+        help="Path to the folder containing media files (images/videos).",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to bind to.")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Port to listen on."
+    )
+    parser.add_argument(
+        "--ann", action="store_true", help="Search with the approximate IVF index."
+    )
+    parser.add_argument(
+        "--n_probe",
+        type=int,
+        default=N_PROBE,
+        help=f"Default IVF lists scanned per query (default: {N_PROBE}).",
+    )
+    parser.add_argument(
+        "--two_stage",
+        action="store_true",
+        help="Rank files, then segments, by pooled embeddings before scoring frames.",
+    )
+    parser.add_argument(
+        "--coarse_videos",
+        type=int,
+        default=COARSE_VIDEOS,
+        help=f"With --two_stage, files kept by the first stage (default: {COARSE_VIDEOS}).",
+    )
+    parser.add_argument(
+        "--cpu_quantize",
+        action="store_true",
+        help="Run CLIP with int8 dynamically quantized linear layers (CPU only).",
+    )
+    parser.add_argument(
+        "--threads", type=int, help="Torch intra-op threads for CLIP inference."
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.media_folder):
+        print(f"Error: Media folder not found at {args.media_folder}")
+        return
+
+    model, processor = load_clip_model(args.cpu_quantize, num_threads=args.threads)
+    build_index(args.media_folder, model, processor, quantize=args.cpu_quantize)
+    state = SearchState(
+        args.media_folder,
+        model,
+        processor,
+        args.ann,
+        args.n_probe,
+        args.coarse_videos if args.two_stage else None,
+    )
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Search server listening on http://{args.host}:{args.port}/search")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down search server.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
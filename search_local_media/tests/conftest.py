@@ -0,0 +1,49 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# The tool's modules import each other by their flat names
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_store import normalize_rows  # noqa: E402
+
+DIM = 16
+
+
+def make_blocks(num_paths=12, rows_per_path=(1, 6), dim=DIM, seed=0):
+    """Synthetic {path: (embeddings, types, timestamps)} blocks: images get one row,
+    videos several frames with increasing timestamps."""
+    rng = np.random.default_rng(seed)
+    blocks = {}
+    for i in range(num_paths):
+        folder = "photos" if i % 3 == 0 else "videos"
+        ext = ".jpg" if folder == "photos" else ".mp4"
+        path = f"/media/{folder}/file_{i:03d}{ext}"
+        if folder == "photos":
+            blocks[path] = (
+                normalize_rows(rng.normal(size=(1, dim))),
+                np.zeros(1, dtype=np.int8),
+                np.array([np.nan], dtype=np.float32),
+            )
+            continue
+        count = int(rng.integers(*rows_per_path))
+        blocks[path] = (
+            normalize_rows(rng.normal(size=(count, dim))),
+            np.ones(count, dtype=np.int8),
+            (np.arange(count) * 10.0).astype(np.float32),
+        )
+    return blocks
+
+
+def clustered_embeddings(num_rows=4000, num_clusters=40, dim=DIM, seed=0):
+    """Unit vectors grouped around random centers, like embeddings of a real library."""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.normal(size=(num_clusters, dim)))
+    labels = rng.integers(0, num_clusters, num_rows)
+    return normalize_rows(centers[labels] + rng.normal(0, 0.15, (num_rows, dim)))
+
+
+@pytest.fixture
+def blocks():
+    return make_blocks()
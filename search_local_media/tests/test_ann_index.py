@@ -0,0 +1,52 @@
+import os
+import numpy as np
+from conftest import clustered_embeddings, make_blocks
+from ann_index import (
+    build_ivf,
+    ivf_candidates,
+    load_ivf,
+    load_or_build_ivf,
+    recall_at_k,
+    search_ivf,
+)
+from index_store import METADATA_FILENAME, save_index, top_k_indices
+
+
+def test_inverted_lists_partition_the_rows():
+    embeddings = clustered_embeddings(num_rows=2000)
+    ivf = build_ivf(embeddings, n_lists=32)
+    assert ivf["centroids"].shape == (32, embeddings.shape[1])
+    assert ivf["list_offsets"][-1] == len(embeddings)
+    np.testing.assert_array_equal(np.sort(ivf["list_rows"]), np.arange(len(embeddings)))
+    # Probing every list is exact search
+    query = embeddings[5]
+    assert len(ivf_candidates(query, ivf, n_probe=32)) == len(embeddings)
+    rows, scores = search_ivf(query, ivf, embeddings, 10, n_probe=32)
+    np.testing.assert_array_equal(rows, top_k_indices(embeddings @ query, 10))
+    np.testing.assert_allclose(scores, embeddings[rows] @ query)
+
+
+def test_recall_grows_with_n_probe():
+    embeddings = clustered_embeddings(num_rows=4000)
+    ivf = build_ivf(embeddings, n_lists=40)
+    report = recall_at_k(embeddings, ivf, top_k=10, n_probes=(1, 4, 16), num_queries=50)
+    recalls = [recall for _, recall, _ in report]
+    assert [n_probe for n_probe, _, _ in report] == [1, 4, 16]
+    assert recalls == sorted(recalls)
+    assert recalls[-1] >= 0.95
+
+
+def test_ivf_persists_and_goes_stale(tmp_path):
+    folder = str(tmp_path)
+    index = save_index(folder, make_blocks(num_paths=60, rows_per_path=(2, 10)))
+    os.utime(os.path.join(folder, METADATA_FILENAME), ns=(1, 1))
+    ivf = load_or_build_ivf(folder, index, n_lists=4)
+    loaded = load_ivf(folder, len(index["embeddings"]))
+    for name in ("centroids", "list_offsets", "list_rows"):
+        np.testing.assert_array_equal(loaded[name], ivf[name])
+    assert load_ivf(folder, len(index["embeddings"]) + 1) is None
+
+    index = save_index(folder, make_blocks(num_paths=61, rows_per_path=(2, 10)))
+    assert load_ivf(folder, len(index["embeddings"])) is None
+    rebuilt = load_or_build_ivf(folder, index, n_lists=4)
+    assert rebuilt["list_offsets"][-1] == len(index["embeddings"])
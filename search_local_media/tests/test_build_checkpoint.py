@@ -0,0 +1,93 @@
+import os
+import numpy as np
+from build_checkpoint import (
+    CheckpointWriter,
+    checkpoint_dir,
+    clear_checkpoint,
+    commit_segment,
+    load_checkpoint,
+    start_checkpoint,
+)
+
+PARAMS = {"model": "test-model", "frame_decoder": "seek", "quantize": False}
+
+
+def manifest_for(paths):
+    return {path: {"size": 1, "mtime": 1.0, "hash": path} for path in paths}
+
+
+def test_no_checkpoint(tmp_path):
+    assert load_checkpoint(str(tmp_path), PARAMS) == ({}, {})
+
+
+def test_resume_from_committed_segments(tmp_path, blocks):
+    paths = sorted(blocks)
+    manifest = manifest_for(paths)
+    checkpoint_path = start_checkpoint(str(tmp_path), PARAMS)
+    commit_segment(checkpoint_path, {p: blocks[p] for p in paths[:5]}, manifest)
+    commit_segment(checkpoint_path, {p: blocks[p] for p in paths[5:]}, manifest)
+
+    resumed_manifest, path_blocks = load_checkpoint(str(tmp_path), PARAMS)
+    assert resumed_manifest == manifest
+    assert sorted(path_blocks) == paths
+    for path in paths:
+        np.testing.assert_array_equal(path_blocks[path][0], blocks[path][0])
+        np.testing.assert_array_equal(path_blocks[path][2], blocks[path][2])
+
+
+def test_files_without_frames_are_recorded(tmp_path):
+    checkpoint_path = start_checkpoint(str(tmp_path), PARAMS)
+    commit_segment(
+        checkpoint_path, {"/media/empty.mp4": None}, manifest_for(["/media/empty.mp4"])
+    )
+    manifest, path_blocks = load_checkpoint(str(tmp_path), PARAMS)
+    assert list(manifest) == ["/media/empty.mp4"]
+    assert path_blocks == {"/media/empty.mp4": None}
+
+
+def test_half_written_segment_is_discarded(tmp_path, blocks):
+    paths = sorted(blocks)
+    checkpoint_path = start_checkpoint(str(tmp_path), PARAMS)
+    commit_segment(checkpoint_path, {paths[0]: blocks[paths[0]]}, manifest_for(paths))
+    partial = os.path.join(checkpoint_path, ".segment_0_killed.tmp")
+    os.makedirs(partial)
+
+    manifest, _ = load_checkpoint(str(tmp_path), PARAMS)
+    assert list(manifest) == [paths[0]]
+    assert not os.path.exists(partial)
+
+
+def test_other_build_params_discard_checkpoint(tmp_path, blocks):
+    paths = sorted(blocks)
+    checkpoint_path = start_checkpoint(str(tmp_path), PARAMS)
+    commit_segment(checkpoint_path, {paths[0]: blocks[paths[0]]}, manifest_for(paths))
+
+    other = dict(PARAMS, frame_decoder="adaptive")
+    assert load_checkpoint(str(tmp_path), other) == ({}, {})
+    start_checkpoint(str(tmp_path), other)
+    assert load_checkpoint(str(tmp_path), other) == ({}, {})
+    assert load_checkpoint(str(tmp_path), PARAMS) == ({}, {})
+
+
+def test_writer_commits_on_interval_and_at_end(tmp_path):
+    checkpoint_path = start_checkpoint(str(tmp_path), PARAMS)
+    paths = ["/media/a.jpg", "/media/b.jpg", "/media/c.mp4"]
+    manifest = manifest_for(paths + ["/media/d.jpg"])
+    writer = CheckpointWriter(checkpoint_path, manifest, interval=3600)
+    item = {"type": "image", "timestamp": None, "embedding": np.ones(4)}
+    writer.add({paths[0]: [item], paths[1]: [item]})
+    assert load_checkpoint(str(tmp_path), PARAMS) == ({}, {})
+    writer.add({paths[2]: []})
+    writer.commit()
+
+    resumed, path_blocks = load_checkpoint(str(tmp_path), PARAMS)
+    assert sorted(resumed) == paths
+    assert path_blocks[paths[2]] is None
+    assert len(path_blocks[paths[0]][0]) == 1
+
+    writer.interval = 0
+    writer.add({"/media/d.jpg": [item]})
+    assert len(os.listdir(checkpoint_path)) == 3  # info file and two segments
+
+    clear_checkpoint(str(tmp_path))
+    assert not os.path.exists(checkpoint_dir(str(tmp_path)))
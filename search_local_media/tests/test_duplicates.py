@@ -0,0 +1,86 @@
+import itertools
+import numpy as np
+import pytest
+import duplicates
+from duplicates import candidate_pairs, union_find_groups
+
+
+def brute_force_pairs(codes):
+    return {
+        (i, j)
+        for i, j in itertools.combinations(range(len(codes)), 2)
+        if (codes[i] == codes[j]).any()
+    }
+
+
+def brute_force_groups(num_items, pairs):
+    neighbours = {i: set() for i in range(num_items)}
+    for i, j in pairs:
+        neighbours[i].add(j)
+        neighbours[j].add(i)
+    components, seen = [], set()
+    for start in range(num_items):
+        if start in seen or not neighbours[start]:
+            continue
+        stack, component = [start], set()
+        while stack:
+            item = stack.pop()
+            if item not in component:
+                component.add(item)
+                stack.extend(neighbours[item])
+        seen |= component
+        components.append(component)
+    return components
+
+
+def as_components(group_ids):
+    return sorted(
+        set(np.flatnonzero(group_ids == g).tolist())
+        for g in np.unique(group_ids)
+        if g >= 0
+    )
+
+
+def test_candidate_pairs_match_shared_buckets():
+    # Few distinct codes per band so buckets of several sizes occur
+    codes = np.random.default_rng(0).integers(0, 12, size=(40, 3))
+    pairs = candidate_pairs(codes)
+    assert (pairs[:, 0] < pairs[:, 1]).all()
+    assert len(np.unique(pairs, axis=0)) == len(pairs)
+    assert set(map(tuple, pairs.tolist())) == brute_force_pairs(codes)
+
+
+def test_large_buckets_are_compared_against_their_first_file(monkeypatch):
+    monkeypatch.setattr(duplicates, "MAX_BUCKET_SIZE", 3)
+    codes = np.array([[7], [1], [7], [7], [2], [7], [1]])
+    pairs = set(map(tuple, candidate_pairs(codes).tolist()))
+    assert pairs == {(0, 2), (0, 3), (0, 5), (1, 6)}
+
+
+def test_no_candidates():
+    assert candidate_pairs(np.arange(5)[:, None]).shape == (0, 2)
+    assert candidate_pairs(np.empty((0, 4), dtype=np.int64)).shape == (0, 2)
+
+
+def test_union_find_matches_connected_components():
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, 60, size=(45, 2))
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    group_ids = union_find_groups(60, pairs)
+    assert as_components(group_ids) == sorted(brute_force_groups(60, pairs.tolist()))
+    assert set(group_ids[group_ids >= 0]) == set(range(group_ids.max() + 1))
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_union_find_joins_a_long_chain(reverse):
+    pairs = np.stack([np.arange(99), np.arange(1, 100)], axis=1)
+    if reverse:
+        pairs = pairs[::-1, ::-1]
+    group_ids = union_find_groups(102, pairs)
+    assert (group_ids[:100] == 0).all()
+    assert (group_ids[100:] == -1).all()
+
+
+def test_union_find_without_pairs():
+    group_ids = union_find_groups(4, np.empty((0, 2), dtype=np.int64))
+    np.testing.assert_array_equal(group_ids, [-1, -1, -1, -1])
@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pytest
+
+# The pipeline runs CLIP preprocessing and batches frames with torch
+utils = pytest.importorskip("utils")
+torch = pytest.importorskip("torch")
+
+from index_store import path_block  # noqa: E402
+
+
+def fake_decode(media_path, frame_decoder="single_pass"):
+    """Two frames per file, with the file's first byte as pixels (-1 for "poison").
+    "corrupt" files fail before any frame, "truncated" ones after their first."""
+    with open(media_path, "rb") as f:
+        content = f.read()
+    if content == b"corrupt":
+        raise ValueError("cannot decode")
+    frame = {"path": media_path, "type": "video_frame", "timestamp": 0.0}
+    pixels = np.full(8, -1 if content == b"poison" else content[0], dtype=np.float32)
+
+    def frames():
+        yield dict(frame, image=pixels)
+        if content == b"truncated":
+            raise ValueError("stream ended early")
+        yield dict(frame, timestamp=1.0, image=pixels + 1)
+
+    return frames()
+
+
+def fake_embed(pixel_values, model):
+    """Embeds pixels as themselves; negative pixels ("poison" files) fail the batch."""
+    pixel_values = np.asarray(pixel_values, dtype=np.float32)
+    if (pixel_values < 0).any():
+        raise RuntimeError("CUDA out of memory")
+    return pixel_values
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "decode_media_file", fake_decode)
+    monkeypatch.setattr(utils, "embed_pixel_values", fake_embed)
+    monkeypatch.setattr(
+        utils,
+        "preprocess_images",
+        lambda images, processor: [torch.from_numpy(image) for image in images],
+    )
+    for name, content in [
+        ("good_1.mp4", b"x1"),
+        ("good_2.mp4", b"y2"),
+        ("bad.mp4", b"corrupt"),
+        ("cut.mp4", b"truncated"),
+        ("oom.mp4", b"poison"),
+    ]:
+        (tmp_path / name).write_bytes(content)
+    return str(tmp_path)
+
+
+def build(folder, **kwargs):
+    return utils.build_index(
+        folder, None, None, batch_size=1, decode_workers=1, **kwargs
+    )
+
+
+def test_failed_files_are_left_out_and_retried(folder):
+    good = [os.path.join(folder, name) for name in ("good_1.mp4", "good_2.mp4")]
+    index = build(folder)
+    assert list(index["paths"]) == good
+    for path in good:
+        assert len(path_block(index, path)[0]) == 2
+    assert sorted(utils.load_manifest(folder)) == good
+
+    for name in ("bad.mp4", "cut.mp4", "oom.mp4"):
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(b"fixed " + name.encode())
+    index = build(folder, incremental=True)
+    assert len(index["paths"]) == 5
+    assert len(utils.load_manifest(folder)) == 5
+    assert all(len(path_block(index, p)[0]) == 2 for p in index["paths"])
+
+
+def test_failures_are_not_reported_as_done(folder):
+    done = {}
+    paths = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    left = utils.embed_media_files(
+        paths, None, None, batch_size=1, num_decoders=2, on_files_done=done.update
+    )
+    assert left == {}
+    assert sorted(os.path.basename(p) for p in done) == ["good_1.mp4", "good_2.mp4"]
@@ -0,0 +1,97 @@
+import os
+import numpy as np
+import pytest
+from conftest import clustered_embeddings, make_blocks
+from embedding_codecs import (
+    encode_embeddings,
+    load_codes,
+    load_or_build_codes,
+    pq_encode,
+    rerank_shortlist,
+    save_codes,
+    score_codes,
+)
+from index_store import METADATA_FILENAME, save_index, top_k_indices
+
+
+def age_index(folder):
+    """Backdates the index, so the next save surely gets a new fingerprint."""
+    os.utime(os.path.join(folder, METADATA_FILENAME), ns=(1, 1))
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    return clustered_embeddings(num_rows=3000, dim=32)
+
+
+@pytest.mark.parametrize("storage,tolerance", [("float16", 2e-3), ("int8", 3e-2)])
+def test_scalar_codes_score_close_to_exact(embeddings, storage, tolerance):
+    codes = encode_embeddings(embeddings, storage)
+    query = embeddings[7]
+    np.testing.assert_allclose(
+        score_codes(query, codes), embeddings @ query, atol=tolerance
+    )
+    rows = np.array([3, 99, 2500])
+    np.testing.assert_allclose(
+        score_codes(query, codes, rows), embeddings[rows] @ query, atol=tolerance
+    )
+
+
+def test_pq_codes(embeddings):
+    codes = encode_embeddings(embeddings, "pq", n_subspaces=8)
+    assert codes["codes"].shape == (len(embeddings), 8)
+    assert codes["codes"].dtype == np.uint8
+    assert codes["codebooks"].shape == (8, 256, 4)
+    np.testing.assert_array_equal(
+        pq_encode(embeddings[:10], codes["codebooks"]), codes["codes"][:10]
+    )
+    # Asymmetric distances equal the inner product with the reconstructed vectors
+    reconstructed = np.concatenate(
+        [codes["codebooks"][m][codes["codes"][:, m]] for m in range(8)], axis=1
+    )
+    query = embeddings[42]
+    np.testing.assert_allclose(
+        score_codes(query, codes), reconstructed @ query, rtol=1e-4, atol=1e-5
+    )
+
+
+def test_pq_rerank_recovers_exact_top_k(embeddings):
+    codes = encode_embeddings(embeddings, "pq", n_subspaces=8)
+    rng = np.random.default_rng(1)
+    hits = 0
+    for row in rng.choice(len(embeddings), 20, replace=False):
+        query = embeddings[row]
+        rows = np.arange(len(embeddings))
+        found, scores = rerank_shortlist(
+            query, embeddings, rows, score_codes(query, codes), 10
+        )
+        np.testing.assert_allclose(scores, embeddings[found] @ query, rtol=1e-5)
+        hits += len(set(found) & set(top_k_indices(embeddings @ query, 10)))
+    assert hits / 200 >= 0.9
+
+
+def test_unknown_storage():
+    with pytest.raises(ValueError):
+        encode_embeddings(np.eye(4, dtype=np.float32), "int4")
+
+
+def test_codes_persist_and_go_stale(tmp_path):
+    folder = str(tmp_path)
+    index = save_index(folder, make_blocks(num_paths=30))
+    age_index(folder)
+    codes = load_or_build_codes(folder, index, "int8")
+    loaded = load_codes(folder, "int8")
+    assert loaded["storage"] == "int8"
+    np.testing.assert_array_equal(loaded["codes"], codes["codes"])
+    np.testing.assert_array_equal(loaded["scales"], codes["scales"])
+    assert load_codes(folder, "float16") is None
+
+    save_index(folder, make_blocks(num_paths=31))  # a rebuilt index
+    assert load_codes(folder, "int8") is None
+
+
+def test_save_codes_is_atomic(tmp_path):
+    folder = str(tmp_path)
+    index = save_index(folder, make_blocks())
+    save_codes(folder, encode_embeddings(index["embeddings"], "float16"))
+    assert not [path for path in tmp_path.iterdir() if path.name.endswith(".tmp")]
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+import pytest
+
+# build_index lives next to the CLIP model code
+utils = pytest.importorskip("utils")
+
+from build_checkpoint import checkpoint_dir  # noqa: E402
+from index_store import index_fingerprint, path_block  # noqa: E402
+
+
+class FakeEmbedder:
+    """Stands in for embed_media_files: one row per file, derived from its bytes,
+    optionally failing (like a killed build) after fail_after files."""
+
+    def __init__(self, fail_after=None):
+        self.embedded = []
+        self.fail_after = fail_after
+
+    def __call__(self, media_paths, model, processor, *args, on_files_done=None):
+        for path in media_paths:
+            if self.fail_after is not None and len(self.embedded) == self.fail_after:
+                raise RuntimeError("killed")
+            with open(path, "rb") as f:
+                seed = int(hashlib.sha1(f.read()).hexdigest()[:8], 16)
+            embedding = np.random.default_rng(seed).normal(size=8)
+            item = {"path": path, "type": "image", "timestamp": None}
+            on_files_done({path: [dict(item, embedding=embedding)]})
+            self.embedded.append(path)
+        return {}
+
+
+def write(folder, name, content):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def build(folder, embedder, monkeypatch, **kwargs):
+    monkeypatch.setattr(utils, "embed_media_files", embedder)
+    return utils.build_index(folder, None, None, checkpoint_interval=0, **kwargs)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for i in range(5):
+        write(str(tmp_path), f"photo_{i}.jpg", b"photo %d" % i)
+    return str(tmp_path)
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = {"/media/a.jpg": {"size": 3, "mtime": 1.5, "hash": "abc"}}
+    utils.save_manifest(str(tmp_path), manifest)
+    assert utils.load_manifest(str(tmp_path)) == manifest
+    assert os.listdir(tmp_path) == [utils.MANIFEST_FILENAME]
+    write(str(tmp_path), utils.MANIFEST_FILENAME, b"{truncated")
+    assert utils.load_manifest(str(tmp_path)) == {}
+
+
+def test_incremental_update(folder, monkeypatch):
+    first = FakeEmbedder()
+    index = build(folder, first, monkeypatch)
+    assert len(first.embedded) == 5
+    before = {str(p): np.array(path_block(index, p)[0]) for p in index["paths"]}
+
+    # Unchanged index without incremental: loaded as is
+    again = FakeEmbedder()
+    build(folder, again, monkeypatch)
+    assert again.embedded == []
+
+    changed = write(folder, "photo_1.jpg", b"edited photo")
+    added = write(folder, "new.jpg", b"new photo")
+    copied = write(folder, "copy_of_2.jpg", b"photo 2")
+    os.remove(os.path.join(folder, "photo_4.jpg"))
+    touched = os.path.join(folder, "photo_3.jpg")
+    os.utime(touched, (1, 1))
+
+    update = FakeEmbedder()
+    index = build(folder, update, monkeypatch, incremental=True)
+    assert sorted(update.embedded) == sorted([changed, added])
+    paths = list(index["paths"])
+    assert os.path.join(folder, "photo_4.jpg") not in paths
+    assert len(paths) == 6
+    np.testing.assert_array_equal(
+        path_block(index, copied)[0], before[os.path.join(folder, "photo_2.jpg")]
+    )
+    np.testing.assert_array_equal(path_block(index, touched)[0], before[touched])
+    assert not np.array_equal(path_block(index, changed)[0], before[changed])
+
+    manifest = utils.load_manifest(folder)
+    assert sorted(manifest) == sorted(paths)
+    assert manifest[touched]["mtime"] == 1
+
+
+def test_unchanged_library_keeps_the_index(folder, monkeypatch):
+    build(folder, FakeEmbedder(), monkeypatch)
+    fingerprint = index_fingerprint(folder)
+    files = sorted(os.listdir(folder))
+
+    update = FakeEmbedder()
+    index = build(folder, update, monkeypatch, incremental=True)
+    assert update.embedded == []
+    assert len(index["paths"]) == 5
+    assert index_fingerprint(folder) == fingerprint
+    assert sorted(os.listdir(folder)) == files
+
+
+def test_killed_build_resumes_after_last_checkpoint(folder, monkeypatch):
+    killed = FakeEmbedder(fail_after=3)
+    with pytest.raises(RuntimeError):
+        build(folder, killed, monkeypatch)
+    assert os.path.isdir(checkpoint_dir(folder))
+
+    resumed = FakeEmbedder()
+    index = build(folder, resumed, monkeypatch)
+    assert len(resumed.embedded) == 2
+    assert not set(resumed.embedded) & set(killed.embedded)
+    assert len(index["paths"]) == 5
+    assert not os.path.exists(checkpoint_dir(folder))
+
+    # The resumed index equals one built in a single run
+    fresh = os.path.join(folder, "fresh")
+    shutil.copytree(folder, fresh, ignore=shutil.ignore_patterns("clip_media_*"))
+    reference = build(fresh, FakeEmbedder(), monkeypatch)
+    np.testing.assert_array_equal(
+        np.asarray(index["embeddings"]), np.asarray(reference["embeddings"])
+    )
+
+
+def test_model_is_loaded_only_to_embed_in_process(folder, monkeypatch):
+    loads = []
+
+    def load_model():
+        loads.append(1)
+        return "model", "processor"
+
+    build(folder, FakeEmbedder(), monkeypatch)
+    kwargs = dict(incremental=True, num_workers=2, load_model=load_model)
+    build(folder, FakeEmbedder(), monkeypatch, **kwargs)
+    assert loads == []  # nothing to embed
+
+    # A single changed file is embedded here rather than in worker processes
+    write(folder, "photo_0.jpg", b"edited photo")
+    update = FakeEmbedder()
+    build(folder, update, monkeypatch, **kwargs)
+    assert loads == [1] and len(update.embedded) == 1
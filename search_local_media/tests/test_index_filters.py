@@ -0,0 +1,77 @@
+import fnmatch
+import numpy as np
+import pytest
+from conftest import make_blocks
+from index_filters import filter_rows, rows_for_paths
+from index_store import MEDIA_TYPES, save_index
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    blocks = make_blocks(num_paths=40, rows_per_path=(1, 8), seed=2)
+    manifest = {path: {"mtime": float(i)} for i, path in enumerate(sorted(blocks))}
+    return save_index(str(tmp_path_factory.mktemp("index")), blocks, manifest)
+
+
+def expected_rows(index, predicate):
+    """Rows matching predicate(path, type, timestamp, mtime), by a plain loop."""
+    rows = []
+    for row, path_id in enumerate(index["path_ids"]):
+        path = str(index["paths"][path_id])
+        if predicate(
+            path,
+            MEDIA_TYPES[index["types"][row]],
+            index["timestamps"][row],
+            index["path_mtimes"][path_id],
+        ):
+            rows.append(row)
+    return rows
+
+
+def test_no_filters(index):
+    assert filter_rows(index) is None
+
+
+@pytest.mark.parametrize(
+    "filters,predicate",
+    [
+        ({"media_type": "image"}, lambda p, t, ts, m: t == "image"),
+        ({"media_type": "video_frame"}, lambda p, t, ts, m: t == "video_frame"),
+        (
+            {"path_prefix": "/media/videos/"},
+            lambda p, t, ts, m: p.startswith("/media/videos/"),
+        ),
+        (
+            {"path_prefix": "/media/videos/file_01"},
+            lambda p, t, ts, m: p.startswith("/media/videos/file_01"),
+        ),
+        ({"path_prefix": "/nowhere"}, lambda p, t, ts, m: False),
+        (
+            {"path_glob": "*_0?[05].*"},
+            lambda p, t, ts, m: fnmatch.fnmatchcase(p, "*_0?[05].*"),
+        ),
+        ({"mtime_range": (10.0, 20.0)}, lambda p, t, ts, m: 10 <= m <= 20),
+        ({"mtime_range": (None, 5.0)}, lambda p, t, ts, m: m <= 5),
+        ({"timestamp_range": (20.0, None)}, lambda p, t, ts, m: ts >= 20),
+        (
+            {
+                "path_prefix": "/media/videos/",
+                "timestamp_range": (10.0, 40.0),
+                "mtime_range": (3.0, None),
+            },
+            lambda p, t, ts, m: p.startswith("/media/videos/")
+            and 10 <= ts <= 40
+            and m >= 3,
+        ),
+    ],
+)
+def test_filters_match_a_plain_loop(index, filters, predicate):
+    rows = filter_rows(index, **filters)
+    assert list(rows) == expected_rows(index, predicate)
+
+
+def test_rows_for_paths(index):
+    path_ids = np.array([0, 3, 4, 17])
+    rows = rows_for_paths(index, path_ids)
+    assert list(rows) == [r for r, p in enumerate(index["path_ids"]) if p in path_ids]
+    assert len(rows_for_paths(index, np.array([], dtype=np.int64))) == 0
@@ -0,0 +1,99 @@
+import os
+import numpy as np
+from conftest import make_blocks
+from index_store import (
+    EMBEDDINGS_FILENAME,
+    MEDIA_TYPES,
+    block_from_items,
+    index_item,
+    index_size,
+    load_index,
+    path_block,
+    save_index,
+    top_k_indices,
+)
+
+
+def embedding_files(folder):
+    root, ext = os.path.splitext(EMBEDDINGS_FILENAME)
+    return [n for n in os.listdir(folder) if n.startswith(root) and n.endswith(ext)]
+
+
+def test_save_load_round_trip(tmp_path, blocks):
+    manifest = {path: {"mtime": 1000.0 + i} for i, path in enumerate(sorted(blocks))}
+    index = save_index(str(tmp_path), blocks, manifest)
+
+    assert list(index["paths"]) == sorted(blocks)
+    assert index_size(index) == sum(len(b[0]) for b in blocks.values())
+    assert isinstance(index["embeddings"], np.memmap)
+    for path, (embeddings, types, timestamps) in blocks.items():
+        stored = path_block(index, path)
+        np.testing.assert_array_equal(stored[0], embeddings)
+        np.testing.assert_array_equal(stored[1], types)
+        np.testing.assert_array_equal(stored[2], timestamps)
+    np.testing.assert_array_equal(
+        index["path_mtimes"], [manifest[p]["mtime"] for p in sorted(blocks)]
+    )
+    np.testing.assert_array_equal(
+        index["paths"][index["path_ids"]],
+        [p for p in sorted(blocks) for _ in range(len(blocks[p][0]))],
+    )
+    assert path_block(index, "/media/missing.jpg") is None
+
+
+def test_save_skips_files_without_frames_and_missing_mtimes(tmp_path, blocks):
+    path = next(iter(blocks))
+    index = save_index(str(tmp_path), {**blocks, "/media/empty.mp4": None})
+    assert "/media/empty.mp4" not in index["paths"]
+    assert np.isnan(index["path_mtimes"]).all()
+    assert path_block(index, path) is not None
+
+
+def test_save_replaces_previous_generation(tmp_path, blocks):
+    save_index(str(tmp_path), blocks)
+    smaller = dict(list(blocks.items())[:3])
+    index = save_index(str(tmp_path), smaller)
+    assert list(index["paths"]) == sorted(smaller)
+    assert len(embedding_files(tmp_path)) == 1
+    assert list(load_index(str(tmp_path))["paths"]) == sorted(smaller)
+
+
+def test_empty_and_missing_index(tmp_path):
+    assert load_index(str(tmp_path)) is None
+    index = save_index(str(tmp_path), {})
+    assert index_size(index) == 0
+    assert index["embeddings"].shape[0] == 0
+
+
+def test_block_from_items_and_index_item(tmp_path):
+    items = [
+        {"type": "video_frame", "timestamp": 2.5, "embedding": np.ones(4) * 2},
+        {"type": "video_frame", "timestamp": None, "embedding": np.arange(4.0)},
+    ]
+    embeddings, types, timestamps = block_from_items(items)
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-6)
+    assert list(types) == [MEDIA_TYPES.index("video_frame")] * 2
+    assert timestamps[0] == 2.5 and np.isnan(timestamps[1])
+    assert block_from_items([]) is None
+
+    index = save_index(str(tmp_path), {"/media/a.mp4": (embeddings, types, timestamps)})
+    assert index_item(index, 0) == {
+        "path": "/media/a.mp4",
+        "type": "video_frame",
+        "timestamp": 2.5,
+    }
+    assert index_item(index, 1)["timestamp"] is None
+
+
+def test_top_k_indices():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+    assert list(top_k_indices(scores, 3)) == [1, 3, 2]
+    assert list(top_k_indices(scores, 10)) == [1, 3, 2, 4, 0]
+    assert len(top_k_indices(scores, 0)) == 0
+
+
+def test_larger_index_round_trip(tmp_path):
+    blocks = make_blocks(num_paths=200, rows_per_path=(1, 30), seed=3)
+    index = save_index(str(tmp_path), blocks)
+    rows = np.concatenate([blocks[p][0] for p in sorted(blocks)])
+    np.testing.assert_array_equal(np.asarray(index["embeddings"]), rows)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from keyframes import MIN_CHANGE, THUMBNAIL_SIZE, change_thumbnail, window_keyframes
+
+
+def candidates(changes):
+    return [(change, float(t), None) for t, change in enumerate(changes)]
+
+
+def test_keeps_the_most_changed_frames_in_time_order():
+    picked = window_keyframes(candidates([0.5, 0.1, 0.9, 0.3, 0.7]), budget=3)
+    assert [c[1] for c in picked] == [0.0, 2.0, 4.0]
+
+
+def test_drops_frames_below_min_change():
+    low = MIN_CHANGE / 2
+    picked = window_keyframes(candidates([low, 0.5, low, 0.2]), budget=4)
+    assert [c[0] for c in picked] == [0.5, 0.2]
+
+
+@pytest.mark.parametrize("changes", [[0.0, 0.0, 0.0], [0.01, 0.03, 0.02]])
+def test_static_window_keeps_its_most_changed_frame(changes):
+    picked = window_keyframes(candidates(changes), budget=2)
+    assert len(picked) == 1 and picked[0][0] == max(changes)
+
+
+def test_empty_window():
+    assert window_keyframes([], budget=3) == []
+
+
+def test_change_thumbnail_averages_blocks():
+    frame = np.zeros((THUMBNAIL_SIZE * 4 + 3, THUMBNAIL_SIZE * 4 + 3, 3), np.uint8)
+    frame[: THUMBNAIL_SIZE * 2] = 255
+    thumbnail = change_thumbnail(frame)
+    assert thumbnail.shape == (THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+    np.testing.assert_allclose(thumbnail[: THUMBNAIL_SIZE // 2], 1.0)
+    np.testing.assert_allclose(thumbnail[THUMBNAIL_SIZE // 2 :], 0.0)
@@ -0,0 +1,69 @@
+import numpy as np
+from moments import merge_moments, smooth_scores
+
+
+def random_frames(seed=0, num_videos=6):
+    """Frames of several videos, sorted by path id then timestamp."""
+    rng = np.random.default_rng(seed)
+    path_ids, timestamps = [], []
+    for path_id in sorted(rng.choice(100, num_videos, replace=False)):
+        count = int(rng.integers(1, 40))
+        path_ids += [path_id] * count
+        timestamps += sorted(rng.uniform(0, 120, count).round(1))
+    scores = rng.uniform(0.1, 0.3, len(path_ids)).astype(np.float32)
+    return np.array(path_ids), np.array(timestamps, dtype=np.float32), scores
+
+
+def test_smooth_scores_match_a_plain_loop():
+    path_ids, timestamps, scores = random_frames()
+    expected = [
+        scores[
+            (path_ids == path_ids[i]) & (np.abs(timestamps - timestamps[i]) <= 4.0)
+        ].mean()
+        for i in range(len(scores))
+    ]
+    np.testing.assert_allclose(
+        smooth_scores(path_ids, timestamps, scores, 4.0), expected, rtol=1e-6
+    )
+    assert len(smooth_scores(path_ids[:0], timestamps[:0], scores[:0])) == 0
+
+
+def test_runs_of_high_frames_become_moments():
+    path_ids = np.array([3, 3, 3, 3, 3, 3, 3])
+    timestamps = np.array([0, 10, 20, 30, 40, 50, 60], dtype=np.float32)
+    scores = np.array([0.1, 0.9, 0.8, 0.1, 0.1, 0.85, 0.1], dtype=np.float32)
+    moment_paths, starts, ends, peaks, moment_scores = merge_moments(
+        path_ids, timestamps, scores, margin=0.1, window=0.0
+    )
+    assert list(moment_paths) == [3, 3]
+    assert list(starts) == [10, 50] and list(ends) == [20, 50]
+    assert list(peaks) == [10, 50]
+    np.testing.assert_allclose(moment_scores, [0.9, 0.85])
+
+
+def test_threshold_is_per_video_and_ranking_is_global():
+    # Video 1 scores far below video 2, but still yields its own best moment
+    path_ids = np.array([1, 1, 1, 2, 2, 2])
+    timestamps = np.array([0, 10, 20, 0, 10, 20], dtype=np.float32)
+    scores = np.array([0.1, 0.3, 0.1, 0.5, 0.9, 0.5], dtype=np.float32)
+    moment_paths, starts, ends, _, moment_scores = merge_moments(
+        path_ids, timestamps, scores, margin=0.05, window=0.0
+    )
+    assert list(moment_paths) == [2, 1]
+    assert list(starts) == [10, 10] and list(ends) == [10, 10]
+    assert list(moment_scores) == sorted(moment_scores, reverse=True)
+
+
+def test_every_video_yields_a_moment():
+    path_ids, timestamps, scores = random_frames(seed=4)
+    moment_paths, starts, ends, peaks, _ = merge_moments(path_ids, timestamps, scores)
+    assert set(moment_paths) == set(path_ids)
+    assert (starts <= peaks).all() and (peaks <= ends).all()
+    for path_id, start, end in zip(moment_paths, starts, ends):
+        video_times = timestamps[path_ids == path_id]
+        assert start in video_times and end in video_times
+
+
+def test_no_frames():
+    empty = np.empty(0)
+    assert all(len(a) == 0 for a in merge_moments(empty, empty, empty))
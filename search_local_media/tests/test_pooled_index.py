@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from conftest import make_blocks
+from index_filters import filter_rows
+from index_store import normalize_rows, save_index
+from pooled_index import SEGMENT_SECONDS, build_pooled_index, coarse_candidate_rows
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    # Videos of up to 29 frames 10 s apart span several 60 s segments
+    blocks = make_blocks(num_paths=30, rows_per_path=(1, 30), seed=5)
+    return save_index(str(tmp_path_factory.mktemp("index")), blocks)
+
+
+@pytest.fixture(scope="module")
+def pooled(index):
+    return build_pooled_index(index)
+
+
+def test_segments_split_files_by_time(index, pooled):
+    starts, ends = pooled["segment_starts"], pooled["segment_ends"]
+    assert starts[0] == 0 and ends[-1] == len(index["types"])
+    np.testing.assert_array_equal(starts[1:], ends[:-1])
+    buckets = np.floor(np.nan_to_num(index["timestamps"]) / SEGMENT_SECONDS)
+    for start, end, path_id in zip(starts, ends, pooled["segment_path_ids"]):
+        assert (index["path_ids"][start:end] == path_id).all()
+        assert len(set(buckets[start:end])) == 1
+    assert len(starts) > len(index["paths"])
+
+
+def test_pooled_embeddings_are_normalized_means(index, pooled):
+    embeddings = np.asarray(index["embeddings"])
+    for segment in (0, 7, len(pooled["segment_starts"]) - 1):
+        start, end = pooled["segment_starts"][segment], pooled["segment_ends"][segment]
+        np.testing.assert_allclose(
+            pooled["segment_embeddings"][segment],
+            normalize_rows(embeddings[start:end].sum(axis=0)[None])[0],
+            atol=1e-6,
+        )
+    for path_id in (0, 12):
+        rows = index["path_ids"] == path_id
+        np.testing.assert_allclose(
+            pooled["path_embeddings"][path_id],
+            normalize_rows(embeddings[rows].sum(axis=0)[None])[0],
+            atol=1e-6,
+        )
+
+
+def test_coarse_rows_come_from_the_best_files(index, pooled):
+    path_id = 13
+    query = pooled["path_embeddings"][path_id]
+    rows = coarse_candidate_rows(query, pooled, coarse_videos=3)
+    assert (np.diff(rows) > 0).all()
+    kept_paths = set(index["path_ids"][rows])
+    assert path_id in kept_paths and len(kept_paths) <= 3
+    best_segment = np.argmax(pooled["segment_embeddings"] @ query)
+    assert pooled["segment_starts"][best_segment] in rows
+
+
+def test_keeping_every_segment_returns_every_row(index, pooled):
+    # 30 files keep up to 30 * SEGMENTS_PER_VIDEO segments, more than there are
+    query = normalize_rows(np.ones((1, index["embeddings"].shape[1])))[0]
+    rows = coarse_candidate_rows(query, pooled, coarse_videos=30)
+    np.testing.assert_array_equal(rows, np.arange(len(index["types"])))
+
+
+def test_allowed_rows_restrict_files_and_segments(index, pooled):
+    allowed = filter_rows(
+        index, path_prefix="/media/videos/", timestamp_range=(70, 130)
+    )
+    query = normalize_rows(np.ones((1, index["embeddings"].shape[1])))[0]
+    rows = coarse_candidate_rows(query, pooled, coarse_videos=30, allowed_rows=allowed)
+    assert len(rows) and np.isin(allowed, rows).all()
+    segments = np.searchsorted(pooled["segment_starts"], rows, side="right") - 1
+    for segment in np.unique(segments):
+        start, end = pooled["segment_starts"][segment], pooled["segment_ends"][segment]
+        assert np.isin(np.arange(start, end), allowed).any()
+    assert not (index["types"][rows] == 0).any()  # no photos
@@ -0,0 +1,37 @@
+import numpy as np
+from transcript_index import score_segments
+
+
+def transcripts():
+    """Four segments of two videos, with one-hot embeddings and no vocabulary."""
+    return {
+        "texts": np.array(["a", "b", "c", "d"]),
+        "embeddings": np.eye(4, dtype=np.float32),
+        "vocabulary": np.array([], dtype=str),
+        "term_ids": np.array([], dtype=np.int64),
+        "term_offsets": np.zeros(5, dtype=np.int64),
+        "path_ids": np.array([0, 0, 1, 1]),
+        "starts": np.array([0.0, 30.0, 0.0, 100.0], dtype=np.float32),
+        "ends": np.array([10.0, 40.0, 20.0, 130.0], dtype=np.float32),
+    }
+
+
+def test_scores_without_filters():
+    query = np.array([0.0, 1.0, 0.0, 0.0], dtype=np.float32)
+    np.testing.assert_allclose(
+        score_segments(query, "anything", transcripts()), [0, 1, 0, 0]
+    )
+
+
+def test_path_and_time_filters_mask_segments():
+    query = np.ones(4, dtype=np.float32)
+    scores = score_segments(query, "", transcripts(), path_ids=np.array([1]))
+    assert list(np.isfinite(scores)) == [False, False, True, True]
+    scores = score_segments(query, "", transcripts(), time_range=(15.0, 35.0))
+    assert list(np.isfinite(scores)) == [False, True, True, False]
+    scores = score_segments(query, "", transcripts(), time_range=(None, 5.0))
+    assert list(np.isfinite(scores)) == [True, False, True, False]
+    scores = score_segments(
+        query, "", transcripts(), path_ids=np.array([1]), time_range=(120.0, None)
+    )
+    assert list(np.isfinite(scores)) == [False, False, False, True]
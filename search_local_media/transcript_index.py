@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import numpy as np
+from index_store import MEDIA_TYPES, index_fingerprint, normalize_rows
+from transcript_format import (
+    ColumnarTranscript,
+    is_columnar_transcript,
+    TRANSCRIPT_EXTENSION,
+)
+
+# Spoken-word side of hybrid search. Whisper transcripts (the JSON or .wtc written
+# by transcribe_audio and caption_search) are found next to each indexed video, and
+# every transcript segment is stored with its [start, end] and:
+#   - the CLIP text embedding of its text, so a query is scored against speech
+#     with the same embedding used for the frames;
+#   - its distinct terms as a CSR table, for exact word matches that the text
+#     encoder alone scores poorly (names, jargon).
+# Like the IVF and the codes, this is derived from the index and rebuilt when the
+# index or any transcript changes.
+TRANSCRIPTS_FILENAME = "clip_media_transcripts.npz"
+TRANSCRIPT_EMBEDDINGS_FILENAME = "clip_media_transcript_embeddings.npy"
+# Hybrid results fuse the visual and spoken rankings with reciprocal rank fusion:
+# a moment scores 1 / (RRF_K + rank) per modality it appears in, and a frame
+# counts towards a segment when it lies within the segment's time range.
+HYBRID_CANDIDATES = 100  # top frames and top segments considered per query
+RRF_K = 60
+ALIGN_TOLERANCE = 2.0  # seconds a frame may lie outside a segment and still align
+LEXICAL_WEIGHT = 0.5  # weight of the fraction of query terms said in a segment
+MIN_TERM_LENGTH = 3  # shorter tokens (articles, fillers) are not matched
+TERM_PATTERN = re.compile(r"\w+")
+
+
+def transcript_terms(text):
+    return sorted(
+        {t for t in TERM_PATTERN.findall(text.lower()) if len(t) >= MIN_TERM_LENGTH}
+    )
+
+
+def find_transcript(video_path, transcripts_folder=None):
+    """Returns the transcript of a video (Whisper JSON or .wtc), or None.
+
+    Looks for <video>.json and <video stem>.json next to the video, then for
+    <video stem>.json in transcripts_folder, trying .wtc before .json each time.
+    """
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    bases = [video_path, os.path.join(os.path.dirname(video_path), stem)]
+    if transcripts_folder:
+        bases.append(os.path.join(transcripts_folder, stem))
+    for base in bases:
+        for extension in (TRANSCRIPT_EXTENSION, ".json"):
+            if os.path.isfile(base + extension):
+                return base + extension
+    return None
+
+
+def load_transcript_segments(transcript_path):
+    """Returns [(start, end, text)] of a transcript ([] on error)."""
+    try:
+        if is_columnar_transcript(transcript_path):
+            segments = ColumnarTranscript(transcript_path).segments(
+                keys=("start", "end", "text")
+            )
+        else:
+            with open(transcript_path, "r", encoding="utf-8") as f:
+                segments = json.load(f)["segments"]
+        return [
+            (float(s["start"]), float(s["end"]), s["text"].strip())
+            for s in segments
+            if s.get("text", "").strip()
+        ]
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        print(f"Warning: Could not read transcript {transcript_path}: {e}")
+        return []
+
+
+def video_transcripts(index, transcripts_folder=None):
+    """Maps the path id of every indexed video with a transcript to its file."""
+    video_code = MEDIA_TYPES.index("video_frame")
+    first_rows = index["path_offsets"][:-1]
+    transcripts = {}
+    for path_id in np.flatnonzero(index["types"][first_rows] == video_code):
+        transcript_path = find_transcript(
+            str(index["paths"][path_id]), transcripts_folder
+        )
+        if transcript_path:
+            transcripts[int(path_id)] = transcript_path
+    return transcripts
+
+
+def transcript_state(transcripts):
+    """[path_id, transcript path, mtime] records used to detect changed transcripts."""
+    return [
+        [path_id, path, os.path.getmtime(path)]
+        for path_id, path in sorted(transcripts.items())
+    ]
+
+
+def build_transcript_index(media_folder, transcripts, embed_texts):
+    """Embeds and saves every segment of {path_id: transcript_path}.
+
+    embed_texts(list of str) must return one CLIP text embedding per text.
+    """
+    path_ids, starts, ends, texts = [], [], [], []
+    for path_id, transcript_path in sorted(transcripts.items()):
+        for start, end, text in load_transcript_segments(transcript_path):
+            path_ids.append(path_id)
+            starts.append(start)
+            ends.append(end)
+            texts.append(text)
+    print(
+        f"Indexing {len(texts)} transcript segments from {len(transcripts)} videos..."
+    )
+
+    segment_terms = [transcript_terms(text) for text in texts]
+    vocabulary = np.array(sorted({t for terms in segment_terms for t in terms}), str)
+    term_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(terms) for terms in segment_terms])
+    term_ids = np.searchsorted(
+        vocabulary, [t for terms in segment_terms for t in terms]
+    ).astype(np.int32)
+
+    embeddings = (
+        normalize_rows(embed_texts(texts)) if texts else np.empty((0, 0), np.float32)
+    )
+    embeddings_path = os.path.join(media_folder, TRANSCRIPT_EMBEDDINGS_FILENAME)
+    with open(embeddings_path + ".tmp", "wb") as f:
+        np.save(f, embeddings)
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+    state = transcript_state(transcripts)
+    metadata_path = os.path.join(media_folder, TRANSCRIPTS_FILENAME)
+    with open(metadata_path + ".tmp", "wb") as f:
+        np.savez(
+            f,
+            index_fingerprint=index_fingerprint(media_folder),
+            transcript_state=json.dumps(state),
+            path_ids=np.array(path_ids, dtype=np.int32),
+            starts=np.array(starts, dtype=np.float32),
+            ends=np.array(ends, dtype=np.float32),
+            texts=np.array(texts, dtype=str),
+            vocabulary=vocabulary,
+            term_ids=term_ids,
+            term_offsets=term_offsets,
+        )
+    os.replace(metadata_path + ".tmp", metadata_path)
+    return load_transcript_index(media_folder, state)
+
+
+def load_transcript_index(media_folder, state):
+    """Loads the transcript index, or None if missing or stale for state."""
+    metadata_path = os.path.join(media_folder, TRANSCRIPTS_FILENAME)
+    embeddings_path = os.path.join(media_folder, TRANSCRIPT_EMBEDDINGS_FILENAME)
+    if not (os.path.exists(metadata_path) and os.path.exists(embeddings_path)):
+        return None
+    with np.load(metadata_path) as data:
+        transcripts = {name: data[name] for name in data.files}
+    if (
+        transcripts.pop("index_fingerprint") != index_fingerprint(media_folder)
+        or json.loads(str(transcripts.pop("transcript_state"))) != state
+    ):
+        return None
+    transcripts["embeddings"] = np.load(
+        embeddings_path, mmap_mode="r" if len(transcripts["texts"]) else None
+    )
+    return transcripts
+
+
+def load_or_build_transcript_index(
+    media_folder, index, embed_texts, transcripts_folder=None, rebuild=False
+):
+    """Returns the transcript index of the indexed videos, rebuilding it when stale."""
+    transcripts = video_transcripts(index, transcripts_folder)
+    state = transcript_state(transcripts)
+    transcript_index = None if rebuild else load_transcript_index(media_folder, state)
+    if transcript_index is None:
+        transcript_index = build_transcript_index(
+            media_folder, transcripts, embed_texts
+        )
+    return transcript_index
+
+
+def score_segments(
+    query_embedding, query_text, transcripts, path_ids=None, time_range=None
+):
+    """Returns the spoken-word score of every segment.
+
+    The score is the CLIP text similarity plus the weighted fraction of query terms
+    said in the segment. Segments of videos outside path_ids (when given), and
+    segments not overlapping time_range (a (low, high) tuple; either end may be
+    None), score -inf.
+    """
+    if len(transcripts["texts"]) == 0:
+        return np.empty(0, dtype=np.float32)
+    scores = transcripts["embeddings"] @ normalize_rows(query_embedding[None])[0]
+    vocabulary = transcripts["vocabulary"]
+    query_terms = transcript_terms(query_text)
+    if query_terms and len(vocabulary):
+        positions = np.minimum(
+            np.searchsorted(vocabulary, query_terms), len(vocabulary) - 1
+        )
+        query_ids = positions[vocabulary[positions] == np.array(query_terms)]
+        matched = np.isin(transcripts["term_ids"], query_ids)
+        cumulative = np.concatenate(([0], np.cumsum(matched)))
+        offsets = transcripts["term_offsets"]
+        matches = cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+        scores = scores + LEXICAL_WEIGHT * matches / len(query_terms)
+    if path_ids is not None:
+        scores = np.where(np.isin(transcripts["path_ids"], path_ids), scores, -np.inf)
+    if time_range is not None:
+        low, high = time_range
+        inside = np.ones(len(scores), dtype=bool)
+        if low is not None:
+            inside &= transcripts["ends"] >= low
+        if high is not None:
+            inside &= transcripts["starts"] <= high
+        scores = np.where(inside, scores, -np.inf)
+    return scores
@@ -1,5 +1,6 @@
 import os
-import pickle
+import json
+import hashlib
 import ffmpeg
 import numpy as np
 from PIL import Image
@@ -7,6 +8,41 @@ import torch
 from transformers import CLIPProcessor, CLIPModel
 from tqdm import tqdm
 import io
+import queue
+import threading
+from index_store import (
+    convert_legacy_index,
+    index_item,
+    load_index,
+    normalize_rows,
+    path_block,
+    save_index,
+    top_k_indices,
+    BATCH_SIZE,
+    DECODE_WORKERS,
+    FRAME_DECODERS,
+    MEDIA_TYPES,
+)
+from ann_index import ivf_candidates
+from pooled_index import coarse_candidate_rows
+from index_filters import filter_rows
+from embedding_codecs import rerank_shortlist, score_codes
+from duplicates import collapse_duplicate_results
+from transcript_index import (
+    score_segments,
+    ALIGN_TOLERANCE,
+    HYBRID_CANDIDATES,
+    RRF_K,
+)
+from keyframes import extract_keyframes_adaptive, NEAR_DUPLICATE_SIMILARITY
+from moments import merge_moments, MOMENT_CANDIDATES, MOMENT_MARGIN, MOMENT_PADDING
+from build_checkpoint import (
+    clear_checkpoint,
+    load_checkpoint,
+    start_checkpoint,
+    CheckpointWriter,
+    CHECKPOINT_INTERVAL,
+)
 
 MODEL_NAME = "openai/clip-vit-base-patch32"
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
@@ -14,13 +50,58 @@ DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp", ".gif"]
 VIDEO_EXTENSIONS = [".mp4", ".mkv", ".avi", ".mov", ".flv", ".wmv"]
 FRAMES_PER_VIDEO = 5  # Number of frames to extract per video
+QUERY_CHUNK_SIZE = 256  # Queries scored together in batch search
+ROW_CHUNK_SIZE = 65536  # Index rows scored together in batch search
+COLLAPSE_FETCH_FACTOR = (
+    4  # Batch search fetches top_k * this before collapsing duplicates
+)
+PREFETCH_BATCHES = 2  # Batches decoded ahead of the model
+PATH_QUEUE_SIZE = 64  # Discovered files waiting to be decoded
+CLIP_INPUT_SIZE = 224  # Frames are decoded straight to CLIP's input resolution
+
+# path -> size/mtime/hash of indexed files
+MANIFEST_FILENAME = "clip_media_manifest.json"
+HASH_CHUNK_SIZE = 1 << 20
 
 
 # --- Model Loading ---
-def load_clip_model():
+def set_torch_threads(num_threads=None, interop_threads=None):
+    """Sets torch's intra-op and inter-op thread pools (None keeps the default).
+
+    The inter-op pool can only be sized before torch runs any parallel work, so
+    this must be called before the model is loaded.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"Warning: Could not set inter-op threads: {e}")
+
+
+def quantize_clip_model(model):
+    """Returns a copy of a CPU model with int8 dynamically quantized linear layers.
+
+    Weights of every nn.Linear (the bulk of CLIP's transformer compute) are stored
+    as int8 and activations are quantized on the fly, so no calibration is needed.
+    """
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_clip_model(quantize=False, num_threads=None, interop_threads=None):
+    set_torch_threads(num_threads, interop_threads)
     print(f"Loading CLIP model '{MODEL_NAME}' on {DEVICE}...")
     model = CLIPModel.from_pretrained(MODEL_NAME).to(DEVICE)
+    model.eval()
     processor = CLIPProcessor.from_pretrained(MODEL_NAME)
+    if quantize and DEVICE != "cpu":
+        print("int8 quantization is only used for CPU inference; ignoring it.")
+    elif quantize:
+        model = quantize_clip_model(model)
+        print("Quantized CLIP linear layers to int8 for CPU inference.")
     print("CLIP model loaded.")
     return model, processor
 
@@ -35,37 +116,80 @@ def get_text_embedding(text, model, processor):
     return text_features.cpu().numpy()
 
 
+def get_text_embeddings(texts, model, processor, batch_size=BATCH_SIZE):
+    """Embeds a list of texts with one forward pass per batch_size texts."""
+    return np.concatenate(
+        [
+            get_text_embedding(texts[start : start + batch_size], model, processor)
+            for start in range(0, len(texts), batch_size)
+        ]
+    )
+
+
 def get_image_embedding(image_pil, model, processor):
-    if image_pil.mode != "RGB":
-        image_pil = image_pil.convert("RGB")
-    inputs = processor(images=image_pil, return_tensors="pt").to(DEVICE)
+    return get_image_embeddings([image_pil], model, processor)
+
+
+def preprocess_images(images, processor):
+    """Converts a list of images to one pixel_values tensor for a batched forward pass."""
+    images = [
+        (
+            image.convert("RGB")
+            if isinstance(image, Image.Image) and image.mode != "RGB"
+            else image
+        )
+        for image in images
+    ]
+    return processor(images=images, return_tensors="pt")["pixel_values"]
+
+
+def embed_pixel_values(pixel_values, model):
     with torch.no_grad():
-        image_features = model.get_image_features(**inputs)
+        image_features = model.get_image_features(pixel_values=pixel_values.to(DEVICE))
     return image_features.cpu().numpy()
 
 
+def get_image_embeddings(images, model, processor):
+    """Embeds a list of images in a single forward pass."""
+    return embed_pixel_values(preprocess_images(images, processor), model)
+
+
 # --- Media Processing ---
+def get_video_duration(video_path):
+    """Returns the video duration in seconds from ffprobe, or None if unknown."""
+    probe = ffmpeg.probe(video_path)
+    duration_str = next(
+        (s["duration"] for s in probe["streams"] if s["codec_type"] == "video"),
+        None,
+    )
+    if not duration_str:
+        print(
+            f"Warning: Could not get duration for {video_path}. Skipping frame extraction."
+        )
+        return None
+    return float(duration_str)
+
+
+def sample_timestamps(duration, num_frames):
+    """Evenly spaced timestamps strictly inside (0, duration)."""
+    interval = duration / (num_frames + 1)
+    return [interval * i for i in range(1, num_frames + 1)]
+
+
 def extract_frames_from_video(video_path, num_frames=FRAMES_PER_VIDEO):
-    """Extracts specified number of frames evenly spaced throughout the video."""
+    """Extracts specified number of frames evenly spaced throughout the video.
+
+    Seeks with a separate ffmpeg process per frame; see extract_frames_single_pass.
+    Errors are printed and re-raised, so a failed file is not taken for one
+    without frames.
+    """
     extracted_frames = []
     try:
-        probe = ffmpeg.probe(video_path)
-        duration_str = next(
-            (s["duration"] for s in probe["streams"] if s["codec_type"] == "video"),
-            None,
-        )
-        if not duration_str:
-            print(
-                f"Warning: Could not get duration for {video_path}. Skipping frame extraction."
-            )
-            return []
-        duration = float(duration_str)
-        if duration == 0:
+        duration = get_video_duration(video_path)
+        if not duration:
             return []
 
-        interval = duration / (num_frames + 1)
-        for i in range(1, num_frames + 1):
-            timestamp = interval * i
+        for timestamp in sample_timestamps(duration, num_frames):
             out, _ = (
                 ffmpeg.input(video_path, ss=timestamp)
                 .output(
@@ -83,89 +207,921 @@ def extract_frames_from_video(video_path, num_frames=FRAMES_PER_VIDEO):
         print(
             f"Error extracting frames from {video_path}: {e.stderr.decode('utf8') if e.stderr else 'Unknown ffmpeg error'}"
         )
+        raise
     except Exception as e:
         print(f"General error extracting frames from {video_path}: {str(e)}")
+        raise
     return extracted_frames
 
 
-def discover_media_files(folder_path):
-    media_files = []
+def extract_frames_single_pass(
+    video_path, num_frames=FRAMES_PER_VIDEO, size=CLIP_INPUT_SIZE
+):
+    """Extracts evenly spaced frames with one ffmpeg process and a single decode pass.
+
+    A select filter keeps the first frame at or after each sample timestamp, and
+    frames are scaled/center-cropped to size x size (as CLIP's processor does) and
+    piped out as raw RGB, so they arrive as uint8 numpy arrays with no PNG round-trip.
+    When the pass yields a different number of frames than timestamps (two samples
+    within one frame interval, a stream ending early), frames could not be paired
+    with their timestamps, so the video is sampled with extract_frames_from_video.
+    Errors are printed and re-raised.
+    """
+    extracted_frames = []
+    try:
+        duration = get_video_duration(video_path)
+        if not duration:
+            return []
+
+        timestamps = sample_timestamps(duration, num_frames)
+        # prev_t is NaN on the first decoded frame, which must match too
+        select_expr = "+".join(
+            f"gte(t,{t:.6f})*(lt(prev_t,{t:.6f})+isnan(prev_t))" for t in timestamps
+        )
+        out, _ = (
+            ffmpeg.input(video_path)
+            .video.filter("select", select_expr)
+            .filter("scale", size, size, force_original_aspect_ratio="increase")
+            .filter("crop", size, size)
+            .output("pipe:", format="rawvideo", pix_fmt="rgb24", vsync="vfr")
+            .global_args("-loglevel", "error")
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        frame_bytes = size * size * 3
+        frames = np.frombuffer(out, dtype=np.uint8)[
+            : len(out) // frame_bytes * frame_bytes
+        ].reshape(-1, size, size, 3)
+        if len(frames) != len(timestamps):
+            return extract_frames_from_video(video_path, num_frames)
+        for timestamp, frame in zip(timestamps, frames):
+            extracted_frames.append(
+                {"image": frame, "timestamp": timestamp, "source_video": video_path}
+            )
+    except ffmpeg.Error as e:
+        print(
+            f"Error extracting frames from {video_path}: {e.stderr.decode('utf8') if e.stderr else 'Unknown ffmpeg error'}"
+        )
+        raise
+    except Exception as e:
+        print(f"General error extracting frames from {video_path}: {str(e)}")
+        raise
+    return extracted_frames
+
+
+def iter_media_files(folder_path):
+    """Yields media file paths as the directory walk finds them."""
     for root, _, files in os.walk(folder_path):
         for file in files:
             ext = os.path.splitext(file)[1].lower()
             if ext in IMAGE_EXTENSIONS or ext in VIDEO_EXTENSIONS:
-                media_files.append(os.path.join(root, file))
-    return media_files
+                yield os.path.join(root, file)
+
+
+def discover_media_files(folder_path):
+    return list(iter_media_files(folder_path))
 
 
 # --- Indexing ---
-def build_index(media_folder, model, processor, reindex=False):
-    index_path = os.path.join(media_folder, "clip_media_index.pkl")
-    if not reindex and os.path.exists(index_path):
-        print(f"Loading existing index from {index_path}")
-        with open(index_path, "rb") as f:
-            return pickle.load(f)
-
-    print(f"Building new index for {media_folder}...")
-    media_files = discover_media_files(media_folder)
-    index_data = (
-        []
-    )  # List of dicts: {'path': str, 'type': 'image'/'video_frame', 'timestamp': float_or_None, 'embedding': np.array}
-
-    for media_path in tqdm(media_files, desc="Indexing media"):
-        ext = os.path.splitext(media_path)[1].lower()
-        if ext in IMAGE_EXTENSIONS:
-            try:
-                img = Image.open(media_path)
-                embedding = get_image_embedding(img, model, processor)
-                index_data.append(
-                    {
-                        "path": media_path,
-                        "type": "image",
-                        "timestamp": None,
-                        "embedding": embedding[0],
-                    }
-                )
-            except Exception as e:
-                print(f"Error processing image {media_path}: {e}")
-        elif ext in VIDEO_EXTENSIONS:
-            frames_data = extract_frames_from_video(
-                media_path, num_frames=FRAMES_PER_VIDEO
+def file_content_hash(file_path):
+    """Returns the SHA-1 hex digest of a file's contents, read in chunks."""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(media_folder):
+    """Loads the per-file manifest written alongside the index, or {} if missing."""
+    manifest_path = os.path.join(media_folder, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not read manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(media_folder, manifest):
+    """Writes the manifest atomically, so a killed build never leaves it truncated."""
+    manifest_path = os.path.join(media_folder, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def decode_media_file(media_path, frame_decoder="single_pass"):
+    """Decodes one image, or the sampled frames of one video, into frame dicts.
+
+    Returns an iterable; video frames are produced lazily. Decoding errors are
+    raised (possibly after some frames were produced).
+    """
+    ext = os.path.splitext(media_path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        try:
+            image = Image.open(media_path).convert("RGB")
+        except Exception as e:
+            print(f"Error processing image {media_path}: {e}")
+            raise
+        return [
+            {"path": media_path, "type": "image", "timestamp": None, "image": image}
+        ]
+    elif ext in VIDEO_EXTENSIONS:
+        if frame_decoder == "adaptive":
+            # A generator: keyframes are streamed window by window
+            frames_data = extract_keyframes_adaptive(media_path, CLIP_INPUT_SIZE)
+        elif frame_decoder == "single_pass":
+            frames_data = extract_frames_single_pass(media_path, FRAMES_PER_VIDEO)
+        else:
+            frames_data = extract_frames_from_video(media_path, FRAMES_PER_VIDEO)
+        return (
+            {
+                "path": media_path,
+                "type": "video_frame",
+                "timestamp": frame_info["timestamp"],
+                "image": frame_info["image"],
+            }
+            for frame_info in frames_data
+        )
+    return []
+
+
+def decode_worker(path_queue, frame_queue, processor, frame_decoder, done, failed):
+    """Decode stage: turns queued paths into preprocessed frames until it gets None.
+
+    Paths that fail to decode are added to the failed set.
+    """
+    while True:
+        media_path = path_queue.get()
+        if media_path is None:
+            break
+        try:
+            for frame in decode_media_file(media_path, frame_decoder):
+                frame["pixel_values"] = preprocess_images(
+                    [frame.pop("image")], processor
+                )[0]
+                frame_queue.put(frame)
+        except Exception as e:
+            print(f"Error decoding {media_path}: {e}")
+            failed.add(media_path)
+        frame_queue.put(media_path)  # marks the file as finished
+    frame_queue.put(done)
+
+
+def embed_media_files(
+    media_paths,
+    model,
+    processor,
+    batch_size=BATCH_SIZE,
+    frame_decoder="single_pass",
+    num_decoders=DECODE_WORKERS,
+    on_files_done=None,
+):
+    """Embeds files through a streaming feed -> decode -> embed pipeline.
+
+    media_paths may be any iterable, e.g. a lazy directory walk: a feeder thread
+    consumes it into a bounded path queue, num_decoders threads decode and
+    preprocess files into a bounded frame queue, and this thread runs batched
+    forward passes as soon as batch_size frames are ready. The queues bound the
+    number of decoded frames in memory regardless of how many files there are.
+
+    With the adaptive frame decoder, a video frame whose embedding is a near
+    duplicate of the previous kept frame of the same video is dropped.
+    Returns {path: [item dicts]} for every path that produced at least one frame.
+    If on_files_done is given, it is instead called with {path: [item dicts]} for
+    files as soon as all their frames are embedded ([] for files without frames),
+    and those files are left out of the returned dict. Files that failed to decode
+    or whose frames failed to embed are left out of both, so that they are retried.
+    """
+    path_queue = queue.Queue(maxsize=PATH_QUEUE_SIZE)
+    frame_queue = queue.Queue(maxsize=batch_size * PREFETCH_BATCHES)
+    done = object()
+    feed_errors = []
+    failed = set()
+
+    def feed():
+        try:
+            for media_path in media_paths:
+                path_queue.put(media_path)
+        except Exception as e:
+            feed_errors.append(e)
+        for _ in range(num_decoders):
+            path_queue.put(None)
+
+    threads = [threading.Thread(target=feed, daemon=True)] + [
+        threading.Thread(
+            target=decode_worker,
+            args=(path_queue, frame_queue, processor, frame_decoder, done, failed),
+            daemon=True,
+        )
+        for _ in range(num_decoders)
+    ]
+    for thread in threads:
+        thread.start()
+
+    items_by_path = {}
+    suppress_duplicates = frame_decoder == "adaptive"
+    last_kept = {}  # path -> unit embedding of its previous kept frame
+    num_duplicates = 0
+
+    def embed_batch(frames):
+        nonlocal num_duplicates
+        try:
+            embeddings = embed_pixel_values(
+                torch.stack([f["pixel_values"] for f in frames]), model
+            )
+        except Exception as e:
+            print(f"Error embedding batch starting at {frames[0]['path']}: {e}")
+            failed.update(f["path"] for f in frames)
+            return
+        for frame, embedding in zip(frames, embeddings):
+            if suppress_duplicates and frame["type"] == "video_frame":
+                unit = embedding / (np.linalg.norm(embedding) or 1.0)
+                last_unit = last_kept.get(frame["path"])
+                if (
+                    last_unit is not None
+                    and float(unit @ last_unit) >= NEAR_DUPLICATE_SIMILARITY
+                ):
+                    num_duplicates += 1
+                    continue
+                last_kept[frame["path"]] = unit
+            items_by_path.setdefault(frame["path"], []).append(
+                {
+                    "path": frame["path"],
+                    "type": frame["type"],
+                    "timestamp": frame["timestamp"],
+                    "embedding": embedding,
+                }
             )
-            for frame_info in frames_data:
-                try:
-                    embedding = get_image_embedding(
-                        frame_info["image"], model, processor
-                    )
-                    index_data.append(
-                        {
-                            "path": media_path,
-                            "type": "video_frame",
-                            "timestamp": frame_info["timestamp"],
-                            "embedding": embedding[0],
-                        }
-                    )
-                except Exception as e:
-                    print(
-                        f"Error processing frame from {media_path} at {frame_info['timestamp']:.2f}s: {e}"
-                    )
-
-    with open(index_path, "wb") as f:
-        pickle.dump(index_data, f)
-    print(f"Index built and saved to {index_path}")
-    return index_data
+
+    batch, finished = [], []
+
+    def flush_finished():
+        for media_path in finished:
+            last_kept.pop(media_path, None)
+            if media_path in failed:
+                items_by_path.pop(media_path, None)  # partial rows are dropped
+        done_paths = [path for path in finished if path not in failed]
+        if on_files_done is not None and done_paths:
+            on_files_done({path: items_by_path.pop(path, []) for path in done_paths})
+        finished.clear()
+
+    running_decoders = num_decoders
+    with tqdm(desc="Indexing media", unit="file") as progress:
+        while running_decoders:
+            frame = frame_queue.get()
+            if frame is done:
+                running_decoders -= 1
+            elif isinstance(frame, str):
+                # All of this file's frames are embedded once the current batch is
+                finished.append(frame)
+                progress.update()
+            else:
+                batch.append(frame)
+                if len(batch) == batch_size:
+                    embed_batch(batch)
+                    batch = []
+                    flush_finished()
+    if batch:
+        embed_batch(batch)
+    flush_finished()
+    for thread in threads:
+        thread.join()
+    if feed_errors:
+        raise feed_errors[0]
+
+    if num_duplicates:
+        print(f"Dropped {num_duplicates} near-duplicate video frames.")
+    if failed:
+        print(f"{len(failed)} files failed and will be retried on the next run.")
+    return items_by_path
+
+
+def iter_index_plan(media_files, manifest):
+    """Compares files against the manifest one at a time, as they are discovered.
+
+    Yields (path, manifest_entry, source): source is None when the path needs new
+    embeddings, the path itself when it is unchanged, or an already-indexed path
+    with identical content. Files are only hashed when their size or mtime differ
+    from the manifest.
+    """
+    hash_to_path = {entry["hash"]: path for path, entry in manifest.items()}
+    for media_path in media_files:
+        try:
+            stat = os.stat(media_path)
+        except OSError as e:
+            print(f"Warning: Could not stat {media_path}: {e}")
+            continue
+        entry = manifest.get(media_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            yield media_path, entry, media_path
+            continue
+
+        try:
+            content_hash = file_content_hash(media_path)
+        except OSError as e:
+            print(f"Warning: Could not hash {media_path}: {e}")
+            continue
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": content_hash}
+        if content_hash in hash_to_path:
+            # Byte-identical to something already indexed (or touched but unmodified)
+            yield media_path, entry, hash_to_path[content_hash]
+        else:
+            hash_to_path[content_hash] = media_path
+            yield media_path, entry, None
+
+
+def build_index(
+    media_folder,
+    model,
+    processor,
+    reindex=False,
+    incremental=False,
+    batch_size=BATCH_SIZE,
+    frame_decoder="single_pass",
+    num_workers=1,
+    path_prefix=None,
+    decode_workers=DECODE_WORKERS,
+    checkpoint_interval=CHECKPOINT_INTERVAL,
+    quantize=False,
+    load_model=None,
+):
+    """Loads or builds the CLIP index for a folder.
+
+    With incremental=True an existing index is brought up to date: only new or changed
+    files are embedded, deleted files are dropped and duplicates reuse embeddings.
+    Files are embedded while the folder is still being walked, with decode_workers
+    threads decoding ahead of the model; num_workers > 1 instead embeds files in
+    that many processes. With path_prefix only the files under
+    media_folder/path_prefix are indexed, into a shard that
+    parallel_index.merge_shards later folds into the main index.
+
+    Progress is checkpointed every checkpoint_interval seconds; if a build is
+    killed, the next run resumes after the last committed checkpoint. quantize
+    tells whether model is int8-quantized, so worker processes load it the same way.
+    model may be None if load_model is given; load_model() then returns
+    (model, processor) the first time this process has files to embed itself.
+    """
+    index_dir, discover_root = media_folder, media_folder
+    if path_prefix:
+        from parallel_index import save_shard_info, shard_dir_for_prefix
+
+        index_dir = shard_dir_for_prefix(media_folder, path_prefix)
+        discover_root = os.path.join(media_folder, path_prefix)
+        os.makedirs(index_dir, exist_ok=True)
+        save_shard_info(index_dir, path_prefix)
+
+    build_params = {
+        "model": MODEL_NAME,
+        "frame_decoder": frame_decoder,
+        "quantize": quantize,
+    }
+    resumed_manifest, _ = load_checkpoint(index_dir, build_params)
+
+    previous_index = None if reindex else load_index(index_dir)
+    if previous_index is None and not reindex:
+        previous_index = convert_legacy_index(index_dir)
+    if previous_index is not None and not incremental and not resumed_manifest:
+        print(f"Loading existing index from {index_dir}")
+        return previous_index
+
+    manifest = {}
+    if previous_index is not None:
+        manifest = load_manifest(index_dir)
+        if manifest:
+            print(f"Updating existing index in {index_dir}")
+        else:
+            print("No manifest found for existing index; rebuilding from scratch.")
+    if not manifest:
+        previous_index = None
+        print(f"Building new index for {discover_root}...")
+    if resumed_manifest:
+        # Files in committed checkpoint segments count as already indexed
+        print(
+            f"Resuming an interrupted build: {len(resumed_manifest)} files were already embedded."
+        )
+        manifest = {**manifest, **resumed_manifest}
+    checkpoint_path = start_checkpoint(index_dir, build_params)
+
+    # The walk and the manifest comparison run lazily inside the embedding
+    # pipeline's feeder thread, so embedding starts as soon as the first file is found
+    new_manifest, unchanged, reused, to_embed = {}, [], {}, []
+
+    def paths_to_embed():
+        for media_path, entry, source in iter_index_plan(
+            iter_media_files(discover_root), manifest
+        ):
+            new_manifest[media_path] = entry
+            if source is None:
+                to_embed.append(media_path)
+                yield media_path
+            elif source == media_path:
+                unchanged.append(media_path)
+            else:
+                reused[media_path] = source
+
+    # Embedded files are committed to checkpoint segments as they finish
+    media_to_embed = paths_to_embed()
+    if num_workers > 1:
+        # Splitting work by file size needs the full list up front
+        media_to_embed = list(media_to_embed)
+    if num_workers > 1 and len(media_to_embed) > 1:
+        from parallel_index import embed_media_files_parallel
+
+        embed_media_files_parallel(
+            media_to_embed,
+            new_manifest,
+            checkpoint_path,
+            num_workers,
+            batch_size,
+            frame_decoder,
+            checkpoint_interval,
+            quantize,
+        )
+    else:
+        if model is None and load_model is not None and media_to_embed:
+            model, processor = load_model()
+        writer = CheckpointWriter(checkpoint_path, new_manifest, checkpoint_interval)
+        embed_media_files(
+            media_to_embed,
+            model,
+            processor,
+            batch_size,
+            frame_decoder,
+            decode_workers,
+            on_files_done=writer.add,
+        )
+        writer.commit()
+
+    # Files that failed to decode or embed were never checkpointed. Leaving them
+    # out of the manifest makes the next run retry them.
+    _, checkpoint_blocks = load_checkpoint(index_dir, build_params)
+    failed = {path for path in to_embed if path not in checkpoint_blocks}
+    failed.update(path for path, source in reused.items() if source in failed)
+    for media_path in failed:
+        del new_manifest[media_path]
+    deleted = [p for p in manifest if p not in new_manifest and p not in failed]
+    print(
+        f"{len(unchanged)} unchanged, {len(reused)} duplicate, {len(to_embed)} embedded, {len(deleted)} deleted, {len(failed)} failed."
+    )
+    if previous_index is not None and not resumed_manifest and new_manifest == manifest:
+        # Rewriting an unchanged index would only make its derived structures stale
+        clear_checkpoint(index_dir)
+        print(f"Index in {index_dir} is up to date.")
+        return previous_index
+
+    # path -> (embeddings, types, timestamps); existing rows stay views into the
+    # memory-mapped segments and previous index
+    def existing_block(path):
+        if path in checkpoint_blocks:
+            return checkpoint_blocks[path]
+        return path_block(previous_index, path) if previous_index is not None else None
+
+    # Changed files that produced no frames must not keep their old rows
+    path_blocks = {path: checkpoint_blocks.get(path) for path in to_embed}
+    for media_path in unchanged:
+        path_blocks[media_path] = existing_block(media_path)
+    for media_path, source_path in reused.items():
+        path_blocks[media_path] = existing_block(source_path)
+
+    index = save_index(
+        index_dir,
+        {path: path_blocks.get(path) for path in new_manifest},
+        new_manifest,
+    )
+    save_manifest(index_dir, new_manifest)
+    clear_checkpoint(index_dir)
+    print(f"Index built and saved to {index_dir}")
+    return index
 
 
 # --- Searching ---
-def search_index(query_text, index_data, model, processor, top_k=5):
-    query_embedding = get_text_embedding(query_text, model, processor)
+def search_embedding(
+    query_embedding, index, top_k=5, n_probe=None, rerank=False, candidate_rows=None
+):
+    """Returns (score, item) pairs for one query embedding.
+
+    By default every row is scored with one matrix-vector product over the normalized
+    embeddings; candidate_rows (from filter_rows) restricts scoring to those rows.
+    When the index has attached pooled embeddings (pooled_index), files and then
+    their segments are ranked first and only the frames of the best segments are
+    scored. When it has an attached IVF and n_probe is given, only the rows of the
+    n_probe nearest inverted lists are scored; when it has attached compressed codes,
+    scoring runs on the codes, optionally followed by an exact re-rank of the
+    shortlist from the float32 matrix.
+    """
+    query = normalize_rows(query_embedding.reshape(1, -1))[0]
+    embeddings = index["embeddings"]
+    codes = index.get("codes")
+    rows = candidate_rows  # None means all rows
+    pooled = index.get("pooled")
+    if pooled is not None:
+        coarse_rows = coarse_candidate_rows(
+            query, pooled, pooled["coarse_videos"], rows
+        )
+        if rows is not None:
+            coarse_rows = np.intersect1d(rows, coarse_rows, assume_unique=True)
+        # With a restrictive filter the best segments can hold fewer than top_k
+        # allowed rows; the filtered rows are then searched exactly instead
+        if len(coarse_rows) >= top_k:
+            rows = coarse_rows
+    ivf = index.get("ivf")
+    if ivf is not None and n_probe:
+        # A restrictive filter can already be cheaper to scan exactly than the
+        # expected len(embeddings) * n_probe / n_lists rows the IVF would visit
+        ivf_scan = len(embeddings) * n_probe / len(ivf["centroids"])
+        if rows is None or len(rows) > ivf_scan:
+            ivf_rows = ivf_candidates(query, ivf, n_probe)
+            rows = (
+                ivf_rows
+                if rows is None
+                else np.intersect1d(rows, ivf_rows, assume_unique=True)
+            )
+    if rows is not None and len(rows) == 0:
+        return []
 
-    similarities = []
-    for item in index_data:
-        sim = np.dot(query_embedding, item["embedding"]) / (
-            np.linalg.norm(query_embedding) * np.linalg.norm(item["embedding"])
+    if codes is not None:
+        scores = score_codes(query, codes, rows)
+    else:
+        scores = embeddings @ query if rows is None else embeddings[rows] @ query
+    if rows is None:
+        rows = np.arange(len(scores))
+
+    if codes is not None and rerank:
+        rows, scores = rerank_shortlist(query, embeddings, rows, scores, top_k)
+    else:
+        best = top_k_indices(scores, top_k)
+        rows, scores = rows[best], scores[best]
+    return [(float(score), index_item(index, row)) for row, score in zip(rows, scores)]
+
+
+def search_embedding_post_filtered(
+    query_embedding,
+    index,
+    top_k,
+    post_filter,
+    n_probe=None,
+    rerank=False,
+    candidate_rows=None,
+):
+    """search_embedding followed by post_filter(results) -> results.
+
+    Fetches more results (doubling) until top_k survive the post-filter or the
+    candidates run out.
+    """
+    fetch_k = top_k
+    while True:
+        results = search_embedding(
+            query_embedding, index, fetch_k, n_probe, rerank, candidate_rows
         )
-        similarities.append((sim[0], item))
+        kept = post_filter(results)
+        if len(kept) >= top_k or len(results) < fetch_k:
+            return kept[:top_k]
+        fetch_k *= 2
+
+
+def search_index(
+    query_text,
+    index,
+    model,
+    processor,
+    top_k=5,
+    n_probe=None,
+    rerank=False,
+    filters=None,
+    collapse_duplicates=False,
+):
+    """Searches one text query; filters holds filter_rows keyword arguments.
+
+    collapse_duplicates keeps one file per near-duplicate group; the index must
+    then have "duplicate_groups" attached.
+    """
+    candidate_rows = filter_rows(index, **filters) if filters else None
+    query_embedding = get_text_embedding(query_text, model, processor)[0]
+    if collapse_duplicates:
+        return search_embedding_post_filtered(
+            query_embedding,
+            index,
+            top_k,
+            lambda results: collapse_duplicate_results(results, index),
+            n_probe,
+            rerank,
+            candidate_rows,
+        )
+    return search_embedding(
+        query_embedding, index, top_k, n_probe, rerank, candidate_rows
+    )
+
+
+def batch_top_k(
+    query_embeddings,
+    embeddings,
+    top_k,
+    rows=None,
+    query_chunk=QUERY_CHUNK_SIZE,
+    row_chunk=ROW_CHUNK_SIZE,
+):
+    """Exact top_k rows for many queries using matrix-matrix products.
+
+    The index (or only the given sorted rows) is streamed once in row_chunk tiles;
+    each tile is scored against query_chunk queries at a time and merged into every
+    query's running top_k, so memory stays bounded for any index size or number of
+    queries. Returns (rows, scores), both (num_queries, top_k), best first.
+    """
+    queries = normalize_rows(query_embeddings)
+    num_rows = len(embeddings) if rows is None else len(rows)
+    top_k = min(top_k, num_rows)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for r_start in range(0, num_rows, row_chunk):
+        if rows is None:
+            tile_rows = np.arange(r_start, min(r_start + row_chunk, num_rows))
+            tile_embeddings = np.asarray(embeddings[r_start : r_start + row_chunk]).T
+        else:
+            tile_rows = rows[r_start : r_start + row_chunk]
+            tile_embeddings = embeddings[tile_rows].T
+        k = min(top_k, len(tile_rows))
+        tile_best = np.empty((len(queries), k), dtype=np.int64)
+        tile_scores = np.empty((len(queries), k), dtype=np.float32)
+        for q_start in range(0, len(queries), query_chunk):
+            q_end = q_start + query_chunk
+            tile = queries[q_start:q_end] @ tile_embeddings
+            best = np.argpartition(-tile, k - 1, axis=1)[:, :k]
+            tile_best[q_start:q_end] = tile_rows[best]
+            tile_scores[q_start:q_end] = np.take_along_axis(tile, best, axis=1)
+        candidate_rows = np.concatenate([best_rows, tile_best], axis=1)
+        candidate_scores = np.concatenate([best_scores, tile_scores], axis=1)
+        keep_k = min(top_k, candidate_scores.shape[1])
+        keep = np.argpartition(-candidate_scores, keep_k - 1, axis=1)[:, :keep_k]
+        best_rows = np.take_along_axis(candidate_rows, keep, axis=1)
+        best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return (
+        np.take_along_axis(best_rows, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+def search_index_batch(
+    queries,
+    index,
+    model,
+    processor,
+    top_k=5,
+    batch_size=BATCH_SIZE,
+    filters=None,
+    collapse_duplicates=False,
+):
+    """Searches many text queries at once; returns one list of (score, item) per query.
+
+    With collapse_duplicates, top_k * COLLAPSE_FETCH_FACTOR results are fetched per
+    query and collapsed, so a query can return fewer than top_k.
+    """
+    candidate_rows = filter_rows(index, **filters) if filters else None
+    query_embeddings = get_text_embeddings(queries, model, processor, batch_size)
+    fetch_k = top_k * COLLAPSE_FETCH_FACTOR if collapse_duplicates else top_k
+    rows, scores = batch_top_k(
+        query_embeddings, index["embeddings"], fetch_k, candidate_rows
+    )
+    results_per_query = [
+        [
+            (float(score), index_item(index, row))
+            for row, score in zip(query_rows, query_scores)
+        ]
+        for query_rows, query_scores in zip(rows, scores)
+    ]
+    if collapse_duplicates:
+        results_per_query = [
+            collapse_duplicate_results(results, index)[:top_k]
+            for results in results_per_query
+        ]
+    return results_per_query
+
+
+def search_images(
+    image_paths,
+    index,
+    model,
+    processor,
+    top_k=5,
+    n_probe=None,
+    rerank=False,
+    filters=None,
+    exclude_self=False,
+    batch_size=BATCH_SIZE,
+    collapse_duplicates=False,
+):
+    """Searches with query images instead of text (reverse image search).
+
+    The images are embedded in batched forward passes and each is scored with
+    search_embedding, so IVF, compressed codes and filters apply as for text
+    queries. With exclude_self, rows of the query image's own file are dropped;
+    collapse_duplicates keeps one file per near-duplicate group.
+    Returns [(image_path, [(score, item), ...])] for every image that could be read.
+    """
+    loaded_paths, images = [], []
+    for image_path in image_paths:
+        try:
+            images.append(Image.open(image_path).convert("RGB"))
+            loaded_paths.append(image_path)
+        except Exception as e:
+            print(f"Error loading query image {image_path}: {e}")
+    if not images:
+        return []
 
-    similarities.sort(key=lambda x: x[0], reverse=True)
-    return similarities[:top_k]
+    candidate_rows = filter_rows(index, **filters) if filters else None
+    query_embeddings = np.concatenate(
+        [
+            get_image_embeddings(images[start : start + batch_size], model, processor)
+            for start in range(0, len(images), batch_size)
+        ]
+    )
+    results_per_image = []
+    for image_path, query_embedding in zip(loaded_paths, query_embeddings):
+        own_path = os.path.abspath(image_path)
+
+        def post_filter(results):
+            if exclude_self:
+                # The query's own frames would otherwise crowd out the top_k
+                results = [
+                    r for r in results if os.path.abspath(r[1]["path"]) != own_path
+                ]
+            if collapse_duplicates:
+                results = collapse_duplicate_results(results, index)
+            return results
+
+        results = search_embedding_post_filtered(
+            query_embedding,
+            index,
+            top_k,
+            post_filter,
+            n_probe,
+            rerank,
+            candidate_rows,
+        )
+        results_per_image.append((image_path, results))
+    return results_per_image
+
+
+def search_hybrid(
+    query_text,
+    index,
+    model,
+    processor,
+    top_k=5,
+    n_probe=None,
+    rerank=False,
+    filters=None,
+):
+    """Searches frames and transcript segments and fuses them into moments.
+
+    The index must have "transcripts" attached (transcript_index). One CLIP text
+    embedding of the query scores both the frames and the segment texts. The best
+    HYBRID_CANDIDATES of each are fused by time: a segment takes the best-ranked
+    frame of the same video within its [start, end] (+/- ALIGN_TOLERANCE), and
+    frames that align with no segment stay visual-only moments. Returns (score,
+    moment) pairs, where a moment has path, start, end, timestamp (best frame),
+    text (segment) and match ("visual", "spoken" or "both").
+    """
+    candidate_rows = filter_rows(index, **filters) if filters else None
+    query_embedding = get_text_embedding(query_text, model, processor)[0]
+    visual = search_embedding(
+        query_embedding, index, HYBRID_CANDIDATES, n_probe, rerank, candidate_rows
+    )
+    visual_path_ids = np.searchsorted(
+        index["paths"], [item["path"] for _, item in visual]
+    )
+    visual_times = np.array(
+        [
+            np.nan if item["timestamp"] is None else item["timestamp"]
+            for _, item in visual
+        ],
+        dtype=np.float32,
+    )
+
+    transcripts = index["transcripts"]
+    # Segments take the other filters from the rows of their video, and the
+    # timestamp range from their own [start, end]
+    filters = filters or {}
+    segment_filters = {k: v for k, v in filters.items() if k != "timestamp_range"}
+    segment_rows = filter_rows(index, **segment_filters) if segment_filters else None
+    allowed_path_ids = (
+        None if segment_rows is None else np.unique(index["path_ids"][segment_rows])
+    )
+    segment_scores = score_segments(
+        query_embedding,
+        query_text,
+        transcripts,
+        allowed_path_ids,
+        filters.get("timestamp_range"),
+    )
+    spoken = top_k_indices(segment_scores, HYBRID_CANDIDATES)
+    spoken = spoken[np.isfinite(segment_scores[spoken])]
+    spoken_path_ids = transcripts["path_ids"][spoken]
+    starts, ends = transcripts["starts"][spoken], transcripts["ends"][spoken]
+
+    # aligned[v, s]: visual hit v lies in spoken segment s of the same video
+    with np.errstate(invalid="ignore"):
+        aligned = (
+            (visual_path_ids[:, None] == spoken_path_ids[None, :])
+            & (visual_times[:, None] >= starts[None, :] - ALIGN_TOLERANCE)
+            & (visual_times[:, None] <= ends[None, :] + ALIGN_TOLERANCE)
+        )
+    moments = []
+    for s_rank, segment in enumerate(spoken):
+        score = 1.0 / (RRF_K + s_rank + 1)
+        frame_time = None
+        frame_ranks = np.flatnonzero(aligned[:, s_rank])
+        if len(frame_ranks):
+            score += 1.0 / (RRF_K + frame_ranks[0] + 1)
+            frame_time = float(visual_times[frame_ranks[0]])
+        moment = {
+            "path": str(index["paths"][spoken_path_ids[s_rank]]),
+            "start": float(starts[s_rank]),
+            "end": float(ends[s_rank]),
+            "timestamp": frame_time,
+            "text": str(transcripts["texts"][segment]),
+            "match": "both" if len(frame_ranks) else "spoken",
+        }
+        moments.append((float(score), moment))
+    for v_rank in np.flatnonzero(~aligned.any(axis=1)):
+        _, item = visual[v_rank]
+        moment = {
+            "path": item["path"],
+            "start": item["timestamp"],
+            "end": item["timestamp"],
+            "timestamp": item["timestamp"],
+            "text": None,
+            "match": "visual",
+        }
+        moments.append((float(1.0 / (RRF_K + v_rank + 1)), moment))
+    moments.sort(key=lambda m: m[0], reverse=True)
+    return moments[:top_k]
+
+
+def search_moments(
+    query_text,
+    index,
+    model,
+    processor,
+    top_k=5,
+    n_probe=None,
+    rerank=False,
+    filters=None,
+    margin=MOMENT_MARGIN,
+):
+    """Searches for time ranges of videos instead of isolated frames.
+
+    The videos of the best MOMENT_CANDIDATES frames (found with search_embedding,
+    so IVF, codes and two-stage search apply) have all their frames scored exactly,
+    and merge_moments turns runs of high smoothed scores into intervals padded by
+    MOMENT_PADDING seconds. Returns (score, moment) pairs like search_hybrid, with
+    timestamp set to the best frame of the interval.
+    """
+    video_rows = np.flatnonzero(index["types"] == MEDIA_TYPES.index("video_frame"))
+    candidate_rows = video_rows
+    if filters:
+        candidate_rows = np.intersect1d(
+            filter_rows(index, **filters), video_rows, assume_unique=True
+        )
+    query_embedding = get_text_embedding(query_text, model, processor)[0]
+    hits = search_embedding(
+        query_embedding, index, MOMENT_CANDIDATES, n_probe, rerank, candidate_rows
+    )
+    if not hits:
+        return []
+    path_ids = np.unique(np.searchsorted(index["paths"], [i["path"] for _, i in hits]))
+    offsets = index["path_offsets"]
+    counts = offsets[path_ids + 1] - offsets[path_ids]
+    rows = np.repeat(offsets[path_ids] - np.cumsum(counts) + counts, counts) + (
+        np.arange(counts.sum())
+    )
+    rows = np.intersect1d(rows, candidate_rows, assume_unique=True)
+    query = normalize_rows(query_embedding[None])[0]
+    scores = np.asarray(index["embeddings"][rows], dtype=np.float32) @ query
+
+    moment_paths, starts, ends, peaks, moment_scores = merge_moments(
+        index["path_ids"][rows], index["timestamps"][rows], scores, margin
+    )
+    return [
+        (
+            float(score),
+            {
+                "path": str(index["paths"][path_id]),
+                "start": max(0.0, float(start) - MOMENT_PADDING),
+                "end": float(end) + MOMENT_PADDING,
+                "timestamp": float(peak),
+                "text": None,
+                "match": "visual",
+            },
+        )
+        for path_id, start, end, peak, score in zip(
+            moment_paths[:top_k],
+            starts[:top_k],
+            ends[:top_k],
+            peaks[:top_k],
+            moment_scores[:top_k],
+        )
+    ]
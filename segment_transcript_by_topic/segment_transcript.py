@@ -1,15 +1,35 @@
 import argparse
-from utils import extract_audio, transcribe_audio
+import os
+from utils import (
+    transcribe_audio,
+    DEFAULT_TRANSCRIPT_CACHE_DIR,
+    TRANSCRIPT_CACHE_ENV,
+    WHISPER_WORKER_ENV,
+)
 from topic_segmenter import segment_by_topic
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", required=True)
     parser.add_argument("--output", default="segments.json")
+    parser.add_argument(
+        "--whisper_worker",
+        default=os.environ.get(WHISPER_WORKER_ENV),
+        help=f"URL of a running transcribe_audio/whisper_worker.py (e.g. http://127.0.0.1:8766) that keeps models loaded between runs (default: ${WHISPER_WORKER_ENV}).",
+    )
+    parser.add_argument(
+        "--no_transcript_cache",
+        action="store_true",
+        help=f"Always run Whisper, bypassing the transcript cache shared by the Whisper tools (${TRANSCRIPT_CACHE_ENV}, default: {DEFAULT_TRANSCRIPT_CACHE_DIR}).",
+    )
     args = parser.parse_args()
 
-    audio_path = extract_audio(args.input)
-    transcript = transcribe_audio(audio_path)
+    # Audio is decoded in memory, so concurrent runs share no temporary file
+    transcript = transcribe_audio(
+        args.input,
+        worker_url=args.whisper_worker,
+        use_cache=not args.no_transcript_cache,
+    )
 
     segments = segment_by_topic(transcript)
 
@@ -1,8 +1,11 @@
 import argparse
 import ffmpeg
+import json
 import os
 import math
 
+MIN_MOMENT_SECONDS = 2.0  # shorter moments (single-frame matches) are widened to this
+
 
 def get_video_duration(input_path):
     """Gets the duration of a video file in seconds using ffprobe."""
@@ -54,51 +57,111 @@ def split_video(input_path, output_folder, chunk_duration_seconds):
         print(
             f"Processing chunk {i+1}/{num_chunks}: start={start_time:.2f}s, duration={current_chunk_duration:.2f}s -> {output_filename}"
         )
+        save_clip(
+            input_path,
+            output_filename,
+            start_time,
+            current_chunk_duration,
+            f"chunk {i+1}",
+        )
+
 
+def save_clip(input_path, output_filename, start_time, duration, label):
+    """Cuts [start_time, start_time + duration] of the video into output_filename."""
+    try:
+        (
+            ffmpeg.input(input_path, ss=start_time, t=duration)
+            .output(
+                output_filename, c="copy"
+            )  # Use stream copy for speed if no re-encoding is needed
+            .global_args("-loglevel", "error")  # Suppress verbose ffmpeg logs
+            .run(overwrite_output=True)
+        )
+        print(f"[✓] Saved {output_filename}")
+    except ffmpeg.Error as e:
+        print(f"Error processing {label}: {e.stderr.decode('utf8')}")
+        # Attempt without stream copy if copy fails (e.g., format change or filter needed)
         try:
+            print(f"Retrying {label} without stream copy...")
             (
-                ffmpeg.input(input_path, ss=start_time, t=current_chunk_duration)
-                .output(
-                    output_filename, c="copy"
-                )  # Use stream copy for speed if no re-encoding is needed
-                .global_args("-loglevel", "error")  # Suppress verbose ffmpeg logs
+                ffmpeg.input(input_path, ss=start_time, t=duration)
+                .output(output_filename)  # No c='copy'
+                .global_args("-loglevel", "error")
                 .run(overwrite_output=True)
             )
-            print(f"[✓] Saved {output_filename}")
-        except ffmpeg.Error as e:
-            print(f"Error processing chunk {i+1}: {e.stderr.decode('utf8')}")
-            # Attempt without stream copy if copy fails (e.g., format change or filter needed)
-            try:
-                print(f"Retrying chunk {i+1} without stream copy...")
-                (
-                    ffmpeg.input(input_path, ss=start_time, t=current_chunk_duration)
-                    .output(output_filename)  # No c='copy'
-                    .global_args("-loglevel", "error")
-                    .run(overwrite_output=True)
-                )
-                print(f"[✓] Saved {output_filename} (after retry without stream copy)")
-            except ffmpeg.Error as e_retry:
-                print(
-                    f"Error processing chunk {i+1} on retry: {e_retry.stderr.decode('utf8')}"
-                )
-                print(f"[✗] Failed to save {output_filename}")
+            print(f"[✓] Saved {output_filename} (after retry without stream copy)")
+        except ffmpeg.Error as e_retry:
+            print(f"Error processing {label} on retry: {e_retry.stderr.decode('utf8')}")
+            print(f"[✗] Failed to save {output_filename}")
+
+
+def split_moments(moments_file, output_folder):
+    """Cuts every [start, end] moment listed in a search_script.py --moments_output file.
+
+    Moments shorter than MIN_MOMENT_SECONDS, such as the single-frame visual
+    matches of --hybrid (start == end), are widened to it around their middle.
+    """
+    with open(moments_file, "r", encoding="utf-8") as f:
+        listed = json.load(f)
+    moments = [
+        m for m in listed if m.get("start") is not None and m.get("end") is not None
+    ]
+    if len(moments) < len(listed):
+        print(
+            f"Warning: Skipping {len(listed) - len(moments)} moments without a time range (images)."
+        )
+
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+        print(f"Created output directory: {output_folder}")
+
+    print(f"Cutting {len(moments)} moments from {moments_file}.")
+    for i, moment in enumerate(moments):
+        if not os.path.exists(moment["path"]):
+            print(f"Error: Input file not found at {moment['path']}")
+            continue
+        start, end = moment["start"], moment["end"]
+        if end - start < MIN_MOMENT_SECONDS:
+            middle = (start + end) / 2
+            start = max(0.0, middle - MIN_MOMENT_SECONDS / 2)
+            end = start + MIN_MOMENT_SECONDS
+        stem = os.path.splitext(os.path.basename(moment["path"]))[0]
+        output_filename = os.path.join(
+            output_folder,
+            f"moment_{i+1:03d}_{stem}_{start:.0f}s.mp4",
+        )
+        print(
+            f"Processing moment {i+1}/{len(moments)}: {moment['path']} {start:.2f}s - {end:.2f}s -> {output_filename}"
+        )
+        save_clip(moment["path"], output_filename, start, end - start, f"moment {i+1}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Split a video file into N-second chunks."
     )
-    parser.add_argument("--input", required=True, help="Path to the input video file.")
+    parser.add_argument("--input", help="Path to the input video file.")
     parser.add_argument(
         "--output_folder", required=True, help="Directory to save the video chunks."
     )
     parser.add_argument(
-        "--duration", type=int, required=True, help="Duration of each chunk in seconds."
+        "--duration", type=int, help="Duration of each chunk in seconds."
+    )
+    parser.add_argument(
+        "--moments_file",
+        help="Instead of fixed chunks, cut the [start, end] moments of a search_script.py --moments_output JSON file.",
     )
 
     args = parser.parse_args()
 
-    if args.duration <= 0:
+    if args.moments_file:
+        split_moments(args.moments_file, args.output_folder)
+        print("Video splitting process completed.")
+    elif not args.input or args.duration is None:
+        parser.error(
+            "--input and --duration are required unless --moments_file is given"
+        )
+    elif args.duration <= 0:
         print("Error: Duration must be a positive integer.")
     else:
         split_video(args.input, args.output_folder, args.duration)
@@ -13,12 +13,12 @@ DEFAULT_MODEL = "facebook/bart-large-cnn"
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Summarize a transcript from a .txt or Whisper .json file."
+        description="Summarize a transcript from a .txt, Whisper .json or columnar .wtc file."
     )
     parser.add_argument(
         "--input_file",
         required=True,
-        help="Path to the input transcript file (.txt or .json).",
+        help="Path to the input transcript file (.txt, .json or .wtc).",
     )
     parser.add_argument(
         "--output_file",
@@ -1,16 +1,30 @@
 import json
 from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
+from transcript_format import ColumnarTranscript, TRANSCRIPT_EXTENSION
 
 DEFAULT_MODEL_NAME = "facebook/bart-large-cnn"
 
 
 def load_transcript_text(file_path):
-    """Loads text from a .txt or Whisper .json transcript file."""
-    if not file_path.lower().endswith((".txt", ".json")):
-        raise ValueError("Input file must be a .txt or .json file.")
+    """Loads text from a .txt, Whisper .json or columnar .wtc transcript file."""
+    if not file_path.lower().endswith((".txt", ".json", TRANSCRIPT_EXTENSION)):
+        raise ValueError("Input file must be a .txt, .json or .wtc file.")
 
     try:
+        if file_path.lower().endswith(TRANSCRIPT_EXTENSION):
+            # Reads only the text columns, not the times, tokens or words
+            transcript = ColumnarTranscript(file_path)
+            if transcript.text is not None:
+                return transcript.text
+            full_text = " ".join(
+                segment["text"].strip()
+                for segment in transcript.segments(keys=("text",))
+                if isinstance(segment.get("text"), str)
+            )
+            if full_text:
+                return full_text
+            raise ValueError(".wtc transcript contains no usable text.")
         if file_path.lower().endswith(".json"):
             with open(file_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
@@ -0,0 +1,200 @@
+import heapq
+import json
+import multiprocessing
+import os
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import torch
+from utils import (
+    decode_audio,
+    is_video_file,
+    load_cached_transcript,
+    load_whisper_model,
+    save_cached_transcript,
+    transcript_cache_key,
+)
+from transcript_format import is_columnar_transcript, write_columnar_transcript
+
+AUDIO_EXTENSIONS = [".mp3", ".wav", ".m4a", ".flac", ".ogg", ".aac", ".opus", ".wma"]
+PREFETCH_FILES = 2  # Decoded inputs waiting for the model, per worker
+BATCH_OPTIONS = {"verbose": None}  # Passed to model.transcribe for every input
+
+
+def is_media_file(filepath):
+    ext = os.path.splitext(filepath)[1].lower()
+    return ext in AUDIO_EXTENSIONS or is_video_file(filepath)
+
+
+def discover_inputs(input_dir):
+    """Returns every audio or video file under input_dir, sorted."""
+    inputs = []
+    for root, _, files in os.walk(input_dir):
+        inputs.extend(os.path.join(root, f) for f in files if is_media_file(f))
+    return sorted(inputs)
+
+
+def read_manifest(manifest_path):
+    """Reads one input path per line; relative paths are relative to the manifest."""
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [
+        os.path.join(manifest_dir, line)
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+
+
+def plan_outputs(input_paths, output_dir, extension=".json"):
+    """Maps every input to output_dir/<path relative to the inputs' common folder>
+    with the transcript extension (.json or .wtc).
+
+    Inputs that would share an output (a.mp3 and a.mp4) keep their media
+    extension instead (a.mp3.json, a.mp4.json).
+    """
+    input_paths = [os.path.abspath(p) for p in input_paths]
+    root = os.path.commonpath([os.path.dirname(p) for p in input_paths])
+    relative_paths = [os.path.relpath(path, root) for path in input_paths]
+    stems = [os.path.splitext(relative)[0] for relative in relative_paths]
+    stem_counts = Counter(os.path.normcase(stem) for stem in stems)
+    return [
+        (
+            path,
+            os.path.join(
+                output_dir,
+                (relative if stem_counts[os.path.normcase(stem)] > 1 else stem)
+                + extension,
+            ),
+        )
+        for path, relative, stem in zip(input_paths, relative_paths, stems)
+    ]
+
+
+def split_by_size(jobs, num_parts):
+    """Splits (input, output) jobs into num_parts lists of similar total input size."""
+    sizes = {}
+    for input_path, _ in jobs:
+        try:
+            sizes[input_path] = os.path.getsize(input_path)
+        except OSError:
+            sizes[input_path] = 0
+    parts = [[] for _ in range(num_parts)]
+    heap = [(0, i) for i in range(num_parts)]
+    # Largest files first, each to the currently lightest part
+    for job in sorted(jobs, key=lambda job: sizes[job[0]], reverse=True):
+        load, i = heapq.heappop(heap)
+        parts[i].append(job)
+        heapq.heappush(heap, (load + sizes[job[0]], i))
+    return [part for part in parts if part]
+
+
+def save_transcript(result, output_path):
+    """Writes the transcript atomically, so an interrupted run leaves no partial output."""
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if is_columnar_transcript(output_path):
+        write_columnar_transcript(result, output_path)
+        return
+    with open(output_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    os.replace(output_path + ".tmp", output_path)
+
+
+def prefetch_audio(jobs, audio_queue, model_size, use_cache):
+    """Looks up each input in the transcript cache, else decodes it to 16 kHz mono
+    samples, ahead of the model. Puts (input, output, cache key, cached transcript,
+    audio or exception) jobs on audio_queue; None ends."""
+    params = {"model_size": model_size, "options": BATCH_OPTIONS}
+    for input_path, output_path in jobs:
+        key = cached = None
+        try:
+            if use_cache:
+                key = transcript_cache_key(input_path, params)
+                cached = load_cached_transcript(key)
+            audio = decode_audio(input_path) if cached is None else None
+        except Exception as e:
+            audio = e
+        audio_queue.put((input_path, output_path, key, cached, audio))
+    audio_queue.put(None)
+
+
+def transcribe_worker(jobs, model_size, num_threads, use_cache=True):
+    """Runs in a worker process: loads Whisper once and transcribes its jobs in order,
+    decoding the next inputs in a background thread. Returns (done, failed)."""
+    torch.set_num_threads(num_threads)
+    model = load_whisper_model(model_size)
+    audio_queue = queue.Queue(maxsize=PREFETCH_FILES)
+    threading.Thread(
+        target=prefetch_audio,
+        args=(jobs, audio_queue, model_size, use_cache),
+        daemon=True,
+    ).start()
+    done = failed = 0
+    while True:
+        job = audio_queue.get()
+        if job is None:
+            return done, failed
+        input_path, output_path, key, cached, audio = job
+        if isinstance(audio, Exception):
+            print(f"Error decoding audio of {input_path}: {audio}")
+            failed += 1
+            continue
+        try:
+            if cached is not None:
+                save_transcript(cached, output_path)
+                print(f"[✓] {input_path} -> {output_path} (cached)")
+            else:
+                result = model.transcribe(audio, **BATCH_OPTIONS)
+                save_transcript(result, output_path)
+                if key:
+                    save_cached_transcript(key, result)
+                print(f"[✓] {input_path} -> {output_path}")
+            done += 1
+        except Exception as e:
+            print(f"Error transcribing {input_path}: {e}")
+            failed += 1
+
+
+def transcribe_batch(
+    input_paths,
+    output_dir,
+    model_size="base",
+    num_workers=1,
+    num_threads=None,
+    use_cache=True,
+    extension=".json",
+):
+    """Transcribes many inputs across num_workers processes, one JSON per input.
+
+    Inputs whose transcript already exists in output_dir are skipped, so an
+    interrupted batch resumes where it stopped. num_threads is the torch thread
+    count per worker (default: the CPU cores divided among the workers). With
+    use_cache, inputs already in the transcript cache are copied, not transcribed.
+    extension picks the transcript format: ".json" (Whisper JSON) or ".wtc".
+    """
+    jobs = plan_outputs(input_paths, output_dir, extension) if input_paths else []
+    pending = [job for job in jobs if not os.path.exists(job[1])]
+    if len(pending) < len(jobs):
+        print(f"Skipping {len(jobs) - len(pending)} inputs already transcribed.")
+    if not pending:
+        print("Nothing to transcribe.")
+        return
+    parts = split_by_size(pending, num_workers)
+    num_threads = num_threads or max(1, (os.cpu_count() or 1) // len(parts))
+    print(
+        f"Transcribing {len(pending)} files with Whisper {model_size} in {len(parts)} processes with {num_threads} torch threads each..."
+    )
+    # spawn rather than fork: forked children inherit torch's thread pools badly
+    context = multiprocessing.get_context("spawn")
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=len(parts), mp_context=context) as pool:
+        futures = [
+            pool.submit(transcribe_worker, part, model_size, num_threads, use_cache)
+            for part in parts
+        ]
+        for future in futures:
+            part_done, part_failed = future.result()
+            done += part_done
+            failed += part_failed
+    print(f"[✓] {done} transcripts saved to {output_dir} ({failed} failed).")
@@ -0,0 +1,39 @@
+import argparse
+import os
+from transcript_format import (
+    is_columnar_transcript,
+    load_transcript,
+    save_transcript_file,
+    TRANSCRIPT_EXTENSION,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=f"Convert a transcript between Whisper JSON and the columnar {TRANSCRIPT_EXTENSION} format."
+    )
+    parser.add_argument(
+        "--input", required=True, help="Whisper JSON or .wtc transcript."
+    )
+    parser.add_argument(
+        "--output",
+        help=f"Output path; the format follows its extension (default: the input with .json and {TRANSCRIPT_EXTENSION} swapped).",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file not found at {args.input}")
+        exit(1)
+    output = args.output
+    if not output:
+        stem = os.path.splitext(args.input)[0]
+        output = stem + (
+            ".json" if is_columnar_transcript(args.input) else TRANSCRIPT_EXTENSION
+        )
+
+    try:
+        save_transcript_file(load_transcript(args.input), output)
+        print(
+            f"[✓] {args.input} ({os.path.getsize(args.input)} bytes) -> {output} ({os.path.getsize(output)} bytes)"
+        )
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,205 @@
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from utils import (
+    decode_audio,
+    load_cached_transcript,
+    load_whisper_model,
+    save_cached_transcript,
+    transcript_cache_key,
+    SAMPLE_RATE,
+)
+
+# Long-form mode: a cheap energy-based voice activity detector finds speech, the
+# audio is cut at silences into chunks of at most MAX_CHUNK_SECONDS, and the chunks
+# are transcribed in parallel processes. Silences longer than MERGE_SILENCE_SECONDS
+# are never decoded. Per-chunk segments are shifted back to global timestamps and
+# stitched into one Whisper-format result.
+VAD_FRAME_SECONDS = 0.03
+VAD_MARGIN_DB = 12.0  # speech is this far above the noise floor (10th percentile)
+VAD_RANGE_DB = 20.0  # and at most this far below loud speech (90th percentile)
+SILENCE_DB = -60.0  # frames quieter than this are never speech
+MERGE_SILENCE_SECONDS = 3.0  # shorter pauses stay inside a chunk
+MIN_SPEECH_SECONDS = 0.3
+SPEECH_PADDING = 0.25  # seconds kept around each speech region
+MAX_CHUNK_SECONDS = 300.0
+
+
+def frame_energies_db(audio):
+    """Mean power of each VAD_FRAME_SECONDS frame, in dB."""
+    frame = int(SAMPLE_RATE * VAD_FRAME_SECONDS)
+    num_frames = len(audio) // frame
+    frames = audio[: num_frames * frame].reshape(num_frames, frame)
+    return 10 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+
+
+def speech_regions(energies):
+    """Returns (start_frames, end_frames) of speech, with pauses shorter than
+    MERGE_SILENCE_SECONDS merged and regions shorter than MIN_SPEECH_SECONDS dropped."""
+    empty = np.empty(0, dtype=np.int64)
+    if len(energies) == 0:
+        return empty, empty
+    noise_floor, loud = np.percentile(energies, [10, 90])
+    threshold = max(SILENCE_DB, min(noise_floor + VAD_MARGIN_DB, loud - VAD_RANGE_DB))
+    speech = np.concatenate(([0], (energies > threshold).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(speech))
+    starts, ends = edges[::2], edges[1::2]
+    if len(starts) == 0:
+        return empty, empty
+    long_pause = starts[1:] - ends[:-1] >= MERGE_SILENCE_SECONDS / VAD_FRAME_SECONDS
+    starts = np.concatenate((starts[:1], starts[1:][long_pause]))
+    ends = np.concatenate((ends[:-1][long_pause], ends[-1:]))
+    long_enough = ends - starts >= MIN_SPEECH_SECONDS / VAD_FRAME_SECONDS
+    return starts[long_enough], ends[long_enough]
+
+
+def plan_chunks(audio, max_chunk_seconds=MAX_CHUNK_SECONDS):
+    """Returns [(start, end)] seconds of speech chunks of at most max_chunk_seconds.
+
+    Longer speech regions are cut at their quietest frame in the second half of
+    each max_chunk_seconds window.
+    """
+    energies = frame_energies_db(audio)
+    starts, ends = speech_regions(energies)
+    max_frames = int(max_chunk_seconds / VAD_FRAME_SECONDS)
+    padding = int(SPEECH_PADDING / VAD_FRAME_SECONDS)
+    chunks = []
+    for start, end in zip(starts, ends):
+        start, end = max(0, start - padding), min(len(energies), end + padding)
+        while end - start > max_frames:
+            window = energies[start + max_frames // 2 : start + max_frames]
+            cut = start + max_frames // 2 + int(np.argmin(window))
+            chunks.append((start, cut))
+            start = cut
+        chunks.append((start, end))
+    duration = len(audio) / SAMPLE_RATE
+    return [
+        (
+            float(start * VAD_FRAME_SECONDS),
+            float(min(duration, end * VAD_FRAME_SECONDS)),
+        )
+        for start, end in chunks
+    ]
+
+
+def init_chunk_worker(model_size, num_threads):
+    """Loads the model once per worker process, before its first chunk."""
+    torch.set_num_threads(num_threads)
+    load_whisper_model(model_size)
+
+
+def transcribe_chunk(audio, model_size, options):
+    return load_whisper_model(model_size).transcribe(audio, **options)
+
+
+def shift_segment(segment, segment_id, offset):
+    """Moves a chunk's segment (and its words, if any) to global time."""
+    shifted = dict(
+        segment,
+        id=segment_id,
+        start=segment["start"] + offset,
+        end=segment["end"] + offset,
+    )
+    if "seek" in segment:
+        # seek counts 10 ms mel frames from the start of the audio
+        shifted["seek"] = segment["seek"] + int(round(offset * 100))
+    if "words" in segment:
+        shifted["words"] = [
+            dict(word, start=word["start"] + offset, end=word["end"] + offset)
+            for word in segment["words"]
+        ]
+    return shifted
+
+
+def stitch_results(chunk_results):
+    """Joins [(offset seconds, chunk result)] in time order into one Whisper result.
+
+    The language is the one detected in most chunks.
+    """
+    segments, texts, languages = [], [], []
+    for offset, result in chunk_results:
+        for segment in result.get("segments", []):
+            segments.append(shift_segment(segment, len(segments), offset))
+        texts.append(result.get("text", ""))
+        if result.get("language"):
+            languages.append(result["language"])
+    language = Counter(languages).most_common(1)[0][0] if languages else None
+    return {"text": "".join(texts), "segments": segments, "language": language}
+
+
+def transcribe_long_form(
+    media_path,
+    model_size="base",
+    num_workers=1,
+    num_threads=None,
+    max_chunk_seconds=MAX_CHUNK_SECONDS,
+    use_cache=True,
+    **options,
+):
+    """Transcribes a long recording as speech chunks in num_workers processes.
+
+    options are passed to model.transcribe for every chunk (e.g. language).
+    Returns one Whisper-format result with global timestamps. With use_cache, the
+    result is read from and saved to the transcript cache; it is keyed apart from
+    whole-file transcripts, since chunking changes the output.
+    """
+    key = None
+    if use_cache:
+        params = {
+            "model_size": model_size,
+            "options": options,
+            "long_form": {"max_chunk_seconds": max_chunk_seconds},
+        }
+        key = transcript_cache_key(media_path, params)
+        result = load_cached_transcript(key)
+        if result is not None:
+            print(f"Using cached transcript of {media_path}.")
+            return result
+    result = transcribe_chunks(
+        media_path, model_size, num_workers, num_threads, max_chunk_seconds, **options
+    )
+    if key:
+        save_cached_transcript(key, result)
+    return result
+
+
+def transcribe_chunks(
+    media_path, model_size, num_workers, num_threads, max_chunk_seconds, **options
+):
+    audio = decode_audio(media_path)
+    chunks = plan_chunks(audio, max_chunk_seconds)
+    duration = len(audio) / SAMPLE_RATE
+    speech = sum(end - start for start, end in chunks)
+    if not chunks:
+        print(f"No speech detected in {media_path}.")
+        return {"text": "", "segments": [], "language": None}
+    num_workers = max(1, min(num_workers, len(chunks)))
+    num_threads = num_threads or max(1, (os.cpu_count() or 1) // num_workers)
+    print(
+        f"Transcribing {speech:.0f}s of speech out of {duration:.0f}s in {len(chunks)} chunks with {num_workers} processes ({num_threads} torch threads each)..."
+    )
+    # spawn rather than fork: forked children inherit torch's thread pools badly
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=context,
+        initializer=init_chunk_worker,
+        initargs=(model_size, num_threads),
+    ) as pool:
+        futures = [
+            pool.submit(
+                transcribe_chunk,
+                audio[int(start * SAMPLE_RATE) : int(end * SAMPLE_RATE)],
+                model_size,
+                options,
+            )
+            for start, end in chunks
+        ]
+        chunk_results = []
+        for (start, end), future in zip(chunks, futures):
+            chunk_results.append((start, future.result()))
+            print(f"Transcribed chunk {start:.1f}s - {end:.1f}s")
+    return stitch_results(chunk_results)
@@ -0,0 +1,39 @@
+import os
+import pytest
+
+# batch_transcribe loads Whisper models in its workers
+batch_transcribe = pytest.importorskip("batch_transcribe")
+
+
+def test_outputs_mirror_the_input_tree(tmp_path):
+    inputs = [str(tmp_path / "a" / "talk.mp3"), str(tmp_path / "a" / "b" / "clip.mp4")]
+    jobs = batch_transcribe.plan_outputs(inputs, "/out", ".wtc")
+    assert jobs == [
+        (inputs[0], os.path.join("/out", "talk.wtc")),
+        (inputs[1], os.path.join("/out", "b", "clip.wtc")),
+    ]
+
+
+def test_colliding_stems_keep_their_media_extension(tmp_path):
+    inputs = [str(tmp_path / n) for n in ("a.mp3", "a.mp4", "b.wav", "sub/a.mp3")]
+    outputs = [output for _, output in batch_transcribe.plan_outputs(inputs, "/out")]
+    assert outputs == [
+        os.path.join("/out", "a.mp3.json"),
+        os.path.join("/out", "a.mp4.json"),
+        os.path.join("/out", "b.json"),
+        os.path.join("/out", "sub", "a.json"),
+    ]
+    assert len(set(outputs)) == len(outputs)
+
+
+def test_split_by_size_balances_parts(tmp_path):
+    jobs = []
+    for i, size in enumerate([900, 500, 400, 300, 300, 100]):
+        path = tmp_path / f"{i}.wav"
+        path.write_bytes(b"\0" * size)
+        jobs.append((str(path), f"{i}.json"))
+    parts = batch_transcribe.split_by_size(jobs, 2)
+    loads = [sum(os.path.getsize(job[0]) for job in part) for part in parts]
+    assert sorted(job for part in parts for job in part) == sorted(jobs)
+    assert max(loads) - min(loads) <= 100
+    assert len(batch_transcribe.split_by_size(jobs[:1], 4)) == 1
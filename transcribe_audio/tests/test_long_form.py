@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+# long_form imports torch and Whisper through utils
+long_form = pytest.importorskip("long_form")
+
+SAMPLE_RATE = long_form.SAMPLE_RATE
+
+
+def recording(spans, duration, seed=0):
+    """Quiet noise with a loud tone over each (start, end) seconds span."""
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(scale=1e-3, size=int(duration * SAMPLE_RATE))
+    t = np.arange(len(audio)) / SAMPLE_RATE
+    for start, end in spans:
+        speech = (t >= start) & (t < end)
+        audio[speech] += 0.3 * np.sin(2 * np.pi * 220 * t[speech])
+    return audio.astype(np.float32)
+
+
+def test_chunks_cover_speech_and_skip_long_silences():
+    chunks = long_form.plan_chunks(recording([(2, 6), (7, 9), (20, 25)], 30))
+    # The 1 s pause stays inside a chunk; the 11 s silence is skipped
+    assert len(chunks) == 2
+    (start_a, end_a), (start_b, end_b) = chunks
+    padding = long_form.SPEECH_PADDING + long_form.VAD_FRAME_SECONDS
+    assert start_a == pytest.approx(2 - long_form.SPEECH_PADDING, abs=padding)
+    assert end_a == pytest.approx(9 + long_form.SPEECH_PADDING, abs=padding)
+    assert start_b == pytest.approx(20 - long_form.SPEECH_PADDING, abs=padding)
+    assert end_b <= 30
+
+
+def test_long_speech_is_cut_into_contiguous_chunks():
+    chunks = long_form.plan_chunks(recording([(1, 29)], 30), max_chunk_seconds=8)
+    assert len(chunks) >= 4
+    assert all(end - start <= 8 + 1e-6 for start, end in chunks)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+
+
+def test_silence_has_no_chunks():
+    assert long_form.plan_chunks(np.zeros(SAMPLE_RATE * 5, np.float32)) == []
+    assert long_form.plan_chunks(np.zeros(0, np.float32)) == []
+
+
+def test_stitch_shifts_segments_to_global_time():
+    first = {
+        "text": " Hello.",
+        "language": "en",
+        "segments": [{"id": 0, "seek": 0, "start": 0.5, "end": 2.0, "text": "Hello."}],
+    }
+    second = {
+        "text": " Bonjour. Again.",
+        "language": "fr",
+        "segments": [
+            {"id": 0, "start": 0.0, "end": 1.0, "text": "Bonjour."},
+            {
+                "id": 1,
+                "seek": 100,
+                "start": 1.0,
+                "end": 2.5,
+                "text": "Again.",
+                "words": [{"word": "Again.", "start": 1.2, "end": 2.4}],
+            },
+        ],
+    }
+    third = {"text": " Hi.", "language": "en", "segments": []}
+    result = long_form.stitch_results([(0.0, first), (10.0, second), (20.0, third)])
+    assert result["text"] == " Hello. Bonjour. Again. Hi."
+    assert result["language"] == "en"
+    segments = result["segments"]
+    assert [s["id"] for s in segments] == [0, 1, 2]
+    assert [(s["start"], s["end"]) for s in segments] == [
+        (0.5, 2.0),
+        (10.0, 11.0),
+        (11.0, 12.5),
+    ]
+    assert segments[2]["seek"] == 1100
+    assert segments[2]["words"] == [{"word": "Again.", "start": 11.2, "end": 12.4}]
+    assert second["segments"][1]["start"] == 1.0  # chunk results are not modified
+
+
+def test_stitch_nothing():
+    assert long_form.stitch_results([]) == {
+        "text": "",
+        "segments": [],
+        "language": None,
+    }
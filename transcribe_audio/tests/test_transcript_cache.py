@@ -0,0 +1,59 @@
+import os
+import pytest
+
+# The cache keys include the installed Whisper version
+utils = pytest.importorskip("utils")
+
+PARAMS = {"model_size": "base", "options": {"language": "en"}}
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv(utils.TRANSCRIPT_CACHE_ENV, str(cache_dir))
+    return cache_dir
+
+
+def media_file(folder, name, content):
+    path = folder / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_key_follows_content_not_name(tmp_path):
+    original = media_file(tmp_path, "talk.mp3", b"audio bytes")
+    copy = media_file(tmp_path, "renamed.mp3", b"audio bytes")
+    edited = media_file(tmp_path, "edited.mp3", b"other audio")
+    key = utils.transcript_cache_key(original, PARAMS)
+    assert utils.transcript_cache_key(copy, PARAMS) == key
+    assert utils.transcript_cache_key(edited, PARAMS) != key
+
+
+def test_key_follows_options_that_change_the_transcript(tmp_path):
+    path = media_file(tmp_path, "talk.mp3", b"audio bytes")
+    key = utils.transcript_cache_key(path, PARAMS)
+    verbose = dict(PARAMS, options={"language": "en", "verbose": True})
+    assert utils.transcript_cache_key(path, verbose) == key
+    german = dict(PARAMS, options={"language": "de"})
+    assert utils.transcript_cache_key(path, german) != key
+    assert utils.transcript_cache_key(path, dict(PARAMS, model_size="small")) != key
+
+
+def test_cache_round_trip(tmp_path, cache_dir):
+    result = {"text": " Hallo Welt", "segments": [], "language": "de"}
+    assert utils.load_cached_transcript("k1") is None
+    utils.save_cached_transcript("k1", result)
+    assert utils.load_cached_transcript("k1") == result
+    assert os.listdir(cache_dir) == ["k1.json"]
+
+
+def test_least_recently_used_are_evicted(cache_dir, monkeypatch):
+    result = {"text": "x" * 4000, "segments": []}
+    for i, key in enumerate(["old", "used", "new"]):
+        utils.save_cached_transcript(key, result)
+        os.utime(cache_dir / f"{key}.json", (1000 + i, 1000 + i))
+    utils.load_cached_transcript("old")  # a hit marks it recently used
+
+    monkeypatch.setenv(utils.TRANSCRIPT_CACHE_MB_ENV, str(9000 / 1024 / 1024))
+    utils.save_cached_transcript("newest", result)
+    assert sorted(os.listdir(cache_dir)) == ["newest.json", "old.json"]
@@ -0,0 +1,132 @@
+import json
+import numpy as np
+import pytest
+from transcript_format import (
+    ColumnarTranscript,
+    load_transcript,
+    save_transcript_file,
+    write_columnar_transcript,
+)
+
+
+def whisper_result(num_segments=50, seed=0):
+    """A synthetic Whisper result with word timestamps, like transcribe(word_timestamps=True)."""
+    rng = np.random.default_rng(seed)
+    segments, time = [], 0.0
+    for i in range(num_segments):
+        words = []
+        for w in range(int(rng.integers(1, 6))):
+            start = round(time, 2)
+            time += float(rng.uniform(0.1, 0.8))
+            words.append(
+                {
+                    "word": f" wörd{i}_{w}",
+                    "start": start,
+                    "end": round(time, 2),
+                    "probability": float(rng.uniform()),
+                }
+            )
+        segments.append(
+            {
+                "id": i,
+                "seek": i * 3000,
+                "start": words[0]["start"],
+                "end": words[-1]["end"],
+                "text": "".join(word["word"] for word in words),
+                "tokens": [int(t) for t in rng.integers(0, 51865, len(words) + 2)],
+                "temperature": 0.0,
+                "avg_logprob": float(-rng.uniform()),
+                "compression_ratio": 1.5,
+                "no_speech_prob": float(rng.uniform()),
+                "words": words,
+            }
+        )
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": "de",
+    }
+
+
+def test_round_trip_is_lossless(tmp_path):
+    result = whisper_result()
+    path = str(tmp_path / "talk.wtc")
+    save_transcript_file(result, path)
+    assert load_transcript(path) == result
+    transcript = ColumnarTranscript(path)
+    assert len(transcript) == 50
+    assert transcript.text == result["text"]
+    assert transcript.language == "de"
+
+
+def test_irregular_values_are_kept(tmp_path):
+    result = whisper_result(num_segments=4)
+    result["text"] = "A different full text."
+    result["segments"][1]["speaker"] = "SPEAKER_01"  # only on one segment
+    result["segments"][2]["avg_logprob"] = None  # mixed column
+    result["segments"][3]["tokens"] = []
+    result["duration"] = 12.5
+    path = str(tmp_path / "odd.wtc")
+    write_columnar_transcript(result, path)
+    loaded = load_transcript(path)
+    assert loaded == result
+    assert list(loaded) == list(result)
+    assert list(loaded["segments"][1]) == list(result["segments"][1])
+
+
+def test_json_path_writes_json(tmp_path):
+    result = whisper_result(num_segments=3)
+    path = str(tmp_path / "talk.json")
+    save_transcript_file(result, path)
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == result
+    assert load_transcript(path) == result
+
+
+def test_rejects_result_without_segments(tmp_path):
+    with pytest.raises(ValueError):
+        write_columnar_transcript({"text": "hi"}, str(tmp_path / "x.wtc"))
+
+
+def overlapping(segments, start, end):
+    return [
+        i for i, s in enumerate(segments) if s["start"] <= end and s["end"] >= start
+    ]
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_window_matches_a_plain_scan(tmp_path, shuffle):
+    result = whisper_result(num_segments=200, seed=1)
+    if shuffle:
+        np.random.default_rng(2).shuffle(result["segments"])
+    path = str(tmp_path / "talk.wtc")
+    write_columnar_transcript(result, path)
+    transcript = ColumnarTranscript(path)
+    segments = result["segments"]
+    for start, end in [(0, 5), (30.2, 31), (55, 120), (-10, -1), (1e6, 2e6)]:
+        assert list(transcript.window(start, end)) == overlapping(segments, start, end)
+        assert transcript.segments(start, end, keys=("id", "text")) == [
+            {"id": segments[i]["id"], "text": segments[i]["text"]}
+            for i in overlapping(segments, start, end)
+        ]
+
+
+def test_empty_and_untimed_transcripts(tmp_path):
+    empty = str(tmp_path / "empty.wtc")
+    write_columnar_transcript({"text": "", "segments": []}, empty)
+    transcript = ColumnarTranscript(empty)
+    assert len(transcript.window(0, 10)) == 0
+    assert transcript.segments(0, 10) == []
+    assert transcript.to_whisper() == {"text": "", "segments": []}
+
+    untimed = str(tmp_path / "untimed.wtc")
+    segments = [
+        {"text": "no times"},
+        {"start": 1.0, "end": 2.0, "text": "timed"},
+        {"start": None, "end": 3.0, "text": "half"},
+    ]
+    write_columnar_transcript({"segments": segments}, untimed)
+    transcript = ColumnarTranscript(untimed)
+    assert list(transcript.window(0, 10)) == [1]
+    assert transcript.segments(0, 10) == [segments[1]]
+    assert transcript.text is None
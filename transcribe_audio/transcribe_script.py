@@ -1,19 +1,33 @@
 import argparse
-import json
 import os
-from utils import extract_audio_from_video, transcribe_audio_file, is_video_file
+from utils import (
+    transcribe_audio_file,
+    DEFAULT_TRANSCRIPT_CACHE_DIR,
+    TRANSCRIPT_CACHE_ENV,
+    WHISPER_WORKER_ENV,
+)
+from batch_transcribe import discover_inputs, read_manifest, transcribe_batch
+from long_form import transcribe_long_form, MAX_CHUNK_SECONDS
+from transcript_format import save_transcript_file, TRANSCRIPT_EXTENSION
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Transcribe an audio or video file using OpenAI Whisper."
     )
-    parser.add_argument(
-        "--input", required=True, help="Path to the input audio or video file."
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("--input", help="Path to the input audio or video file.")
+    inputs.add_argument(
+        "--input_dir",
+        help="Batch mode: transcribe every audio and video file under this folder.",
+    )
+    inputs.add_argument(
+        "--manifest",
+        help="Batch mode: transcribe the files listed in this text file, one path per line.",
     )
     parser.add_argument(
         "--output",
         default="transcript.json",
-        help="Path to save the output JSON transcription.",
+        help=f"Path to save the transcription: Whisper JSON, or the compact columnar format if it ends with {TRANSCRIPT_EXTENSION}.",
     )
     parser.add_argument(
         "--model_size",
@@ -30,40 +44,100 @@ if __name__ == "__main__":
         ],
         help="Whisper model size to use (default: base).",
     )
+    parser.add_argument(
+        "--whisper_worker",
+        default=os.environ.get(WHISPER_WORKER_ENV),
+        help=f"URL of a running transcribe_audio/whisper_worker.py (e.g. http://127.0.0.1:8766) that keeps models loaded between runs (default: ${WHISPER_WORKER_ENV}).",
+    )
+    parser.add_argument(
+        "--output_dir",
+        default="transcripts",
+        help="Batch mode: folder for the transcripts, mirroring the input folders (default: transcripts).",
+    )
+    parser.add_argument(
+        "--output_format",
+        default="json",
+        choices=["json", TRANSCRIPT_EXTENSION.lstrip(".")],
+        help="Batch mode: transcript format (default: json).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Batch and long-form modes: worker processes, each loading the model once (default: 1).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="Batch and long-form modes: torch threads per worker (default: CPU cores / workers).",
+    )
+    parser.add_argument(
+        "--long_form",
+        action="store_true",
+        help="For long recordings: detect speech, cut the audio at silences and transcribe the chunks in --workers processes in parallel.",
+    )
+    parser.add_argument(
+        "--max_chunk_seconds",
+        type=float,
+        default=MAX_CHUNK_SECONDS,
+        help=f"Long-form mode: longest chunk of speech transcribed by one worker (default: {MAX_CHUNK_SECONDS:.0f}).",
+    )
+    parser.add_argument(
+        "--no_transcript_cache",
+        action="store_true",
+        help=f"Always run Whisper, bypassing the transcript cache shared by the Whisper tools (${TRANSCRIPT_CACHE_ENV}, default: {DEFAULT_TRANSCRIPT_CACHE_DIR}).",
+    )
 
     args = parser.parse_args()
+    use_cache = not args.no_transcript_cache
+
+    if args.long_form and not args.input:
+        parser.error("--long_form transcribes a single --input")
+    if args.input_dir or args.manifest:
+        if args.input_dir and not os.path.isdir(args.input_dir):
+            print(f"Error: Input folder not found at {args.input_dir}")
+            exit(1)
+        if args.manifest and not os.path.exists(args.manifest):
+            print(f"Error: Manifest not found at {args.manifest}")
+            exit(1)
+        input_paths = (
+            discover_inputs(args.input_dir)
+            if args.input_dir
+            else read_manifest(args.manifest)
+        )
+        transcribe_batch(
+            input_paths,
+            args.output_dir,
+            args.model_size,
+            max(1, args.workers),
+            args.threads,
+            use_cache,
+            "." + args.output_format,
+        )
+        exit(0)
 
     if not os.path.exists(args.input):
         print(f"Error: Input file not found at {args.input}")
         exit(1)
 
-    temp_audio_path = None
-    input_for_transcription = args.input
-
     try:
-        if is_video_file(args.input):
-            print(f"Input file {args.input} appears to be a video. Extracting audio...")
-            temp_audio_path = extract_audio_from_video(args.input)
-            input_for_transcription = temp_audio_path
+        if args.long_form:
+            transcript_result = transcribe_long_form(
+                args.input,
+                args.model_size,
+                max(1, args.workers),
+                args.threads,
+                args.max_chunk_seconds,
+                use_cache,
+            )
         else:
-            print(f"Input file {args.input} appears to be an audio file.")
-
-        if not input_for_transcription:
-            print(f"Error: Could not prepare audio for transcription from {args.input}")
-            exit(1)
-
-        transcript_result = transcribe_audio_file(
-            input_for_transcription, args.model_size
-        )
+            transcript_result = transcribe_audio_file(
+                args.input, args.model_size, args.whisper_worker, use_cache
+            )
 
-        with open(args.output, "w", encoding="utf-8") as f:
-            json.dump(transcript_result, f, indent=2, ensure_ascii=False)
+        save_transcript_file(transcript_result, args.output)
 
         print(f"[✓] Transcription saved to {args.output}")
 
     except Exception as e:
         print(f"An error occurred: {e}")
-    finally:
-        if temp_audio_path and os.path.exists(temp_audio_path):
-            print(f"Cleaning up temporary audio file: {temp_audio_path}")
-            os.remove(temp_audio_path)
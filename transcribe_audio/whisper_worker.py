@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils import decode_audio, WhisperModelRegistry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+DEFAULT_MEMORY_BUDGET_GB = 8.0
+
+
+class WorkerState:
+    """Warm Whisper models shared by all requests; transcriptions run one at a time."""
+
+    def __init__(self, memory_budget=None, device=None):
+        self.models = WhisperModelRegistry(memory_budget)
+        self.device = device
+        self.lock = threading.Lock()
+
+    def transcribe(self, media_path, model_size="base", options=None):
+        if not os.path.exists(media_path):
+            raise ValueError(f"Media file not found at {media_path}")
+        # Decoding runs outside the lock, overlapping the transcription in progress
+        audio = decode_audio(media_path)
+        with self.lock:
+            model = self.models.get(model_size, self.device)
+            print(f"Transcribing {media_path} with {model_size}...")
+            return model.transcribe(audio, **(options or {}))
+
+    def status(self):
+        return {
+            "models": [
+                {"model_size": model_size, "device": device, "bytes": size}
+                for model_size, device, size in self.models.loaded()
+            ],
+            "memory_budget": self.models.memory_budget,
+        }
+
+
+def make_handler(state):
+    class WorkerHandler(BaseHTTPRequestHandler):
+        def send_json(self, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/status":
+                self.send_error(404)
+                return
+            self.send_json(state.status())
+
+        def do_POST(self):
+            if self.path != "/transcribe":
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                result = state.transcribe(
+                    request["media_path"],
+                    request.get("model_size", "base"),
+                    request.get("options"),
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                self.send_error(400, str(e))
+                return
+            except Exception as e:
+                print(f"Error transcribing: {e}")
+                self.send_error(500, str(e))
+                return
+            self.send_json(result)
+
+        def log_message(self, format, *args):
+            pass  # Keep the console for model load and eviction messages
+
+    return WorkerHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep Whisper models loaded between transcriptions and serve them on a local port."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to bind to.")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Port to listen on."
+    )
+    parser.add_argument(
+        "--memory_budget_gb",
+        type=float,
+        default=DEFAULT_MEMORY_BUDGET_GB,
+        help=f"Memory for loaded model weights; the least recently used models are evicted beyond it (default: {DEFAULT_MEMORY_BUDGET_GB}).",
+    )
+    parser.add_argument(
+        "--device", help="Device to load models on (default: CUDA if available)."
+    )
+    parser.add_argument(
+        "--preload",
+        nargs="+",
+        default=[],
+        help="Model sizes to load at startup, e.g. --preload base large-v3.",
+    )
+    args = parser.parse_args()
+
+    state = WorkerState(int(args.memory_budget_gb * 1024**3), args.device)
+    for model_size in args.preload:
+        state.models.get(model_size, args.device)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Whisper worker listening on http://{args.host}:{args.port}/transcribe")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down Whisper worker.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()